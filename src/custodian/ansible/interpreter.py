@@ -3,11 +3,26 @@ This module implements a Modder class that performs modifications on objects
 using support actions.
 """
 
+import functools
 import re
 
 from custodian.ansible.actions import DictActions
 
 
+@functools.lru_cache
+def _get_action_table(actions):
+    """
+    Map action keywords to the methods of a tuple of action classes. Cached,
+    since modders are created for every correction.
+    """
+    table = {}
+    for action in actions:
+        for attr in dir(action):
+            if (not re.match(r"__\w+__", attr)) and callable(getattr(action, attr)):
+                table[f"_{attr}"] = getattr(action, attr)
+    return table
+
+
 class Modder:
     """
     Class to modify a dict/file/any object using a mongo-like language.
@@ -44,12 +59,8 @@ class Modder:
             directory (str): The directory containing the files to be modified.
                 Defaults to "./".
         """
-        self.supported_actions = {}
         actions = actions if actions is not None else [DictActions]
-        for action in actions:
-            for attr in dir(action):
-                if (not re.match(r"__\w+__", attr)) and callable(getattr(action, attr)):
-                    self.supported_actions[f"_{attr}"] = getattr(action, attr)
+        self.supported_actions = dict(_get_action_table(tuple(actions)))
         self.strict = strict
         self.directory = directory
 
@@ -77,14 +88,45 @@ class Modder:
         Modify an object that supports pymatgen's as_dict() and from_dict API.
 
         Args:
-            modification (dict): Modification must be {action_keyword :
-                settings}. E.g., {'_set': {'Hello':'Universe', 'Bye': 'World'}}
+            modification (dict | list[dict]): Modification must be {action_keyword :
+                settings}. E.g., {'_set': {'Hello':'Universe', 'Bye': 'World'}}.
+                A list of modifications is applied in order with a single
+                as_dict()/from_dict() round trip.
             obj (object): Object to modify
         """
         dct = obj.as_dict()
-        self.modify(modification, dct)
+        for mod in modification if isinstance(modification, list) else [modification]:
+            self.modify(mod, dct)
         return obj.from_dict(dct)
 
+    @staticmethod
+    def compile_actions(actions):
+        """
+        Compile a list of actions into an action plan. File actions are kept in
+        order, while all modifications of the same object are merged so that
+        each object is modified in a single pass and written only once.
+
+        Args:
+            actions ([dict]): A list of actions of the form {'file': filename,
+                'action': moddermodification} or {'dict': key, 'action':
+                moddermodification}.
+
+        Returns:
+            tuple[list, dict]: The (filename, modification) file actions in
+                order, and the list of modifications for each dict key in the
+                order the keys first appear.
+        """
+        file_actions = []
+        dict_actions: dict[str, list] = {}
+        for action in actions:
+            if "dict" in action:
+                dict_actions.setdefault(action["dict"], []).append(action["action"])
+            elif "file" in action:
+                file_actions.append((action["file"], action["action"]))
+            else:
+                raise ValueError(f"Unrecognized format: {action}")
+        return file_actions, dict_actions
+
 
 if __name__ == "__main__":
     import doctest
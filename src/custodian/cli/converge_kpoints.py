@@ -1,8 +1,11 @@
 """This is a master vasp running script to converging kpoints for a calculation."""
 
 import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-from pymatgen.io.vasp.inputs import VaspInput
+from pymatgen.io.vasp.inputs import Kpoints, VaspInput
 from pymatgen.io.vasp.outputs import Vasprun
 
 from custodian.custodian import Custodian
@@ -49,8 +52,102 @@ def get_runs(vasp_command, target=1e-3, max_steps=10, mode="linear"):
         )
 
 
+def get_meshes(kpoints, max_steps=10, mode="linear"):
+    """Candidate k-point meshes of a sweep, starting from the initial mesh."""
+    if mode == "linear":
+        return [[kpt * (step + 1) for kpt in kpoints] for step in range(max_steps)]
+    return [[kpt + step for kpt in kpoints] for step in range(max_steps)]
+
+
+def run_mesh(vasp_command, vasp_input, mesh, directory):
+    """Run VASP with a k-point mesh in its own subdirectory.
+
+    Returns:
+        float: The final energy per atom, or None if the run failed.
+    """
+    kpoints = vasp_input["KPOINTS"]
+    new_input = VaspInput(
+        incar=vasp_input["INCAR"],
+        kpoints=Kpoints(comment=kpoints.comment, style=kpoints.style, kpts=[mesh], kpts_shift=kpoints.kpts_shift),
+        poscar=vasp_input["POSCAR"],
+        potcar=vasp_input["POTCAR"],
+    )
+    new_input.write_input(directory)
+    handlers = [VaspErrorHandler(), UnconvergedErrorHandler()]
+    try:
+        Custodian(handlers, [VaspJob(vasp_command)], max_errors=10, directory=directory).run()
+        vasprun = Vasprun(os.path.join(directory, "vasprun.xml"))
+    except Exception as exc:
+        logging.warning(f"K-point mesh {mesh} failed: {exc}")
+        return None
+    return vasprun.final_energy / len(vasprun.final_structure)
+
+
+def run_sweep(vasp_command, target=1e-3, max_steps=10, mode="linear", cores=None, cores_per_run=1, directory="."):
+    """
+    Run the candidate k-point meshes concurrently, each in a kpoints_AxBxC
+    subdirectory, with at most cores // cores_per_run runs at a time. Meshes
+    are started from the smallest, and no further meshes are started once two
+    consecutive meshes agree to within target eV/atom. Any "{cores}" in the
+    VASP command is replaced by cores_per_run. A summary table is written to
+    kpoints_convergence.txt.
+
+    Returns:
+        list[dict]: The mesh, subdirectory and energy per atom of each run.
+    """
+    vasp_input = VaspInput.from_directory(directory)
+    meshes = get_meshes(vasp_input["KPOINTS"].kpts[0], max_steps=max_steps, mode=mode)
+    vasp_command = [token.replace("{cores}", str(cores_per_run)) for token in vasp_command]
+    n_parallel = max(1, (cores or multiprocessing.cpu_count()) // cores_per_run)
+    results = [
+        {"mesh": mesh, "directory": os.path.join(directory, f"kpoints_{'x'.join(map(str, mesh))}"), "energy": None}
+        for mesh in meshes
+    ]
+
+    converged = None
+    next_idx = 0
+    with ThreadPoolExecutor(max_workers=n_parallel) as executor:
+        running = {}
+        while running or (converged is None and next_idx < len(meshes)):
+            while converged is None and next_idx < len(meshes) and len(running) < n_parallel:
+                res = results[next_idx]
+                running[executor.submit(run_mesh, vasp_command, vasp_input, res["mesh"], res["directory"])] = next_idx
+                next_idx += 1
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)]["energy"] = future.result()
+            for idx in range(1, len(results)):
+                e_prev, e_cur = results[idx - 1]["energy"], results[idx]["energy"]
+                if converged is None and e_prev is not None and e_cur is not None and abs(e_cur - e_prev) < target:
+                    converged = idx - 1
+                    logging.info(f"Converged to {abs(e_cur - e_prev)} eV/atom at {results[converged]['mesh']}!")
+
+    results = results[:next_idx]
+    lines = [f"{'mesh':<16}{'nkpts':>8}{'energy (eV/atom)':>20}{'delta (eV/atom)':>18}"]
+    for idx, res in enumerate(results):
+        mesh, energy = res["mesh"], res["energy"]
+        prev = results[idx - 1]["energy"] if idx > 0 else None
+        energy_str = "failed" if energy is None else f"{energy:.6f}"
+        delta_str = "" if energy is None or prev is None else f"{abs(energy - prev):.2e}"
+        line = f"{'x'.join(map(str, mesh)):<16}{mesh[0] * mesh[1] * mesh[2]:>8}{energy_str:>20}{delta_str:>18}"
+        lines.append(line + ("  converged" if idx == converged else ""))
+    with open(os.path.join(directory, "kpoints_convergence.txt"), "w") as file:
+        file.write("\n".join(lines) + "\n")
+    return results
+
+
 def do_run(args) -> None:
     """Perform the run."""
+    if args.sweep:
+        run_sweep(
+            vasp_command=args.command.split(),
+            target=args.target,
+            max_steps=args.max_steps,
+            mode=args.mode,
+            cores=args.cores,
+            cores_per_run=args.cores_per_run,
+        )
+        return
     handlers = [VaspErrorHandler(), UnconvergedErrorHandler()]
     c = Custodian(
         handlers,
@@ -132,6 +229,33 @@ def main() -> None:
         "until a converged of 1meV is reached.",
     )
 
+    parser.add_argument(
+        "-s",
+        "--sweep",
+        dest="sweep",
+        action="store_true",
+        help="Run all k-point meshes concurrently, each in its own kpoints_AxBxC "
+        "subdirectory, instead of one after another. No new meshes are started "
+        "once two consecutive meshes agree within the target, and a summary is "
+        "written to kpoints_convergence.txt.",
+    )
+
+    parser.add_argument(
+        "--cores",
+        dest="cores",
+        default=None,
+        type=int,
+        help="Total number of cores available to a sweep. Defaults to the number of cores on this machine.",
+    )
+
+    parser.add_argument(
+        "--cores_per_run",
+        dest="cores_per_run",
+        default=1,
+        type=int,
+        help="Number of cores used by each run of a sweep. Any {cores} in the VASP command is replaced by this value.",
+    )
+
     args = parser.parse_args()
     do_run(args)
 
@@ -14,7 +14,6 @@ When adding more remember the following tips:
     benefits like writing a wavefunction restart file before quitting.
 """
 
-import itertools
 import os
 import re
 import time
@@ -24,12 +23,12 @@ import numpy as np
 from monty.os.path import zpath
 from monty.re import regrep
 from monty.serialization import dumpfn
-from pymatgen.io.cp2k.inputs import Cp2kInput, Keyword
-from pymatgen.io.cp2k.outputs import Cp2kOutput
+from pymatgen.io.cp2k.inputs import Keyword
 
 from custodian.cp2k.interpreter import Cp2kModder
-from custodian.cp2k.utils import get_conv, restart, tail
+from custodian.cp2k.utils import Cp2kOutputTracker, get_conv, load_input, restart
 from custodian.custodian import ErrorHandler
+from custodian.utils import ProgressMonitor
 
 __author__ = "Nicholas Winner"
 __version__ = "1.0"
@@ -138,15 +137,19 @@ class UnconvergedScfErrorHandler(ErrorHandler):
 
     is_monitor = True
 
-    def __init__(self, input_file="cp2k.inp", output_file="cp2k.out") -> None:
+    def __init__(self, input_file="cp2k.inp", output_file="cp2k.out", reuse_wfn=False) -> None:
         """Initialize the error handler from a set of input and output files.
 
         Args:
             input_file (str): Name of the CP2K input file.
             output_file (str): Name of the CP2K output file.
+            reuse_wfn (bool): Whether corrected reruns start from the last wavefunction
+                whenever the corrections keep it valid. See
+                :func:`custodian.cp2k.utils.get_wfn_restart_actions`. Defaults to False.
         """
         self.input_file = input_file
         self.output_file = output_file
+        self.reuse_wfn = reuse_wfn
         self.outdata = None
         self.errors = None
         self.scf = None
@@ -155,25 +158,29 @@ class UnconvergedScfErrorHandler(ErrorHandler):
     def check(self, directory="./"):
         """Check output file for failed SCF convergence."""
         # Checks output file for errors.
-        out = Cp2kOutput(os.path.join(directory, self.output_file), auto_load=False, verbose=False)
-        out.convergence()
-        ci = Cp2kInput.from_file(zpath(os.path.join(directory, self.input_file)))
+        out = Cp2kOutputTracker.get(os.path.join(directory, self.output_file)).update()
+        ci = load_input(zpath(os.path.join(directory, self.input_file)))
         self.is_ot = ci.check("FORCE_EVAL/DFT/SCF/OT")
-        if out.filenames.get("restart"):
-            self.restart = out.filenames["restart"][-1]
+        if out.restart_files:
+            self.restart = out.restart_files[-1]
 
         # General catch for SCF not converged
         # TODO: should not-static runs allow for some unconverged scf? Leads to issues in my experience
-        scf = out.data["scf_converged"] or [True]
-        return bool(not scf[0])
+        scf = out.scf_converged or [True]
+        return bool(not scf[-1])
 
     def correct(self, directory="./"):
         """Apply corrections to aid convergence if possible."""
-        ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
+        ci = load_input(os.path.join(directory, self.input_file))
 
         actions = self.__correct_ot(ci=ci) if self.is_ot else self.__correct_diag(ci=ci)
 
-        restart(actions, os.path.join(directory, self.output_file), os.path.join(directory, self.input_file))
+        restart(
+            actions,
+            os.path.join(directory, self.output_file),
+            os.path.join(directory, self.input_file),
+            reuse_wfn=self.reuse_wfn,
+        )
         Cp2kModder(ci=ci, filename=self.input_file, directory=directory).apply_actions(actions)
         return {"errors": ["Non-converging Job"], "actions": actions}
 
@@ -416,13 +423,15 @@ class DivergingScfErrorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for diverging SCF."""
-        conv = get_conv(os.path.join(directory, self.output_file))
+        output_file = os.path.join(directory, self.output_file)
+        conv = get_conv(output_file)
         tmp = np.diff(conv[-10:])
-        return len(conv) > 10 and all(_ > 0 for _ in tmp) and any(_ > 1 for _ in conv)
+        # get_conv only returns the recent history, the maximum covers the whole run
+        return len(conv) > 10 and all(_ > 0 for _ in tmp) and Cp2kOutputTracker.get(output_file).max_conv > 1
 
     def correct(self, directory="./"):
         """Correct issue if possible."""
-        ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
+        ci = load_input(os.path.join(directory, self.input_file))
         actions = []
 
         p = ci["force_eval"]["dft"]["qs"].get("EPS_DEFAULT", Keyword("EPS_DEFAULT", 1e-10)).values[0]
@@ -462,11 +471,23 @@ class FrozenJobErrorHandler(ErrorHandler):
             as some sub-routines, like the HFX module, can take a long time to
             update the output file.
 
+    Independently of the timeout, a run is also considered frozen once the output
+    file has not changed in idle_timeout seconds and none of the CP2K ranks used
+    more than cpu_threshold of a core over that period. Long HFX or preconditioner
+    stages keep the ranks busy, so they are not affected by this shortcut.
     """
 
     is_monitor = True
 
-    def __init__(self, input_file="cp2k.inp", output_file="cp2k.out", timeout=3600) -> None:
+    def __init__(
+        self,
+        input_file="cp2k.inp",
+        output_file="cp2k.out",
+        timeout=3600,
+        idle_timeout=600,
+        cpu_threshold=0.05,
+        reuse_wfn=False,
+    ) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
@@ -477,26 +498,37 @@ class FrozenJobErrorHandler(ErrorHandler):
                 frozen. Defaults to 3600 seconds, i.e., 1 hour. Most stages of
                 cp2k take much less than 1 hour, but 1 hour is the default to account
                 for large HF force calculations or sizable preconditioner calculations.
+            idle_timeout (int): The time in seconds without activity on the output
+                file after which the run is considered frozen if the CP2K ranks were
+                idle over the last idle_timeout seconds. Defaults to 600 seconds.
+            cpu_threshold (float): Maximum CPU utilization of the busiest rank for
+                the run to be considered idle. Defaults to 0.05.
+            reuse_wfn (bool): Whether corrected reruns start from the last wavefunction
+                whenever the corrections keep it valid. See
+                :func:`custodian.cp2k.utils.get_wfn_restart_actions`. Defaults to False.
         """
         self.input_file = input_file
+        self.reuse_wfn = reuse_wfn
         self.output_file = output_file
         self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.cpu_threshold = cpu_threshold
         self.frozen_preconditioner = False
         self.restart = None
+        self._monitor = ProgressMonitor([output_file], process_name="cp2k", window=idle_timeout)
 
     def check(self, directory="./"):
         """Check for frozen jobs."""
         st = os.stat(os.path.join(directory, self.output_file))
-        out = Cp2kOutput(os.path.join(directory, self.output_file), auto_load=False, verbose=False)
-        try:
-            out.ran_successfully()
+        out = Cp2kOutputTracker.get(os.path.join(directory, self.output_file)).update()
+        if out.completed:
             # If job finished, then hung, don't need to wait very long to confirm frozen
             return time.time() - st.st_mtime > 300
-        except ValueError:
-            pass
 
-        t = tail(self.output_file, 2)
-        if time.time() - st.st_mtime > self.timeout:
+        t = list(out.last_lines)[-2:] or [""]
+        stalled, cpu_usage = self._monitor.update(directory)
+        idle = cpu_usage is not None and stalled > self.idle_timeout and cpu_usage < self.cpu_threshold
+        if idle or time.time() - st.st_mtime > self.timeout:
             if t[0].split() == ["Step", "Update", "method", "Time", "Convergence", "Total", "energy", "Change"]:
                 self.frozen_preconditioner = True
             return True
@@ -505,7 +537,7 @@ class FrozenJobErrorHandler(ErrorHandler):
 
     def correct(self, directory="./"):
         """Correct issue if possible."""
-        ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
+        ci = load_input(os.path.join(directory, self.input_file))
         actions = []
         errors = []
 
@@ -582,7 +614,12 @@ class FrozenJobErrorHandler(ErrorHandler):
         else:
             errors.append("Frozen job")
 
-        restart(actions, os.path.join(directory, self.output_file), os.path.join(self.input_file))
+        restart(
+            actions,
+            os.path.join(directory, self.output_file),
+            os.path.join(directory, self.input_file),
+            reuse_wfn=self.reuse_wfn,
+        )
         Cp2kModder(ci=ci, filename=self.input_file, directory=directory).apply_actions(actions)
         return {"errors": errors, "actions": actions}
 
@@ -605,39 +642,35 @@ class AbortHandler(ErrorHandler):
     is_monitor = False
     is_terminating = True
 
-    def __init__(self, input_file="cp2k.inp", output_file="cp2k.out") -> None:
+    def __init__(self, input_file="cp2k.inp", output_file="cp2k.out", reuse_wfn=False) -> None:
         """
         Initialize handler for CP2K abort messages.
 
         Args:
             input_file: (str) name of the input file
             output_file: (str) name of the output file
+            reuse_wfn (bool): Whether corrected reruns start from the last wavefunction
+                whenever the corrections keep it valid. See
+                :func:`custodian.cp2k.utils.get_wfn_restart_actions`. Defaults to False.
         """
         self.input_file = input_file
         self.output_file = output_file
-        self.messages = {
-            "cholesky": r"(Cholesky decomposition failed. Matrix ill conditioned ?)",
-            "cholesky_scf": r"(Cholesky decompose failed: the matrix is not positive definite or)",
-        }
+        self.reuse_wfn = reuse_wfn
+        self.messages = {key: Cp2kOutputTracker.message_patterns[key] for key in ("cholesky", "cholesky_scf")}
         self.responses: list[str] = []
 
     def check(self, directory="./") -> bool:
         """Check for abort messages."""
-        matches = regrep(
-            os.path.join(directory, self.output_file),
-            patterns=self.messages,
-            reverse=True,
-            terminate_on_match=True,
-            postprocess=str,
-        )
-        for match in matches:
-            self.responses.append(match)
-            return True
+        out = Cp2kOutputTracker.get(os.path.join(directory, self.output_file)).update()
+        for message in self.messages:
+            if message in out.messages:
+                self.responses.append(message)
+                return True
         return False
 
     def correct(self, directory="./"):
         """Correct issue if possible."""
-        ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
+        ci = load_input(os.path.join(directory, self.input_file))
         actions = []
 
         if self.responses[-1] == "cholesky":
@@ -739,7 +772,12 @@ class AbortHandler(ErrorHandler):
                         }
                     )
 
-        restart(actions, os.path.join(directory, self.output_file), os.path.join(self.input_file))
+        restart(
+            actions,
+            os.path.join(directory, self.output_file),
+            os.path.join(directory, self.input_file),
+            reuse_wfn=self.reuse_wfn,
+        )
         Cp2kModder(ci=ci, filename=self.input_file, directory=directory).apply_actions(actions)
         return {"errors": [self.responses[-1]], "actions": actions}
 
@@ -791,6 +829,7 @@ class NumericalPrecisionHandler(ErrorHandler):
         pgf_orb_strict=1e-20,
         eps_default_strict=1e-12,
         eps_gvg_strict=1e-10,
+        reuse_wfn=False,
     ) -> None:
         """
         Initialize the error handler.
@@ -813,8 +852,12 @@ class NumericalPrecisionHandler(ErrorHandler):
             pgf_orb_strict (float): TODO @janosh someone who knows this code, please add a description
             eps_default_strict (float): TODO @janosh likewise
             eps_gvg_strict (float): TODO @janosh likewise
+            reuse_wfn (bool): Whether corrected reruns start from the last wavefunction
+                whenever the corrections keep it valid. See
+                :func:`custodian.cp2k.utils.get_wfn_restart_actions`. Defaults to False.
         """
         self.input_file = input_file
+        self.reuse_wfn = reuse_wfn
         self.output_file = output_file
         self.max_same = max_same
         self.overlap_condition = None
@@ -824,13 +867,12 @@ class NumericalPrecisionHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for stuck SCF convergence."""
-        conv = get_conv(os.path.join(directory, self.output_file))
-        counts = [len([*group]) for _k, group in itertools.groupby(conv)]
-        return bool(any(cnt > self.max_same for cnt in counts))
+        out = Cp2kOutputTracker.get(os.path.join(directory, self.output_file)).update()
+        return out.max_same_conv_count > self.max_same
 
     def correct(self, directory="/."):
         """Correct issue if possible."""
-        ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
+        ci = load_input(os.path.join(directory, self.input_file))
         actions = []
 
         if ci.check("FORCE_EVAL/DFT/XC/HF"):  # Hybrid has special considerations
@@ -914,7 +956,12 @@ class NumericalPrecisionHandler(ErrorHandler):
                     }
                 )
 
-        restart(actions, os.path.join(directory, self.output_file), os.path.join(self.input_file))
+        restart(
+            actions,
+            os.path.join(directory, self.output_file),
+            os.path.join(directory, self.input_file),
+            reuse_wfn=self.reuse_wfn,
+        )
         Cp2kModder(ci=ci, filename=self.input_file, directory=directory).apply_actions(actions)
         return {"errors": ["Insufficient precision"], "actions": actions}
 
@@ -947,6 +994,7 @@ class UnconvergedRelaxationErrorHandler(ErrorHandler):
         max_iter=20,
         max_total_iter=200,
         optimizers=("BFGS", "CG", "BFGS", "CG"),
+        reuse_wfn=False,
     ) -> None:
         """
         Initialize the error handler.
@@ -961,8 +1009,12 @@ class UnconvergedRelaxationErrorHandler(ErrorHandler):
             optimizers: Which optimizers to try with custodian. Can be used to go back and forth,
                 e.g. Try BFGS then CG then BFGS again for 20 iterations each until the max total
                 iterations is reached.
+            reuse_wfn: Whether corrected reruns start from the last wavefunction
+                whenever the corrections keep it valid. See
+                :func:`custodian.cp2k.utils.get_wfn_restart_actions`. Defaults to False.
         """
         self.input_file = input_file
+        self.reuse_wfn = reuse_wfn
         self.output_file = output_file
         self.max_iter = max_iter
         self.max_total_iter = max_total_iter
@@ -971,13 +1023,12 @@ class UnconvergedRelaxationErrorHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check for unconverged geometry optimization."""
-        o = Cp2kOutput(os.path.join(directory, self.output_file))
-        o.convergence()
-        return bool(o.data.get("geo_opt_not_converged"))
+        out = Cp2kOutputTracker.get(os.path.join(directory, self.output_file)).update()
+        return out.geo_opt_not_converged
 
     def correct(self, directory):
         """Correct issue if possible."""
-        ci = Cp2kInput.from_file(os.path.join(directory, self.input_file))
+        ci = load_input(os.path.join(directory, self.input_file))
         actions = []
 
         max_iter = ci["motion"]["geo_opt"].get("MAX_ITER", Keyword("", 200)).values[0]
@@ -1012,7 +1063,12 @@ class UnconvergedRelaxationErrorHandler(ErrorHandler):
             )
 
         self.optimizer_id += 1
-        restart(actions, os.path.join(directory, self.output_file), os.path.join(self.input_file))
+        restart(
+            actions,
+            os.path.join(directory, self.output_file),
+            os.path.join(directory, self.input_file),
+            reuse_wfn=self.reuse_wfn,
+        )
         Cp2kModder(ci=ci, filename=self.input_file, directory=directory).apply_actions(actions)
         return {"errors": ["Unsuccessful relaxation"], "actions": actions}
 
@@ -1043,15 +1099,8 @@ class WalltimeHandler(ErrorHandler):
 
     def check(self, directory="./"):
         """Check if internal CP2K walltime handler was tripped."""
-        return bool(
-            regrep(
-                filename=os.path.join(directory, self.output_file),
-                patterns={"walltime": "(exceeded requested execution time)"},
-                reverse=True,
-                terminate_on_match=True,
-                postprocess=bool,
-            ).get("walltime")
-        )
+        out = Cp2kOutputTracker.get(os.path.join(directory, self.output_file)).update()
+        return "walltime" in out.messages
 
     def correct(self, directory="./"):
         """Dump checkpoint info if requested."""
@@ -2,11 +2,9 @@
 
 import os
 
-from pymatgen.io.cp2k.inputs import Cp2kInput
-
 from custodian.ansible.actions import DictActions, FileActions
 from custodian.ansible.interpreter import Modder
-from custodian.cp2k.utils import cleanup_input
+from custodian.cp2k.utils import cache_input, cleanup_input, load_input
 
 __author__ = "Nicholas Winner"
 __version__ = "1.0"
@@ -39,7 +37,7 @@ class Cp2kModder(Modder):
             directory (str): The directory containing the Cp2kInput set. Defaults to "./".
         """
         self.directory = directory
-        self.ci = ci or Cp2kInput.from_file(os.path.join(self.directory, filename))
+        self.ci = ci or load_input(os.path.join(self.directory, filename))
         self.filename = filename
         actions = actions or [FileActions, DictActions]
         super().__init__(actions, strict, directory=directory)
@@ -47,26 +45,26 @@ class Cp2kModder(Modder):
     def apply_actions(self, actions) -> None:
         """
         Applies a list of actions to the CP2K Input Set and rewrites modified
-        files.
+        files. File actions are applied first, so the input is re-read at most
+        once and written once (see :meth:`Modder.compile_actions`).
 
         Args:
             actions (dict): A list of actions of the form {'file': filename,
                 'action': moddermodification} or {'dict': cp2k_key,
                 'action': moddermodification}.
         """
-        modified = []
-        for action in actions:
-            if "dict" in action:
-                k = action["dict"]
-                modified.append(k)
-                Cp2kModder._modify(action["action"], self.ci)
-            elif "file" in action:
-                self.modify(action["action"], action["file"])
-                self.ci = Cp2kInput.from_file(os.path.join(self.directory, self.filename))
-            else:
-                raise ValueError(f"Unrecognized format: {action}")
+        file_actions, dict_actions = self.compile_actions(actions)
+        for filename, modification in file_actions:
+            self.modify(modification, filename)
+        if file_actions:
+            # File actions may have replaced the input file.
+            self.ci = load_input(os.path.join(self.directory, self.filename))
+        for modifications in dict_actions.values():
+            for modification in modifications:
+                Cp2kModder._modify(modification, self.ci)
         cleanup_input(self.ci)
         self.ci.write_file(os.path.join(self.directory, self.filename))
+        cache_input(os.path.join(self.directory, self.filename), self.ci)
 
     @staticmethod
     def _modify(modification, obj) -> None:
@@ -3,15 +3,19 @@
 import logging
 import os
 import shutil
+import signal
 import subprocess
+import threading
+from fnmatch import fnmatch
 
 from monty.os.path import zpath
 from monty.shutil import decompress_dir
-from pymatgen.io.cp2k.inputs import Cp2kInput, Keyword
+from pymatgen.io.cp2k.inputs import Keyword
 
 from custodian.cp2k.interpreter import Cp2kModder
-from custodian.cp2k.utils import cleanup_input, restart
+from custodian.cp2k.utils import _fingerprint, cache_input, cleanup_input, load_input, restart
 from custodian.custodian import Job
+from custodian.utils import snapshot_file
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +24,13 @@ __version__ = "1.0"
 
 CP2K_INPUT_FILES = ["cp2k.inp"]
 CP2K_OUTPUT_FILES = ["cp2k.out"]
+# Files that cp2k replaces rather than rewrites. Restart files (wavefunction,
+# k-point wavefunction and input restarts) are renamed to .bak-N backups before
+# a new file is written, and the backups are only renamed afterwards. These can
+# be hard linked into the snapshot of a job. Everything else, in particular the
+# print key outputs (*-pos-1.xyz, *-1.ener, *-1.cell, ...) that cp2k appends to
+# in place, is copied (or reflinked) instead.
+CP2K_SNAPSHOT_LINK_PATTERNS = ["*.wfn", "*.kp", "*.restart", "*.bak-*"]
 
 
 class Cp2kJob(Job):
@@ -39,6 +50,10 @@ class Cp2kJob(Job):
         backup=True,
         settings_override=None,
         restart=False,
+        terminate_timeout=10.0,
+        snapshot_include=None,
+        snapshot_exclude=None,
+        reuse_wfn=False,
     ) -> None:
         """
         This constructor is necessarily complex due to the need for
@@ -67,6 +82,15 @@ class Cp2kJob(Job):
                 in interpreter.py
             restart (bool): Whether to run in restart mode, i.e. this a continuation of
                 a previous calculation. Default is False.
+            terminate_timeout (float): Seconds to wait for the cp2k process group
+                to exit after SIGTERM, and again after SIGKILL. Defaults to 10.
+            snapshot_include ([str]): Glob patterns of the files saved to run{suffix}
+                in postprocess. Defaults to None, i.e. all files.
+            snapshot_exclude ([str]): Glob patterns of files not saved to run{suffix}.
+                Defaults to ["*json*"], i.e. custodian's own logs and checkpoints.
+            reuse_wfn (bool): In restart mode, whether to start from the last wavefunction
+                of the previous run. See :func:`custodian.cp2k.utils.get_wfn_restart_actions`.
+                Defaults to False.
 
         """
         self.cp2k_cmd = cp2k_cmd
@@ -79,6 +103,76 @@ class Cp2kJob(Job):
         self.suffix = suffix
         self.settings_override = settings_override or []
         self.restart = restart
+        self.terminate_timeout = terminate_timeout
+        self.snapshot_include = snapshot_include
+        self.snapshot_exclude = snapshot_exclude
+        self.reuse_wfn = reuse_wfn
+        self._cp2k_process = None
+        # Job whose input is prepared while this one runs, see prepare()
+        self.next_job = None
+        self._prepared = None
+        self._prepare_thread = None
+
+    def prepare(self, directory="./") -> None:
+        """
+        Generate and validate the input of this job ahead of setup(), typically in
+        a background thread while the previous job of a chain is still running
+        (see next_job). The settings overrides are applied to an in-memory copy of
+        the current input, the basis set and potential files it needs are located
+        and read once, so they are in the filesystem cache when cp2k starts.
+        setup() uses the result if the input file has not changed since.
+
+        Only jobs whose setup does not depend on the previous run can be prepared,
+        i.e. not in restart mode and without file actions.
+
+        Args:
+            directory (str): the job directory.
+        """
+        self._prepared = None
+        if self.restart or not self.settings_override:
+            return
+        file_actions, dict_actions = Cp2kModder.compile_actions(self.settings_override)
+        if file_actions:
+            return
+        path = os.path.join(directory, self.input_file)
+        fingerprint = _fingerprint(path)
+        ci = load_input(path)
+        cleanup_input(ci)
+        for modifications in dict_actions.values():
+            for modification in modifications:
+                Cp2kModder._modify(modification, ci)
+        cleanup_input(ci)
+        text = ci.get_str()
+        for filename in self._get_data_files(ci, directory):
+            with open(filename, mode="rb") as file:
+                while file.read(1 << 20):
+                    pass
+        self._prepared = (fingerprint, ci, text)
+
+    @staticmethod
+    def _get_data_files(ci, directory="./") -> list[str]:
+        """
+        Locate the basis set and potential files of an input, in the job directory
+        or CP2K_DATA_DIR. Files that cannot be found (e.g. if they are resolved from
+        the data directory compiled into cp2k) are logged and skipped.
+        """
+        if not ci.check("FORCE_EVAL/DFT"):
+            return []
+        dft = ci["FORCE_EVAL"]["DFT"]
+        names = []
+        for key in ("BASIS_SET_FILE_NAME", "POTENTIAL_FILE_NAME"):
+            keywords = dft.get(key)
+            keywords = getattr(keywords, "keywords", [keywords] if keywords else [])
+            names += [str(keyword.values[-1]) for keyword in keywords]
+        files = []
+        for name in dict.fromkeys(names):
+            candidates = [os.path.join(directory, name), os.path.join(os.environ.get("CP2K_DATA_DIR", ""), name)]
+            found = next((file for file in candidates if os.path.isfile(file)), None)
+            if found:
+                files.append(found)
+            else:
+                logger.warning(f"Could not locate cp2k data file {name}")
+        return files
 
     def setup(self, directory="./") -> None:
         """
@@ -89,25 +183,39 @@ class Cp2kJob(Job):
         """
         decompress_dir(directory)
 
-        self.ci = Cp2kInput.from_file(zpath(os.path.join(directory, self.input_file)))  # type:ignore[assignment]
-        cleanup_input(self.ci)
-
-        if self.restart:
-            restart(
-                actions=self.settings_override,
-                output_file=os.path.join(directory, self.output_file),
-                input_file=os.path.join(directory, self.input_file),
-                no_actions_needed=True,
-            )
-
-        if self.settings_override or self.restart:
-            modder = Cp2kModder(
-                filename=os.path.join(directory, self.input_file),
-                actions=[],
-                ci=self.ci,
-                directory=directory,
-            )
-            modder.apply_actions(self.settings_override)
+        if self._prepare_thread is not None:
+            self._prepare_thread.join()
+            self._prepare_thread = None
+        path = os.path.join(directory, self.input_file)
+        prepared, self._prepared = self._prepared, None
+
+        if prepared and os.path.isfile(path) and prepared[0] == _fingerprint(path):
+            # The input was generated while the previous job was running, see prepare()
+            _, self.ci, text = prepared
+            with open(path, mode="w", encoding="utf-8") as file:
+                file.write(text)
+            cache_input(path, self.ci)
+        else:
+            self.ci = load_input(zpath(path))  # type:ignore[assignment]
+            cleanup_input(self.ci)
+
+            if self.restart:
+                restart(
+                    actions=self.settings_override,
+                    output_file=os.path.join(directory, self.output_file),
+                    input_file=os.path.join(directory, self.input_file),
+                    no_actions_needed=True,
+                    reuse_wfn=self.reuse_wfn,
+                )
+
+            if self.settings_override or self.restart:
+                modder = Cp2kModder(
+                    filename=os.path.join(directory, self.input_file),
+                    actions=[],
+                    ci=self.ci,
+                    directory=directory,
+                )
+                modder.apply_actions(self.settings_override)
 
         if self.backup:
             shutil.copy(
@@ -127,34 +235,64 @@ class Cp2kJob(Job):
         cmd += ["-i", self.input_file]
         cmd_str = " ".join(cmd)
         logger.info(f"Running {cmd_str}")
+        # Replace, rather than truncate, outputs that may be shared with the
+        # snapshot of a previous job (see postprocess).
+        for file in (self.output_file, self.stderr_file):
+            if os.path.isfile(os.path.join(directory, file)):
+                os.remove(os.path.join(directory, file))
         with (
             open(os.path.join(directory, self.output_file), "w") as f_std,
             open(os.path.join(directory, self.stderr_file), "w", buffering=1) as f_err,
         ):
-            # use line buffering for stderr
-            return subprocess.Popen(cmd, cwd=directory, stdout=f_std, stderr=f_err, shell=False)
+            # use line buffering for stderr. cp2k runs in its own session so that
+            # terminate() only signals this job's processes.
+            self._cp2k_process = subprocess.Popen(
+                cmd, cwd=directory, stdout=f_std, stderr=f_err, shell=False, start_new_session=True
+            )
+        if self.next_job is not None:
+            self.next_job._prepare_thread = threading.Thread(
+                target=self._prepare_next_job, args=(directory,), daemon=True
+            )
+            self.next_job._prepare_thread.start()
+        return self._cp2k_process
+
+    def _prepare_next_job(self, directory) -> None:
+        """Prepare the next job of the chain, see prepare(). Failures only disable the shortcut."""
+        try:
+            self.next_job.prepare(directory)
+        except Exception as exc:
+            logger.warning(f"Could not prepare {self.next_job.input_file} for the next job: {exc}")
 
     # TODO double jobs, file manipulations, etc. should be done in atomate in the future
     # and custodian should only run the job itself
     def postprocess(self, directory="./") -> None:
-        """Postprocessing includes renaming and gzipping where necessary."""
-        files = os.listdir(directory)
-        if os.path.isfile(self.output_file) and self.suffix != "":
-            os.mkdir(f"run{self.suffix}")
-            for file in files:
-                if "json" in file:
+        """
+        Postprocessing saves the files of the run to run{suffix}. The final job
+        moves them there, other jobs snapshot them with reflinks or hard links
+        where possible (see :func:`custodian.utils.snapshot_file`), so restart
+        files are not copied between the jobs of a chain. Hard links are only
+        used for files that are replaced rather than modified in place: the
+        restart files (CP2K_SNAPSHOT_LINK_PATTERNS) and the output and stderr
+        files, which run() recreates. Other files, such as trajectories that
+        cp2k appends to and the inputs that custodian modifies, are copied.
+        """
+        include = self.snapshot_include or ["*"]
+        exclude = ["*json*"] if self.snapshot_exclude is None else self.snapshot_exclude
+        replaced = {os.path.basename(self.output_file), os.path.basename(self.stderr_file)}
+        if os.path.isfile(os.path.join(directory, self.output_file)) and self.suffix != "":
+            snapshot_dir = os.path.join(directory, f"run{self.suffix}")
+            os.mkdir(snapshot_dir)
+            for file in os.listdir(directory):
+                if not any(fnmatch(file, pattern) for pattern in include) or any(
+                    fnmatch(file, pattern) for pattern in exclude
+                ):
                     continue
                 if not os.path.isdir(os.path.join(directory, file)):
                     if self.final:
-                        shutil.move(
-                            os.path.join(directory, file),
-                            os.path.join(directory, f"run{self.suffix}/{file}"),
-                        )
+                        shutil.move(os.path.join(directory, file), os.path.join(snapshot_dir, file))
                     else:
-                        shutil.copy(
-                            os.path.join(directory, file),
-                            os.path.join(directory, f"run{self.suffix}/{file}"),
-                        )
+                        link = file in replaced or any(fnmatch(file, pat) for pat in CP2K_SNAPSHOT_LINK_PATTERNS)
+                        snapshot_file(os.path.join(directory, file), os.path.join(snapshot_dir, file), link=link)
 
         # Remove continuation so if a subsequent job is run in
         # the same directory, will not restart this job.
@@ -162,13 +300,54 @@ class Cp2kJob(Job):
             os.remove(os.path.join(directory, "continue.json"))
 
     def terminate(self, directory="./") -> None:
-        """Terminate cp2k."""
-        for cmd in self.cp2k_cmd:
-            if "cp2k" in cmd:
+        """
+        Terminate the cp2k process group of this job, leaving other cp2k runs on
+        the same node alone. Sends SIGTERM, then SIGKILL if the processes have not
+        exited within terminate_timeout, and finally falls back to killing the
+        launcher process.
+
+        Args:
+            directory: Unused, kept for API compatibility with base class.
+        """
+        if self._cp2k_process is None:
+            logger.warning("No cp2k process to terminate")
+            return
+        pid = self._cp2k_process.pid
+        if self._cp2k_process.poll() is not None:
+            logger.warning(f"Process {pid} already terminated")
+            return
+
+        if os.name != "nt":
+            try:
+                pgid = os.getpgid(pid)
+            except ProcessLookupError:
+                logger.warning(f"Process group for {pid} not found")
+                return
+
+            for sig in (signal.SIGTERM, signal.SIGKILL):
+                logger.info(f"Sending {sig.name} to process group {pgid}")
                 try:
-                    os.system(f"killall {cmd}")
-                except Exception:
-                    pass
+                    os.killpg(pgid, sig)
+                except ProcessLookupError:
+                    logger.warning(f"Process group {pgid} not found")
+                    return
+                except OSError as exc:
+                    logger.warning(f"{sig.name} to process group {pgid} failed: {exc}")
+                    continue
+                try:
+                    self._cp2k_process.wait(timeout=self.terminate_timeout)
+                    logger.info(f"Process {pid} terminated with {sig.name}")
+                    return
+                except subprocess.TimeoutExpired:
+                    logger.warning(f"{sig.name} timeout ({self.terminate_timeout}s)")
+
+        logger.warning(f"Falling back to killing parent process {pid}")
+        try:
+            self._cp2k_process.terminate()
+            self._cp2k_process.wait(timeout=self.terminate_timeout)
+        except subprocess.TimeoutExpired:
+            self._cp2k_process.kill()
+            self._cp2k_process.wait()
 
     @classmethod
     def gga_static_to_hybrid(
@@ -181,11 +360,17 @@ class Cp2kJob(Job):
         settings_override_gga=None,
         settings_override_hybrid=None,
         directory="./",
+        overlap_stages=False,
     ):
         """
         A bare GGA to hybrid calculation. Removes all unnecessary features
         from the GGA run, and making it only a ENERGY/ENERGY_FORCE
         depending on the hybrid run.
+
+        If overlap_stages is True, the input of the hybrid job is generated and its
+        basis set and potential files are staged while the first job runs (see
+        Cp2kJob.prepare). The wavefunction is handed over in place, the snapshot
+        of the first job only links it (see Cp2kJob.postprocess).
         """
         job1_settings_override = [
             {
@@ -212,7 +397,7 @@ class Cp2kJob(Job):
             settings_override=job1_settings_override,
         )
 
-        ci = Cp2kInput.from_file(zpath(os.path.join(directory, input_file)))
+        ci = load_input(zpath(os.path.join(directory, input_file)))
         run_type = ci["global"].get("run_type", Keyword("RUN_TYPE", "ENERGY_FORCE")).values[0]
         if run_type in {
             "ENERGY",
@@ -257,6 +442,8 @@ class Cp2kJob(Job):
             restart=False,
             settings_override=job2_settings_override,
         )
+        if overlap_stages:
+            job1.next_job = job2
         return [job1, job2]
 
     @classmethod
@@ -285,7 +472,7 @@ class Cp2kJob(Job):
             suffix="1",
             settings_override={},
         )
-        ci = Cp2kInput.from_file(zpath(os.path.join(directory, input_file)))
+        ci = load_input(zpath(os.path.join(directory, input_file)))
         run_type = ci["global"].get("run_type", Keyword("RUN_TYPE", "ENERGY_FORCE")).values[0]
         if run_type not in {"ENERGY", "WAVEFUNCTION_OPTIMIZATION", "WFN_OPT"}:
             job1.settings_override = [
@@ -318,10 +505,16 @@ class Cp2kJob(Job):
         stderr_file="std_err.txt",
         backup=True,
         directory="./",
+        overlap_stages=False,
     ):
         """
         Build a job where the first job is an unscreened hybrid static calculation, then the second one
         uses the wfn from the first job as a restart to do a screened calculation.
+
+        If overlap_stages is True, the input of the hybrid job is generated and its
+        basis set and potential files are staged while the first job runs (see
+        Cp2kJob.prepare). The wavefunction is handed over in place, the snapshot
+        of the first job only links it (see Cp2kJob.postprocess).
         """
         job1_settings_override = [
             {
@@ -357,7 +550,7 @@ class Cp2kJob(Job):
             settings_override=job1_settings_override,
         )
 
-        ci = Cp2kInput.from_file(zpath(os.path.join(directory, input_file)))
+        ci = load_input(zpath(os.path.join(directory, input_file)))
         r = ci["global"].get("run_type", Keyword("RUN_TYPE", "ENERGY_FORCE")).values[0]
         if r in {
             "ENERGY",
@@ -403,4 +596,6 @@ class Cp2kJob(Job):
             settings_override=job2_settings_override,
         )
 
+        if overlap_stages:
+            job1.next_job = job2
         return [job1, job2]
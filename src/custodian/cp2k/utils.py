@@ -1,14 +1,19 @@
 """This module holds different utility functions. Mainly used by handlers."""
 
-import itertools
 import os
+import pickle
+import re
+import threading
 from collections import deque
+from glob import glob
+from typing import ClassVar
 
+from monty.io import zopen
 from pymatgen.io.cp2k.inputs import Cp2kInput
-from pymatgen.io.cp2k.outputs import Cp2kOutput
+from pymatgen.io.cp2k.utils import natural_keys
 
 
-def restart(actions, output_file, input_file, no_actions_needed=False) -> None:
+def restart(actions, output_file, input_file, no_actions_needed=False, reuse_wfn=False) -> None:
     """
     Helper function. To discard old restart if convergence is already good, and copy
     the restart file to the input file. Restart also supports switching back and forth
@@ -21,18 +26,23 @@ def restart(actions, output_file, input_file, no_actions_needed=False) -> None:
         output_file (str): the cp2k output file name.
         input_file (str): the cp2k input file name.
         no_actions_needed (bool): if no actions are needed, then this should be set to True.
+        reuse_wfn (bool): if True, the rerun starts from the last wavefunction of the
+            previous run whenever the actions keep it valid, see get_wfn_restart_actions,
+            instead of discarding it once convergence was good or ionic steps were made.
     """
     if actions or no_actions_needed:
-        out = Cp2kOutput(output_file)
-        ci = Cp2kInput.from_file(input_file)
-        restart_file = out.filenames.get("restart")
-        restart_file = restart_file[-1] if restart_file else None
+        out = Cp2kOutputTracker.get(output_file).update()
+        ci = load_input(input_file)
+        restart_file = out.restart_files[-1] if out.restart_files else None
         wfn_restart = ci["force_eval"]["dft"].get("wfn_restart_file_name") if ci.check("force_eval/dft") else None
 
+        if reuse_wfn:
+            # The restart file replaces the input, so the policy applies to it
+            actions += get_wfn_restart_actions(actions, input_file, load_input(restart_file) if restart_file else ci)
         # If convergence is already pretty good, or we have moved to a new ionic step,
         # discard the old WFN
-        if wfn_restart:
-            conv = get_conv(output_file)
+        elif wfn_restart:
+            conv = out.convergence
             if (conv and conv[-1] <= 1e-5) or restart_file:
                 actions.append(
                     {"dict": input_file, "action": {"_unset": {"FORCE_EVAL": {"DFT": "WFN_RESTART_FILE_NAME"}}}}
@@ -50,6 +60,121 @@ def restart(actions, output_file, input_file, no_actions_needed=False) -> None:
             )
 
 
+# Input settings that determine the basis, occupation or k-point sampling of the
+# molecular orbitals stored in a wavefunction restart file. Changing any of them
+# invalidates the file, while changes to e.g. cutoffs, EPS_* thresholds, the XC
+# functional or the SCF algorithm (OT or diagonalization) keep it usable as a guess.
+WFN_INCOMPATIBLE_PATHS = (
+    ("FORCE_EVAL", "SUBSYS", "KIND"),
+    ("FORCE_EVAL", "DFT", "BASIS_SET_FILE_NAME"),
+    ("FORCE_EVAL", "DFT", "CHARGE"),
+    ("FORCE_EVAL", "DFT", "MULTIPLICITY"),
+    ("FORCE_EVAL", "DFT", "UKS"),
+    ("FORCE_EVAL", "DFT", "LSD"),
+    ("FORCE_EVAL", "DFT", "ROKS"),
+    ("FORCE_EVAL", "DFT", "KPOINTS"),
+)
+
+
+def _get_action_paths(modification):
+    """
+    Get the input paths that a dict modification touches, e.g.
+    {"_set": {"FORCE_EVAL": {"DFT": {"SCF": {"MAX_SCF": 50}}}}} gives
+    [("FORCE_EVAL", "DFT", "SCF", "MAX_SCF")].
+    """
+
+    def walk(settings, prefix, unset):
+        if isinstance(settings, dict) and settings:
+            for key, val in settings.items():
+                yield from walk(val, (*prefix, str(key).upper()), unset)
+        elif isinstance(settings, str) and unset:
+            yield (*prefix, settings.upper())
+        elif isinstance(settings, list | tuple) and unset:
+            for val in settings:
+                yield from walk(val, prefix, unset)
+        else:
+            yield prefix
+
+    if isinstance(modification, dict):
+        modification = list(modification.items())
+    elif isinstance(modification, tuple):
+        modification = [modification]
+    paths = []
+    for action, settings in modification:
+        paths.extend(walk(settings, (), action == "_unset"))
+    return paths
+
+
+def get_wfn_restart_actions(actions, input_file, ci=None) -> list[dict]:
+    """
+    Wavefunction reuse policy for corrections. A corrected rerun converges much
+    faster from the last wavefunction of the failed run than from an atomic guess,
+    and the wavefunction stays valid for most corrections: cutoffs, precision,
+    mixing, smearing, the XC functional and switches between OT and
+    diagonalization all leave the stored orbitals usable (CP2K initializes any
+    additional MOs itself). Only corrections that change the basis sets, charge,
+    spin treatment or k-points (see WFN_INCOMPATIBLE_PATHS) invalidate it.
+
+    Args:
+        actions (list): the actions that are going to be applied. Actions that
+            already set the wavefunction restart or SCF guess are left alone.
+        input_file (str): path to the cp2k input file. The wavefunction is looked
+            for in the same directory.
+        ci (Cp2kInput): the current input. Read from input_file if not given.
+
+    Returns:
+        list[dict]: actions that set the latest wavefunction file as the restart
+            guess, or that remove the restart guess if the actions invalidate it.
+            Empty if no change is needed.
+    """
+    paths = [path for action in actions if "dict" in action for path in _get_action_paths(action["action"])]
+    if any(path[-1] in ("WFN_RESTART_FILE_NAME", "SCF_GUESS") for path in paths if path):
+        return []
+    ci = ci or load_input(input_file)
+    dft = ci["FORCE_EVAL"]["DFT"] if ci.check("FORCE_EVAL/DFT") else None
+    if dft is None:
+        return []
+    current = dft.get("WFN_RESTART_FILE_NAME")
+    current = current.values[0] if current else None
+    guess = ci.by_path("FORCE_EVAL/DFT/SCF").get("SCF_GUESS") if ci.check("FORCE_EVAL/DFT/SCF") else None
+    guess = str(guess.values[0]).upper() if guess else None
+    # Removing or replacing the SCF section (e.g. activate_ot) also drops SCF_GUESS
+    if any(path == ("FORCE_EVAL", "DFT", "SCF")[: len(path)] for path in paths):
+        guess = None
+
+    incompatible = any(
+        path[: len(other)] == other or other[: len(path)] == path for path in paths for other in WFN_INCOMPATIBLE_PATHS
+    )
+    if incompatible:
+        new_actions = []
+        if current:
+            new_actions.append(
+                {"dict": input_file, "action": {"_unset": {"FORCE_EVAL": {"DFT": "WFN_RESTART_FILE_NAME"}}}}
+            )
+        if guess == "RESTART":
+            new_actions.append(
+                {"dict": input_file, "action": {"_set": {"FORCE_EVAL": {"DFT": {"SCF": {"SCF_GUESS": "ATOMIC"}}}}}}
+            )
+        return new_actions
+
+    directory = os.path.dirname(os.path.abspath(input_file))
+    candidates = glob(os.path.join(directory, "*-RESTART.wfn"))
+    if current:
+        candidates.append(os.path.join(directory, current))
+    candidates = [file for file in candidates if os.path.isfile(file) and os.path.getsize(file) > 0]
+    if not candidates:
+        return []
+    wfn_file = os.path.basename(max(candidates, key=os.path.getmtime))
+    settings = {}
+    if current != wfn_file:
+        settings["WFN_RESTART_FILE_NAME"] = wfn_file
+    if guess != "RESTART":
+        settings["SCF"] = {"SCF_GUESS": "RESTART"}
+    if not settings:
+        return []
+    return [{"dict": input_file, "action": {"_set": {"FORCE_EVAL": {"DFT": settings}}}}]
+
+
 # TODO Not sure I like this solution
 def cleanup_input(ci) -> None:
     """
@@ -67,6 +192,59 @@ def cleanup_input(ci) -> None:
         cleanup_input(val)
 
 
+_input_cache: dict[str, tuple[tuple[int, int, int], bytes]] = {}
+_input_cache_lock = threading.Lock()
+
+
+def _fingerprint(filename) -> tuple[int, int, int]:
+    stat = os.stat(filename)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def load_input(filename) -> Cp2kInput:
+    """
+    Read a cp2k input file, reusing the previous parse if the file has not changed
+    since (same inode, size and modification time). Handlers, jobs and the modder
+    all read the same input file, often several times per correction cycle, and
+    parsing a large input is expensive.
+
+    The cache holds a pickled snapshot of the input, so every call returns a new,
+    independent Cp2kInput that the caller is free to modify. Unpickling is roughly
+    an order of magnitude faster than parsing or deep-copying.
+
+    Args:
+        filename (str): path to the cp2k input file.
+
+    Returns:
+        Cp2kInput
+    """
+    path = os.path.abspath(filename)
+    fingerprint = _fingerprint(path)
+    with _input_cache_lock:
+        cached = _input_cache.get(path)
+    if cached and cached[0] == fingerprint:
+        return pickle.loads(cached[1])
+    ci = Cp2kInput.from_file(path)
+    with _input_cache_lock:
+        _input_cache[path] = (fingerprint, pickle.dumps(ci, protocol=pickle.HIGHEST_PROTOCOL))
+    return ci
+
+
+def cache_input(filename, ci) -> None:
+    """
+    Record a Cp2kInput that has just been written to filename, so the next
+    load_input call does not need to parse the file again.
+
+    Args:
+        filename (str): path the input was written to.
+        ci (Cp2kInput): the input object that was written.
+    """
+    path = os.path.abspath(filename)
+    data = pickle.dumps(ci, protocol=pickle.HIGHEST_PROTOCOL)
+    with _input_cache_lock:
+        _input_cache[path] = (_fingerprint(path), data)
+
+
 def activate_ot(actions, ci) -> None:
     """
     Activate OT scheme.
@@ -152,24 +330,62 @@ def activate_diag(actions) -> None:
     actions += diag_actions
 
 
+def read_band_gap(filename, max_bytes=1_000_000):
+    """
+    Read the last HOMO - LUMO gap from the end of a cp2k output file, without
+    parsing the rest of the file. The lines are scanned in reverse from the end
+    of the file, and all gap lines printed after the last SCF run are averaged
+    (one per spin channel).
+
+    Args:
+        filename (str): path to the cp2k output file.
+        max_bytes (int): only the last max_bytes of the file are scanned.
+
+    Returns:
+        float: the gap in eV, or None if no gap was found near the end of the
+            file (or the file is compressed).
+    """
+    if not os.path.isfile(filename) or filename.endswith((".gz", ".bz2", ".xz")):
+        return None
+    with open(filename, mode="rb") as file:
+        size = file.seek(0, os.SEEK_END)
+        file.seek(max(size - max_bytes, 0))
+        lines = file.read().decode("utf-8", errors="replace").splitlines()
+    gaps = []
+    for line in reversed(lines):
+        if "LUMO" in line and (match := Cp2kOutputTracker.homo_lumo.search(line)):
+            gaps.append(float(match.group(1)))
+        elif gaps and ("SCF run" in line or Cp2kOutputTracker.scf_row.search(line)):
+            break
+    return sum(gaps) / len(gaps) if gaps else None
+
+
 def can_use_ot(output, ci, minimum_band_gap=0.1):
     """
     Check whether OT can be used:
         OT should not already be activated
         The output should show that the system has a band gap that is greater than minimum_band_gap.
 
+    The band gap is read from the HOMO - LUMO gaps at the end of the output (see
+    read_band_gap), and only if none were printed from the DOS files of a
+    Cp2kOutput, or from the whole output file.
+
     Args:
-        output (Cp2kOutput): cp2k output object for determining band gap
+        output (Cp2kOutput | str): cp2k output object or output file for determining band gap
         ci (Cp2kInput): cp2k input object for determining if OT is already active
         minimum_band_gap (float): the minimum band gap for OT
     """
-    output.parse_dos()
-    return bool(
-        not ci.check("FORCE_EVAL/DFT/SCF/OT")
-        and not ci.check("FORCE_EVAL/DFT/KPOINTS")
-        and output.band_gap
-        and output.band_gap > minimum_band_gap
-    )
+    if ci.check("FORCE_EVAL/DFT/SCF/OT") or ci.check("FORCE_EVAL/DFT/KPOINTS"):
+        return False
+    filename = output if isinstance(output, str) else output.filename
+    band_gap = read_band_gap(filename)
+    if band_gap is None:
+        if isinstance(output, str):
+            band_gap = Cp2kOutputTracker.get(output).update().band_gap
+        else:
+            output.parse_dos()
+            band_gap = output.band_gap
+    return bool(band_gap and band_gap > minimum_band_gap)
 
 
 def tail(filename, n=10):
@@ -189,8 +405,210 @@ def get_conv(outfile):
         outfile (str): output file to parse
     Returns:
         returns convergence info (change in energy between SCF steps) as a
-        single list (flattened across outer scf loops).
+        single list (flattened across outer scf loops). Only the last
+        Cp2kOutputTracker.history_size values are kept for long runs.
+    """
+    return list(Cp2kOutputTracker.get(outfile).update().convergence)
+
+
+class Cp2kOutputTracker:
     """
-    out = Cp2kOutput(outfile, auto_load=False, verbose=False)
-    out.parse_scf_opt()
-    return list(itertools.chain.from_iterable(out.data["convergence"]))
+    Incremental parser for a (growing) CP2K output file. Each call to update()
+    only reads the bytes appended since the previous call, so monitors can
+    follow long runs without re-parsing the whole output on every check.
+    Trackers are shared per output file, see :meth:`get`, so all CP2K handlers
+    read from the same state.
+
+    Memory use does not grow with the length of the run: running counters are
+    kept for the whole output, but only the last history_size entries of the
+    per-step data.
+
+    The tracked data is:
+
+        convergence: the last history_size SCF convergence values, flattened
+            across SCF tables.
+        scf_table: convergence values of the last SCF table (inner SCF loop),
+            including the one still being written.
+        n_scf_tables: number of SCF tables so far.
+        max_conv: largest convergence value so far.
+        scf_converged: whether each of the last history_size completed SCF
+            runs converged.
+        same_conv_count / max_same_conv_count: number of consecutive identical
+            convergence values (across SCF tables) at the end of the output,
+            and the maximum so far.
+        geo_opt_converged / geo_opt_not_converged: whether the geometry
+            optimization completed or hit the maximum number of steps.
+        completed: whether the run ended ("PROGRAM ENDED AT").
+        homo_lumo_gaps: the last history_size HOMO - LUMO gaps [eV].
+        spin_polarized: whether the run is spin-polarized (UKS).
+        last_lines: the last lines of the output.
+        messages: number of occurrences of each of the abort and walltime
+            messages in message_patterns.
+    """
+
+    _trackers: ClassVar[dict] = {}
+    _lock = threading.Lock()
+
+    scf_header = re.compile(r"^\s*Step\s+Update method\s+Time\s+Convergence\s+Total energy\s+Change\s*$")
+    # Same row pattern as pymatgen's Cp2kOutput.parse_scf_opt
+    scf_row = re.compile(
+        r"^\s+(\d+)"
+        r"\s+([A-Za-z\./_]+\s?[A-Za-z\./]+)"
+        r"\s+(-?\d+\.\d+(?:[eE][+\-]?\d+)?)"
+        r"\s+(-?\d+\.\d+(?:[eE][+\-]?\d+)?)"
+        r"(\s+-?\d+\.\d+(?:[eE][+\-]?\d+)?)?"
+        r"\s+(-?\d+\.\d+(?:[eE][+\-]?\d+)?)"
+        r"(\s+-?\d+\.\d+(?:[eE][+\-]?\d+)?)?"
+    )
+    homo_lumo = re.compile(r"HOMO.*-.*LUMO.*gap.*\s(-?\d+.\d+)")
+    # Messages of cp2k internal aborts and its walltime handler. All of them are
+    # compiled into a single alternation, so each chunk of output is scanned once.
+    message_patterns: ClassVar[dict[str, str]] = {
+        "cholesky": r"Cholesky decomposition failed. Matrix ill conditioned ?",
+        "cholesky_scf": r"Cholesky decompose failed: the matrix is not positive definite or",
+        "walltime": r"exceeded requested execution time",
+    }
+    messages_regex = re.compile("|".join(f"(?P<{key}>{val})" for key, val in message_patterns.items()))
+    head_size = 1024
+
+    def __init__(self, filename, history_size=10_000) -> None:
+        """
+        Args:
+            filename (str): Path to the CP2K output file.
+            history_size (int): Number of convergence values, SCF results and
+                band gaps kept. Defaults to 10000.
+        """
+        self.filename = filename
+        self.history_size = history_size
+        self.reset()
+
+    @classmethod
+    def get(cls, filename):
+        """Get the tracker shared by all callers for an output file."""
+        key = os.path.abspath(filename)
+        with cls._lock:
+            if key not in cls._trackers:
+                cls._trackers[key] = cls(filename)
+            return cls._trackers[key]
+
+    def reset(self) -> None:
+        """Forget everything parsed so far."""
+        self.offset = 0
+        self.head = b""
+        self.partial = b""
+        self.convergence: deque[float] = deque(maxlen=self.history_size)
+        self.scf_table: list[float] = []
+        self.n_scf_tables = 0
+        self.max_conv: float | None = None
+        self.scf_converged: deque[bool] = deque(maxlen=self.history_size)
+        self.same_conv_count = 0
+        self.max_same_conv_count = 0
+        self._last_conv: float | None = None
+        self.geo_opt_converged = False
+        self.geo_opt_not_converged = False
+        self.completed = False
+        self.homo_lumo_gaps: deque[float] = deque(maxlen=self.history_size)
+        self.spin_polarized = False
+        self.last_lines: deque[str] = deque(maxlen=10)
+        self.messages: dict[str, int] = {}
+        self._in_table = False
+        self._expect_table = False
+
+    def update(self):
+        """
+        Parse the bytes appended to the output file since the last update. The
+        tracker starts over if the file was truncated or replaced by the output
+        of another run.
+
+        Returns:
+            Cp2kOutputTracker: self, for chaining.
+        """
+        with self._lock:
+            if not os.path.isfile(self.filename):
+                self.reset()
+                return self
+            if self.filename.endswith((".gz", ".bz2", ".xz")):
+                # Compressed outputs cannot be read incrementally.
+                self.reset()
+                with zopen(self.filename, mode="rb") as file:
+                    data = file.read()
+            else:
+                with open(self.filename, mode="rb") as file:
+                    head = file.read(self.head_size)
+                    size = file.seek(0, os.SEEK_END)
+                    if size < self.offset or head[: len(self.head)] != self.head:
+                        self.reset()
+                    file.seek(self.offset)
+                    data = file.read()
+                    self.head = head
+            self.offset += len(data)
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            self.partial = data[end:]
+            text = data[:end].decode("utf-8", errors="replace")
+            for match in self.messages_regex.finditer(text):
+                self.messages[match.lastgroup] = self.messages.get(match.lastgroup, 0) + 1
+            for line in text.split("\n")[:-1]:
+                self._parse_line(line)
+        return self
+
+    def _parse_line(self, line) -> None:
+        """Update the tracked data with one complete line of output."""
+        self.last_lines.append(line)
+        stripped = line.strip()
+        if self._in_table:
+            if match := self.scf_row.search(line):
+                if match.group(5) is not None:
+                    conv = float(match.group(5))
+                    self.scf_table.append(conv)
+                    self.convergence.append(conv)
+                    self.max_conv = conv if self.max_conv is None else max(self.max_conv, conv)
+                    self.same_conv_count = self.same_conv_count + 1 if conv == self._last_conv else 1
+                    self.max_same_conv_count = max(self.max_same_conv_count, self.same_conv_count)
+                    self._last_conv = conv
+                return
+            if not stripped or (stripped.startswith(("*", "HFX_MEM_INFO")) and "SCF run" not in line):
+                # Blank lines, HFX info and warnings printed within the SCF loop
+                return
+            self._in_table = False
+        if self._expect_table:
+            self._expect_table = False
+            if stripped.startswith("---"):
+                self._in_table = True
+                self.scf_table = []
+                self.n_scf_tables += 1
+                return
+        if self.scf_header.match(line):
+            self._expect_table = True
+        elif "SCF run converged" in line:
+            self.scf_converged.append(True)
+        elif "SCF run NOT converged" in line:
+            self.scf_converged.append(False)
+        elif "GEOMETRY OPTIMIZATION COMPLETED" in line:
+            self.geo_opt_converged = True
+        elif "MAXIMUM NUMBER OF OPTIMIZATION STEPS REACHED" in line:
+            self.geo_opt_not_converged = True
+        elif "PROGRAM ENDED AT" in line:
+            self.completed = True
+        elif "Spin unrestricted (spin-polarized)" in line:
+            self.spin_polarized = True
+        elif "LUMO" in line and (match := self.homo_lumo.search(line)):
+            self.homo_lumo_gaps.append(float(match.group(1)))
+
+    @property
+    def band_gap(self):
+        """
+        The last HOMO - LUMO gap [eV], averaged over both spin channels for
+        spin-polarized runs. None if no gap was printed.
+        """
+        n_spin = 2 if self.spin_polarized else 1
+        if len(self.homo_lumo_gaps) < n_spin:
+            return None
+        return sum(self.homo_lumo_gaps[-n_spin:]) / n_spin
+
+    @property
+    def restart_files(self):
+        """Restart files written next to the output, in natural order (as in Cp2kOutput)."""
+        directory = os.path.dirname(self.filename)
+        files = [file for file in glob(os.path.join(directory, "*restart*")) if "bak" not in os.path.basename(file)]
+        return sorted(files, key=natural_keys)
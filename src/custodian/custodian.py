@@ -454,6 +454,7 @@ class Custodian:
             handler.n_applied_corrections = 0
 
         job.setup(self.directory)
+        self._log_setup_corrections(job)
 
         attempt = 0
         while self.total_errors < self.max_errors and self.errors_current_job < self.max_errors_per_job:
@@ -585,6 +586,7 @@ class Custodian:
                 logger.info(f"Setting up job no. 1 ({job.name}) ")
                 job.setup(directory=self.directory)
                 self.run_log.append({"job": job.as_dict(), "corrections": [], "job_n": job_n})
+                self._log_setup_corrections(job)
                 return len(self.jobs)
 
             # Continuing after running calculation
@@ -634,6 +636,7 @@ class Custodian:
             job = self.jobs[job_n]
             self.run_log.append({"job": job.as_dict(), "corrections": [], "job_n": job_n})
             job.setup(directory=self.directory)
+            self._log_setup_corrections(job)
             return len(self.jobs) - job_n
 
         except CustodianError as ex:
@@ -653,6 +656,17 @@ class Custodian:
                 gzip_dir(self.directory)
         return None
 
+    def _log_setup_corrections(self, job) -> None:
+        """
+        Log corrections applied by a job during setup, e.g., by input linting,
+        as if the handler had fired. They do not count towards the error
+        limits since no run was lost.
+        """
+        corrections = getattr(job, "setup_corrections", None) or []
+        for dct in corrections:
+            logger.info(type(dct["handler"]).__name__, extra=dct)
+        self.run_log[-1]["corrections"] += corrections
+
     def _do_check(self, handlers, terminate_func=None):
         """Checks the specified handlers. Returns True iff errors caught."""
         corrections = []
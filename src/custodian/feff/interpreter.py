@@ -44,17 +44,12 @@ class FeffModder(Modder):
                 'action': moddermodification} or {'dict': feffinput_key,
                 'action': moddermodification}
         """
-        modified = []
-        for action in actions:
-            if "dict" in action:
-                key = action["dict"]
-                modified.append(key)
-                self.feffinp[key] = self.modify_object(action["action"], self.feffinp[key])  # type:ignore[index]
-            elif "file" in action:
-                self.modify(action["action"], action["file"])
-            else:
-                raise ValueError(f"Unrecognized format: {action}")
-        if modified:
+        file_actions, dict_actions = self.compile_actions(actions)
+        for filename, modification in file_actions:
+            self.modify(modification, filename)
+        for key, modifications in dict_actions.items():
+            self.feffinp[key] = self.modify_object(modifications, self.feffinp[key])  # type:ignore[index]
+        if dict_actions:
             feff = self.feffinp
             feff_input = "\n\n".join(
                 str(feff[key])  # type:ignore[index,operator]
@@ -3,9 +3,9 @@
 import os
 
 from pymatgen.io.qchem.inputs import QCInput
-from pymatgen.io.qchem.outputs import QCOutput
 
 from custodian.custodian import ErrorHandler
+from custodian.qchem.utils import QCOutputTracker, load_qcoutput_data
 from custodian.utils import backup
 
 try:
@@ -58,7 +58,16 @@ class QChemErrorHandler(ErrorHandler):
     def check(self, directory="./"):
         """Checks output file for errors."""
         self._output_path = os.path.join(directory, self.output_file)
-        self.outdata = QCOutput(self._output_path).data
+        tracker = QCOutputTracker.get(self._output_path).update()
+        if tracker.completed and not tracker.errors and not tracker.multiple_outputs:
+            # A finished run without error messages has no errors in QCOutput either,
+            # so skip the full parse and the structure change analysis
+            self.outdata = None
+            self.errors = []
+            self.warnings = {}
+            self.opt_error_history = []
+            return False
+        self.outdata = load_qcoutput_data(self._output_path)
         self.errors = self.outdata.get("errors")
         self.warnings = self.outdata.get("warnings")
         # If we aren't out of optimization cycles, but we were in the past, reset the history
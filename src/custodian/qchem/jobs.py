@@ -12,11 +12,11 @@ from pathlib import Path
 import numpy as np
 from pymatgen.core import Molecule
 from pymatgen.io.qchem.inputs import QCInput
-from pymatgen.io.qchem.outputs import QCOutput, check_for_structure_changes
+from pymatgen.io.qchem.outputs import check_for_structure_changes
 from pymatgen.io.qchem.sets import OptSet
 
 from custodian.custodian import Job
-from custodian.qchem.utils import perturb_coordinates, vector_list_diff
+from custodian.qchem.utils import load_qcoutput_data, perturb_coordinates, vector_list_diff
 
 try:
     from openbabel import openbabel as ob
@@ -297,7 +297,7 @@ class QCJob(Job):
                 )
             )
 
-            freq_outdata = QCOutput(output_file + ".freq_pre").data
+            freq_outdata = load_qcoutput_data(output_file + ".freq_pre")
             if freq_outdata["version"] == "6":
                 opt_set = OptSet(molecule=freq_outdata["initial_molecule"], qchem_version=freq_outdata["version"])
                 opt_geom_opt = copy.deepcopy(opt_set.geom_opt) or {}
@@ -342,7 +342,7 @@ class QCJob(Job):
                         **QCJob_kwargs,
                     )
                 )
-                opt_outdata = QCOutput(f"{output_file}.{opt_method}_{ii}").data
+                opt_outdata = load_qcoutput_data(f"{output_file}.{opt_method}_{ii}")
                 opt_indata = QCInput.from_file(f"{input_file}.{opt_method}_{ii}")
                 if opt_outdata["version"] == "6":
                     opt_geom_opt = copy.deepcopy(opt_indata.geom_opt) or {}
@@ -390,7 +390,7 @@ class QCJob(Job):
                     )
                 )
 
-                freq_outdata = QCOutput(f"{output_file}.freq_{ii}").data
+                freq_outdata = load_qcoutput_data(f"{output_file}.freq_{ii}")
                 freq_indata = QCInput.from_file(f"{input_file}.freq_{ii}")
                 for key in freq_indata.rem:
                     if key not in {"job_type", "geom_opt2", "scf_guess_always"}:
@@ -488,7 +488,7 @@ class QCJob(Job):
                         **QCJob_kwargs,
                     )
                 )
-                opt_outdata = QCOutput(f"{output_file}.{opt_method}_{ii}").data
+                opt_outdata = load_qcoutput_data(f"{output_file}.{opt_method}_{ii}")
                 if first:
                     orig_species = copy.deepcopy(opt_outdata.get("species"))
                     orig_charge = copy.deepcopy(opt_outdata.get("charge"))
@@ -528,7 +528,7 @@ class QCJob(Job):
                         **QCJob_kwargs,
                     )
                 )
-                outdata = QCOutput(f"{output_file}.freq_{ii}").data
+                outdata = load_qcoutput_data(f"{output_file}.freq_{ii}")
                 indata = QCInput.from_file(f"{input_file}.freq_{ii}")
                 if "cpscf_nseg" in indata.rem:
                     freq_rem["cpscf_nseg"] = indata.rem["cpscf_nseg"]
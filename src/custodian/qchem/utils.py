@@ -1,8 +1,15 @@
 """This module contains utility functions that are useful for Q-Chem jobs."""
 
 import math
+import os
+import pickle
+import re
+import threading
+from typing import ClassVar
 
 import numpy as np
+from monty.io import zopen
+from pymatgen.io.qchem.outputs import QCOutput
 
 
 def perturb_coordinates(old_coords, negative_freq_vecs, molecule_perturb_scale, reversed_direction):
@@ -47,3 +54,164 @@ def vector_list_diff(vecs1, vecs2):
     for ii, vec1 in enumerate(vecs1):
         diff += np.linalg.norm(vecs2[ii] - vec1)
     return diff
+
+
+_output_cache: dict[tuple[int, int, int, int], bytes] = {}
+_output_cache_lock = threading.Lock()
+
+
+def load_qcoutput_data(filename, max_cached=8) -> dict:
+    """
+    Get QCOutput(filename).data, reusing the previous parse of the same file
+    contents. Files are identified by device, inode, size and modification time,
+    so a parse survives the job renaming the output (e.g. mol.qout to
+    mol.qout.opt_0). The error handler only parses outputs that may contain
+    errors (see QCOutputTracker), and opt_with_frequency_flattener then reuses
+    that parse instead of parsing the renamed file again.
+
+    The cache holds pickled snapshots, so every call returns an independent dict.
+
+    Args:
+        filename (str): path to the Q-Chem output file.
+        max_cached (int): number of parsed outputs to keep. Defaults to 8.
+
+    Returns:
+        dict: the QCOutput data.
+    """
+    stat = os.stat(filename)
+    key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _output_cache_lock:
+        cached = _output_cache.get(key)
+    if cached is not None:
+        return pickle.loads(cached)
+    data = QCOutput(filename).data
+    with _output_cache_lock:
+        _output_cache[key] = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        while len(_output_cache) > max_cached:
+            del _output_cache[next(iter(_output_cache))]
+    return data
+
+
+class QCOutputTracker:
+    """
+    Incremental scan of a (growing) Q-Chem output file for the messages that
+    decide whether it needs a full QCOutput parse. Each call to update() only
+    reads the bytes appended since the previous call. Trackers are shared per
+    output file, see :meth:`get`.
+
+    The tracked data is:
+
+        errors: number of occurrences of each error message in error_patterns.
+            A completed run can only have errors in QCOutput if one of these
+            messages was printed.
+        completed: whether Q-Chem finished ("Have a nice day.").
+        multiple_outputs: whether the file holds several jobs.
+    """
+
+    _trackers: ClassVar[dict] = {}
+    _lock = threading.Lock()
+
+    jobs = re.compile(r"Job\s+\d+\s+of\s+(\d+)\s+")
+    # Same messages as QCOutput, compiled into a single alternation
+    error_patterns: ClassVar[dict[str, str]] = {
+        "SCF_failed_to_converge": r"SCF failed to converge",
+        "out_of_opt_cycles": r"MAXIMUM OPTIMIZATION CYCLES REACHED"
+        r"|Maximum number of iterations reached during minimization algorithm",
+        "unable_to_determine_lamda": r"UNABLE TO DETERMINE Lamda IN FormD",  # codespell:ignore lamda
+        "back_transform_error": r"Error in back_transform",
+        "svd_failed": r"pinv\(\)\: svd failed",
+    }
+    errors_regex = re.compile("|".join(f"(?P<{key}>{val})" for key, val in error_patterns.items()))
+    head_size = 1024
+    tail_size = 64
+
+    def __init__(self, filename) -> None:
+        """
+        Args:
+            filename (str): Path to the Q-Chem output file.
+        """
+        self.filename = filename
+        self.reset()
+
+    @classmethod
+    def get(cls, filename):
+        """Get the tracker shared by all callers for an output file."""
+        key = os.path.abspath(filename)
+        with cls._lock:
+            if key not in cls._trackers:
+                cls._trackers[key] = cls(filename)
+            return cls._trackers[key]
+
+    def reset(self) -> None:
+        """Forget everything scanned so far."""
+        self.offset = 0
+        self.head = b""
+        self.tail = b""
+        self.inode = None
+        self.partial = b""
+        self.errors: dict[str, int] = {}
+        self.completed = False
+        self.multiple_outputs = False
+        self._thanked = False
+
+    def update(self):
+        """
+        Scan the bytes appended to the output file since the last update. The
+        tracker starts over if the file was truncated or replaced.
+
+        Returns:
+            QCOutputTracker: self, for chaining.
+        """
+        with self._lock:
+            if not os.path.isfile(self.filename):
+                self.reset()
+                return self
+            if self.filename.endswith((".gz", ".bz2", ".xz")):
+                # Compressed outputs cannot be read incrementally.
+                self.reset()
+                with zopen(self.filename, mode="rb") as file:
+                    data = file.read()
+            else:
+                with open(self.filename, mode="rb") as file:
+                    inode = os.fstat(file.fileno()).st_ino
+                    head = file.read(self.head_size)
+                    size = file.seek(0, os.SEEK_END)
+                    # Outputs copied over the old file keep the inode and often the
+                    # header, so also compare the last bytes that were scanned
+                    file.seek(max(self.offset - len(self.tail), 0))
+                    if (
+                        inode != self.inode
+                        or size < self.offset
+                        or head[: len(self.head)] != self.head
+                        or file.read(len(self.tail)) != self.tail
+                    ):
+                        self.reset()
+                    file.seek(self.offset)
+                    data = file.read()
+                    self.head = head
+                    self.inode = inode
+            self.offset += len(data)
+            self.tail = (self.tail + data)[-self.tail_size :]
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            self.partial = data[end:]
+            text = data[:end].decode("ISO-8859-1")
+            for match in self.errors_regex.finditer(text):
+                self.errors[match.lastgroup] = self.errors.get(match.lastgroup, 0) + 1
+            for line in text.split("\n")[:-1]:
+                self._scan_line(line)
+        return self
+
+    def _scan_line(self, line) -> None:
+        """Update the completion and job count with one complete line of output."""
+        if self._thanked and line.strip():
+            self.completed = line.strip().startswith("Have a nice day.")
+            self._thanked = False
+        if "Thank you very much for using Q-Chem." in line:
+            self._thanked = True
+            after = line.split("Thank you very much for using Q-Chem.", 1)[1].strip()
+            if after:
+                self.completed = after.startswith("Have a nice day.")
+                self._thanked = False
+        elif "Job" in line and (match := self.jobs.search(line)):
+            self.multiple_outputs = self.multiple_outputs or match.group(1) != "1"
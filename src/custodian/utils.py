@@ -3,17 +3,38 @@
 from __future__ import annotations
 
 import functools
+import gzip
+import hashlib
+import json
 import logging
 import os
+import shutil
 import tarfile
+import time
+from ast import literal_eval
+from collections import deque
 from glob import glob
 from typing import TYPE_CHECKING
 
+import psutil
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 if TYPE_CHECKING:
     from typing import ClassVar
 
 
-def backup(filenames, prefix="error", directory="./") -> None:
+def backup(
+    filenames,
+    prefix="error",
+    directory="./",
+    incremental=None,
+    max_file_size=None,
+    max_total_size=None,
+) -> None:
     """
     Backup files to a tar.gz file. Used, for example, in backing up the
     files of an errored run before performing corrections.
@@ -24,10 +45,69 @@ def backup(filenames, prefix="error", directory="./") -> None:
         prefix (str): prefix to the files. Defaults to error, which means a
             series of error.1.tar.gz, error.2.tar.gz, ... will be generated.
         directory (str): directory where the files exist
+        incremental (bool): Whether to store the backup incrementally in a
+            deduplicated store ({prefix}.store) with a manifest
+            ({prefix}.manifest.json) instead of writing a full tarball. Only
+            files that changed since the previous backup are stored again.
+            Use :func:`restore_backup` to reconstruct a backup. Defaults to
+            None, which means the CUSTODIAN_INCREMENTAL_BACKUP environment
+            variable is used (False if not set).
+        max_file_size (int): Files larger than this many bytes are not
+            stored in an incremental backup, only recorded in the manifest.
+            Defaults to None (no limit).
+        max_total_size (int): Maximum number of new bytes stored by a single
+            incremental backup. Changed files beyond this budget are only
+            recorded in the manifest. Defaults to None (no limit).
+    """
+    if incremental is None:
+        incremental = literal_eval(os.environ.get("CUSTODIAN_INCREMENTAL_BACKUP", "False").title())
+    num = _get_backup_num(prefix, directory)
+    if incremental:
+        _incremental_backup(filenames, prefix, num, directory, max_file_size, max_total_size)
+        return
+    prefix = f"{prefix}.{num}"
+    filename = os.path.join(directory, f"{prefix}.tar.gz")
+    logging.info(f"Backing up run to {filename}")
+    with tarfile.open(filename, "w:gz") as tar:
+        for fname in filenames:
+            for file in glob(os.path.join(directory, fname)):
+                tar.add(file, arcname=os.path.join(prefix, os.path.basename(file)))
+
+
+def restore_backup(num, prefix="error", directory="./", dest=None) -> str:
     """
-    backup_files = glob(os.path.join(directory, f"{prefix}.*.tar*"))
+    Reconstruct an incremental backup written by :func:`backup`.
+
+    Args:
+        num (int): Index of the backup, e.g., 2 for error.2.
+        prefix (str): prefix of the backup. Defaults to error.
+        directory (str): directory containing the manifest and the store.
+        dest (str): directory to restore the files to. Defaults to
+            {directory}/{prefix}.{num}.
+
+    Returns:
+        (str) The directory the files were restored to.
+    """
+    manifest = _load_backup_manifest(prefix, directory)
+    entries = [entry for entry in manifest["backups"] if entry["index"] == num]
+    if not entries:
+        raise ValueError(f"No incremental backup {prefix}.{num} found in {directory}")
+    dest = dest or os.path.join(directory, f"{prefix}.{num}")
+    os.makedirs(dest, exist_ok=True)
+    store = os.path.join(directory, f"{prefix}.store")
+    for fname, meta in entries[0]["files"].items():
+        with (
+            gzip.open(os.path.join(store, f"{meta['digest']}.gz"), "rb") as f_in,
+            open(os.path.join(dest, fname), "wb") as f_out,
+        ):
+            shutil.copyfileobj(f_in, f_out)
+    return dest
+
+
+def _get_backup_num(prefix, directory) -> int:
+    """Get the index of the next backup, accounting for tarballs and incremental backups."""
     nums = [0]
-    for file in backup_files:
+    for file in glob(os.path.join(directory, f"{prefix}.*.tar*")):
         try:
             if file.endswith(".tar.gz"):
                 nums.append(int(file.split(".")[-3]))
@@ -35,14 +115,66 @@ def backup(filenames, prefix="error", directory="./") -> None:
                 nums.append(int(file.split(".")[-2]))
         except (ValueError, IndexError):
             continue
-    num = max(nums)
-    prefix = f"{prefix}.{num + 1}"
-    filename = os.path.join(directory, f"{prefix}.tar.gz")
-    logging.info(f"Backing up run to {filename}")
-    with tarfile.open(filename, "w:gz") as tar:
-        for fname in filenames:
-            for file in glob(os.path.join(directory, fname)):
-                tar.add(file, arcname=os.path.join(prefix, os.path.basename(file)))
+    if os.path.isfile(os.path.join(directory, f"{prefix}.manifest.json")):
+        nums += [entry["index"] for entry in _load_backup_manifest(prefix, directory)["backups"]]
+    return max(nums) + 1
+
+
+def _load_backup_manifest(prefix, directory) -> dict:
+    path = os.path.join(directory, f"{prefix}.manifest.json")
+    if not os.path.isfile(path):
+        return {"backups": []}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _incremental_backup(filenames, prefix, num, directory, max_file_size, max_total_size) -> None:
+    """
+    Store the files in a content-addressed store. Files whose size and mtime
+    match the previous backup are not read again, and identical contents are
+    only stored once.
+    """
+    manifest = _load_backup_manifest(prefix, directory)
+    previous = manifest["backups"][-1]["files"] if manifest["backups"] else {}
+    store = os.path.join(directory, f"{prefix}.store")
+    os.makedirs(store, exist_ok=True)
+    logging.info(f"Backing up run incrementally to {store} as {prefix}.{num}")
+
+    files, skipped, stored = {}, {}, 0
+    for fname in filenames:
+        for file in sorted(glob(os.path.join(directory, fname))):
+            if not os.path.isfile(file):
+                continue
+            name = os.path.basename(file)
+            stat = os.stat(file)
+            prev = previous.get(name)
+            if prev and prev["size"] == stat.st_size and prev["mtime_ns"] == stat.st_mtime_ns:
+                files[name] = prev
+                continue
+            if max_file_size is not None and stat.st_size > max_file_size:
+                skipped[name] = {"size": stat.st_size, "reason": "max_file_size"}
+                continue
+            sha = hashlib.sha256()
+            with open(file, "rb") as f:
+                for chunk in iter(functools.partial(f.read, 1 << 20), b""):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            blob = os.path.join(store, f"{digest}.gz")
+            if not os.path.isfile(blob):
+                if max_total_size is not None and stored + stat.st_size > max_total_size:
+                    skipped[name] = {"size": stat.st_size, "reason": "max_total_size"}
+                    continue
+                with open(file, "rb") as f_in, gzip.open(f"{blob}.tmp", "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+                os.replace(f"{blob}.tmp", blob)
+                stored += stat.st_size
+            files[name] = {"digest": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    manifest["backups"].append({"index": num, "files": files, "skipped": skipped})
+    path = os.path.join(directory, f"{prefix}.manifest.json")
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(f"{path}.tmp", path)
 
 
 def get_execution_host_info():
@@ -65,6 +197,151 @@ def get_execution_host_info():
     return host or "unknown", cluster or "unknown"
 
 
+def get_process_cpu_times(directory="./", name=None) -> dict[int, float]:
+    """
+    Get the CPU time consumed so far by each process running in a directory.
+    MPI ranks started by a job inherit its working directory, so this picks
+    up every rank of the calculation without needing the process tree.
+
+    Args:
+        directory (str): Working directory of the processes.
+        name (str): Only include processes whose name contains this string,
+            e.g., "vasp". Defaults to None, i.e., all processes.
+
+    Returns:
+        dict[int, float]: Map of pid to user + system CPU time in seconds.
+    """
+    directory = os.path.realpath(directory)
+    cpu_times = {}
+    for proc in psutil.process_iter(["name", "cwd", "cpu_times"]):
+        info = proc.info
+        if info["cwd"] is None or info["cpu_times"] is None or os.path.realpath(info["cwd"]) != directory:
+            continue
+        if name is not None and name not in (info["name"] or ""):
+            continue
+        cpu_times[proc.pid] = info["cpu_times"].user + info["cpu_times"].system
+    return cpu_times
+
+
+# ioctl request to clone a file's extents (Linux FICLONE)
+_FICLONE = 0x40049409
+
+
+def snapshot_file(src, dst, link=True) -> str:
+    """
+    Copy a file without duplicating its data where the filesystem allows it.
+    A reflink (copy-on-write clone, e.g. on btrfs or XFS) is tried first, then
+    a hard link, and finally a regular copy.
+
+    A hard link shares the file with the snapshot, so the original must only be
+    replaced afterwards (written to a new file, or unlinked before being
+    rewritten), never modified in place. Pass link=False for files that may be
+    modified in place.
+
+    Args:
+        src (str): File to snapshot.
+        dst (str): Destination path. Must not exist.
+        link (bool): Whether a hard link may be used. Defaults to True.
+
+    Returns:
+        str: How the snapshot was made, "reflink", "link" or "copy".
+    """
+    if fcntl is not None:
+        with open(src, mode="rb") as f_src, open(dst, mode="wb") as f_dst:
+            try:
+                fcntl.ioctl(f_dst.fileno(), _FICLONE, f_src.fileno())
+                cloned = True
+            except OSError:
+                cloned = False
+        if cloned:
+            shutil.copystat(src, dst)
+            return "reflink"
+        os.remove(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return "link"
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+class ProgressMonitor:
+    """
+    Track the progress and CPU activity of a running calculation across
+    successive monitor checks. Progress is any change in the size or
+    modification time of the watched output files. Between progress events,
+    the CPU time consumed by each rank over a sliding window is compared
+    against the elapsed wall time so that a hung run (idle ranks) can be told
+    apart from a slow but healthy step (busy ranks), even if the hang follows a
+    long busy step without output.
+    """
+
+    def __init__(self, filenames, process_name=None, window=None) -> None:
+        """
+        Args:
+            filenames ([str]): Output files whose growth indicates progress.
+            process_name (str): Substring of the process name of the ranks,
+                see get_process_cpu_times.
+            window (float): Length in seconds of the window over which the CPU
+                utilization is measured. Defaults to None, i.e. since progress
+                was last observed.
+        """
+        self.filenames = filenames
+        self.process_name = process_name
+        self.window = window
+        self._signature = None
+        self._progress_time = 0.0
+        # (time, CPU time of each rank) of the samples within the window
+        self._samples: deque[tuple[float, dict[int, float]]] = deque()
+
+    def update(self, directory="./") -> tuple[float, float | None]:
+        """Take a new sample.
+
+        Args:
+            directory (str): Directory of the calculation.
+
+        Returns:
+            tuple[float, float | None]: Wall time in seconds since progress was
+                last observed and the highest CPU utilization of any rank over
+                the window (1 = one fully busy core), measured from the oldest
+                sample still inside it. The utilization is None if no rank has
+                been sampled twice since progress was last observed.
+        """
+        signature = []
+        for filename in self.filenames:
+            try:
+                st = os.stat(os.path.join(directory, filename))
+                signature.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        now = time.monotonic()
+        cpu_times = get_process_cpu_times(directory, self.process_name)
+        if signature != self._signature:
+            self._signature = signature
+            self._progress_time = now
+            self._samples.clear()
+            if cpu_times:
+                self._samples.append((now, cpu_times))
+            return 0.0, None
+
+        stalled = now - self._progress_time
+        if self.window is not None:
+            # Keep the last sample before the window if none fall inside it.
+            while len(self._samples) > 1 and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+        if not cpu_times:
+            # The ranks have not started yet.
+            return stalled, None
+        self._samples.append((now, cpu_times))
+        start_time, start_cpu_times = self._samples[0]
+        usage = [cpu_times[pid] - start for pid, start in start_cpu_times.items() if pid in cpu_times]
+        if not usage or now <= start_time:
+            return stalled, None
+        return stalled, max(usage) / (now - start_time)
+
+
 class tracked_lru_cache:
     """
     Decorator wrapping the functools.lru_cache adding a tracking of the
@@ -6,6 +6,7 @@ by modifying the input files.
 
 from __future__ import annotations
 
+import copy
 import datetime
 import logging
 import multiprocessing
@@ -15,7 +16,9 @@ import shutil
 import time
 import warnings
 from collections import Counter
-from math import ceil, prod
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil, log10, prod, sqrt
+from statistics import NormalDist
 from typing import ClassVar
 
 import numpy as np
@@ -32,10 +35,17 @@ from pymatgen.transformations.standard_transformations import SupercellTransform
 from custodian.ansible.actions import FileActions
 from custodian.ansible.interpreter import Modder
 from custodian.custodian import ErrorHandler
-from custodian.utils import backup
+from custodian.utils import ProgressMonitor, backup
 from custodian.vasp.interpreter import VaspModder
 from custodian.vasp.io import load_outcar, load_vasprun
-from custodian.vasp.utils import increase_k_point_density, is_valid_poscar
+from custodian.vasp.utils import (
+    _estimate_num_k_points_from_kspacing,
+    estimate_restart_file_size,
+    get_loop_timings,
+    get_nelect,
+    increase_k_point_density,
+    is_valid_poscar,
+)
 
 __author__ = (
     "Shyue Ping Ong, William Davidson Richards, Anubhav Jain, Wei Chen, Stephen Dacek, Andrew Rosen, Janosh Riebesell"
@@ -58,6 +68,111 @@ VASP_BACKUP_FILES = {
     "std_err.txt",
 }
 
+# INCAR tags that can change between restarts while the previous WAVECAR
+# remains a valid starting guess (same structure, k-points and basis set).
+WAVECAR_SAFE_TAGS = frozenset(
+    {
+        "ALGO",
+        "IALGO",
+        "AMIX",
+        "BMIX",
+        "AMIX_MAG",
+        "BMIX_MAG",
+        "AMIN",
+        "IMIX",
+        "MAXMIX",
+        "NELM",
+        "NELMIN",
+        "NELMDL",
+        "EDIFF",
+        "EDIFFG",
+        "ISEARCH",
+        "TIME",
+        "NBANDS",
+        "ISMEAR",
+        "SIGMA",
+        "LREAL",
+        "NSW",
+        "IBRION",
+        "POTIM",
+        "NCORE",
+        "NPAR",
+        "KPAR",
+    }
+)
+# INCAR tags after which only the CHGCAR remains valid, since the charge density
+# is stored on the real-space grid and does not depend on the k-point set.
+CHGCAR_SAFE_TAGS = WAVECAR_SAFE_TAGS | {"ISYM", "SYMPREC", "KSPACING", "KGAMMA"}
+
+
+def get_warm_start_actions(actions: list[dict], directory: str = "./") -> list[dict]:
+    """
+    Decide whether the WAVECAR and CHGCAR of the previous run remain valid after
+    a set of corrections and return the INCAR actions that make the restart read
+    them (or ignore them if they became stale).
+
+    The WAVECAR is reused (ISTART = 1, ICHARG = 0) if only WAVECAR_SAFE_TAGS are
+    changed. Otherwise, the CHGCAR is reused (ISTART = 0, ICHARG = 1) if only
+    CHGCAR_SAFE_TAGS or the KPOINTS are changed. If neither is valid, existing
+    files are ignored (ISTART = 0, ICHARG = 2) since VASP would otherwise read a
+    stale WAVECAR by default. Copying CONTCAR to POSCAR keeps both files valid,
+    as they are written for the final ionic step. Corrections that set ISTART or
+    ICHARG themselves, delete either file, or non-selfconsistent runs
+    (ICHARG >= 10) are left untouched.
+
+    Args:
+        actions (list[dict]): Actions of the correction, before they are applied.
+        directory (str): Directory of the calculation.
+
+    Returns:
+        list[dict]: Additional INCAR actions, empty if nothing needs to change.
+    """
+    incar_path = zpath(os.path.join(directory, "INCAR"))
+    if not os.path.isfile(incar_path):
+        return []
+    incar = Incar.from_file(incar_path)
+    if incar.get("ICHARG", 0) >= 10:
+        return []
+
+    changed_tags: set[str] = set()
+    changed_files: set[str] = set()
+    for action in actions:
+        if "dict" in action:
+            if action["dict"] != "INCAR":
+                changed_files.add(action["dict"])
+                continue
+            for mod in action["action"].values():
+                changed_tags.update(key.upper() for key in mod)
+        else:
+            for cmd, settings in action["action"].items():
+                if cmd == "_file_delete":
+                    changed_files.add(action["file"])
+                elif cmd == "_file_copy" and action["file"] == "CONTCAR" and settings.get("dest") == "POSCAR":
+                    continue
+                else:
+                    changed_files.update({action["file"], settings.get("dest")} - {None})
+
+    if changed_tags & {"ISTART", "ICHARG"} or changed_files & {"WAVECAR", "CHGCAR"}:
+        return []
+
+    def is_valid(filename):
+        path = os.path.join(directory, filename)
+        return os.path.isfile(path) and os.path.getsize(path) > 0
+
+    structure_changed = bool(changed_files - {"KPOINTS"})
+    settings = {}
+    if not structure_changed and is_valid("WAVECAR") and changed_tags <= WAVECAR_SAFE_TAGS and not changed_files:
+        settings = {"ISTART": 1, "ICHARG": 0}
+    elif not structure_changed and is_valid("CHGCAR") and changed_tags <= CHGCAR_SAFE_TAGS:
+        settings = {"ISTART": 0, "ICHARG": 1}
+    elif is_valid("WAVECAR") or is_valid("CHGCAR"):
+        settings = {"ISTART": 0, "ICHARG": 2}
+
+    # Only set what differs from the INCAR (or VASP's defaults given the files present).
+    defaults = {"ISTART": int(is_valid("WAVECAR")), "ICHARG": 0 if is_valid("WAVECAR") else 2}
+    settings = {key: val for key, val in settings.items() if incar.get(key, defaults[key]) != val}
+    return [{"dict": "INCAR", "action": {"_set": settings}}] if settings else []
+
 
 class VaspErrorHandler(ErrorHandler):
     """
@@ -147,6 +262,7 @@ class VaspErrorHandler(ErrorHandler):
         output_filename="vasp.out",
         errors_subset_to_catch=None,
         vtst_fixes=False,
+        warm_start: bool = False,
         **kwargs,
     ) -> None:
         """Initialize the handler with the output file to check.
@@ -170,6 +286,9 @@ class VaspErrorHandler(ErrorHandler):
             vtst_fixes (bool): Whether to consider VTST optimizers. Defaults to
                 False for compatibility purposes, but if you have VTST, you
                 would likely benefit from setting this to True.
+            warm_start (bool): Whether to set ISTART/ICHARG after a correction
+                so that the restart reuses the WAVECAR/CHGCAR when still valid
+                (see :func:`get_warm_start_actions`). Defaults to False.
             **kwargs: Ignored. Added to increase signature flexibility.
         """
         self.output_filename = output_filename
@@ -177,6 +296,7 @@ class VaspErrorHandler(ErrorHandler):
         self.error_count: Counter[str] = Counter()
         self.errors_subset_to_catch = errors_subset_to_catch or list(VaspErrorHandler.error_msgs)
         self.vtst_fixes = vtst_fixes
+        self.warm_start = warm_start
         self.logger = logging.getLogger(type(self).__name__)
 
     def check(self, directory="./"):
@@ -216,6 +336,45 @@ class VaspErrorHandler(ErrorHandler):
             self.logger.error(msg, extra={"incar": incar.as_dict()})
         return len(self.errors) > 0
 
+    def preflight_check(self, directory="./"):
+        """
+        Check the input files for errors that VASP would deterministically
+        raise at startup, so that they can be corrected before launching.
+        Only the supported subset of the errors is detected: "tet",
+        "algo_tet", "elf_kpar", "dfpt_ncore" and "too_few_bands".
+        """
+        vi = VaspInput.from_directory(directory)
+        incar = vi["INCAR"]
+        errors = set()
+
+        if incar.get("ISMEAR", 1) <= -4:
+            if vi["KPOINTS"] is not None:
+                n_kpts = vi["KPOINTS"].num_kpts or prod(vi["KPOINTS"].kpts[0])
+            elif incar.get("KSPACING"):
+                n_kpts = prod(_estimate_num_k_points_from_kspacing(vi["POSCAR"].structure, incar["KSPACING"]))
+            else:
+                n_kpts = 4
+            if n_kpts < 4:
+                errors.add("tet")
+            if incar.get("ALGO", "Normal").lower() in {"all", "damped"} or 50 <= incar.get("IALGO", 38) <= 59:
+                errors.add("algo_tet")
+
+        if incar.get("LELF") and incar.get("KPAR", 1) > 1:
+            errors.add("elf_kpar")
+
+        if (incar.get("LEPSILON") or incar.get("LCALCEPS") or incar.get("IBRION") in {7, 8}) and (
+            incar.get("NCORE", 1) != 1 or "NPAR" in incar
+        ):
+            errors.add("dfpt_ncore")
+
+        if (nbands := incar.get("NBANDS")) and (nelect := get_nelect(directory)):
+            n_occupied = nelect if incar.get("LNONCOLLINEAR") else nelect / 2
+            if nbands <= n_occupied:
+                errors.add("too_few_bands")
+
+        self.errors = errors & set(self.errors_subset_to_catch)
+        return len(self.errors) > 0
+
     def correct(self, directory="./"):
         """Perform corrections."""
         backup(VASP_BACKUP_FILES | {self.output_filename}, directory=directory)
@@ -758,6 +917,8 @@ class VaspErrorHandler(ErrorHandler):
                     )
             self.error_count["algo_tet"] += 1
 
+        if self.warm_start and actions:
+            actions += get_warm_start_actions(actions, directory)
         VaspModder(vi=vi, directory=directory).apply_actions(actions)
         return {"errors": list(self.errors), "actions": actions}
 
@@ -1131,14 +1292,18 @@ class UnconvergedErrorHandler(ErrorHandler):
 
     is_monitor = False
 
-    def __init__(self, output_filename: str = "vasprun.xml") -> None:
+    def __init__(self, output_filename: str = "vasprun.xml", warm_start: bool = False) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
             output_filename (str): Filename for the vasprun.xml file. Change
                 this only if it is different from the default (unlikely).
+            warm_start (bool): Whether to set ISTART/ICHARG after a correction
+                so that the restart reads the WAVECAR/CHGCAR that remain valid
+                (see :func:`get_warm_start_actions`). Defaults to False.
         """
         self.output_filename = output_filename
+        self.warm_start = warm_start
 
     def check(self, directory="./") -> bool:
         """Check for error."""
@@ -1235,6 +1400,8 @@ class UnconvergedErrorHandler(ErrorHandler):
                         ]
                     errors += ["psmaxn"]
 
+            if self.warm_start:
+                actions += get_warm_start_actions(actions, directory)
             backup(VASP_BACKUP_FILES, directory=directory)
             VaspModder(vi=vi, directory=directory).apply_actions(actions)
             return {"errors": errors, "actions": actions}
@@ -1527,12 +1694,14 @@ class PotimErrorHandler(ErrorHandler):
 class FrozenJobErrorHandler(ErrorHandler):
     """
     Detects an error when the output file has not been updated
-    in timeout seconds. Changes ALGO to Normal from Fast.
+    in timeout seconds, or when neither the output files nor the CPU time
+    of the VASP ranks have advanced in idle_timeout seconds. Changes ALGO
+    to Normal from Fast.
     """
 
     is_monitor = True
 
-    def __init__(self, output_filename: str = "vasp.out", timeout=21_600) -> None:
+    def __init__(self, output_filename: str = "vasp.out", timeout=21_600, idle_timeout=600, cpu_threshold=0.05) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
@@ -1543,12 +1712,27 @@ class FrozenJobErrorHandler(ErrorHandler):
             timeout (int): The time in seconds between checks where if there
                 is no activity on the output file, the run is considered
                 frozen. Defaults to 3600 seconds, i.e., 1 hour.
+            idle_timeout (int): The time in seconds without progress in the
+                output file, OSZICAR or OUTCAR after which the run is considered
+                frozen if no VASP rank used more than cpu_threshold of a core
+                over the last idle_timeout seconds. Slow but healthy steps keep the ranks busy
+                and are only caught by timeout. Defaults to 600 seconds.
+            cpu_threshold (float): Maximum CPU utilization of the busiest rank
+                for the run to be considered idle. Defaults to 0.05.
         """
         self.output_filename = output_filename
         self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.cpu_threshold = cpu_threshold
+        self._monitor = ProgressMonitor(
+            [output_filename, "OSZICAR", "OUTCAR"], process_name="vasp", window=idle_timeout
+        )
 
     def check(self, directory="./") -> bool | None:
         """Check for error."""
+        stalled, cpu_usage = self._monitor.update(directory)
+        if cpu_usage is not None and stalled > self.idle_timeout and cpu_usage < self.cpu_threshold:
+            return True
         st = os.stat(os.path.join(directory, self.output_filename))
         if time.time() - st.st_mtime > self.timeout:
             return True
@@ -1582,7 +1766,7 @@ class NonConvergingErrorHandler(ErrorHandler):
 
     is_monitor = True
 
-    def __init__(self, output_filename: str = "OSZICAR", nionic_steps=10) -> None:
+    def __init__(self, output_filename: str = "OSZICAR", nionic_steps=10, warm_start: bool = False) -> None:
         """Initialize the handler with the output file to check.
 
         Args:
@@ -1591,9 +1775,14 @@ class NonConvergingErrorHandler(ErrorHandler):
             nionic_steps (int): The threshold number of ionic steps that
                 needs to hit the maximum number of electronic steps for the
                 run to be considered non-converging.
+            warm_start (bool): Whether to set ISTART/ICHARG after a correction
+                so that the restart reads the WAVECAR/CHGCAR that remain valid
+                (see :func:`get_warm_start_actions`). Corrections that reset
+                the charge density (ICHARG = 2) are kept. Defaults to False.
         """
         self.output_filename = output_filename
         self.nionic_steps = nionic_steps
+        self.warm_start = warm_start
 
     def check(self, directory="./"):
         """Check for error."""
@@ -1639,7 +1828,12 @@ class NonConvergingErrorHandler(ErrorHandler):
 
         # NOTE: This is the amin error handler
         # Sometimes an AMIN warning can appear with large unit cell dimensions, so we'll address it now
-        if max(Structure.from_file(os.path.join(directory, "CONTCAR")).lattice.abc) > 50 and amin > 0.01:
+        # CONTCAR is only written after the first ionic step, so fall back to POSCAR when a
+        # monitor triggers during the first SCF cycle.
+        structure_file = os.path.join(directory, "CONTCAR")
+        if not os.path.isfile(structure_file) or os.path.getsize(structure_file) == 0:
+            structure_file = os.path.join(directory, "POSCAR")
+        if max(Structure.from_file(structure_file).lattice.abc) > 50 and amin > 0.01:
             actions.append({"dict": "INCAR", "action": {"_set": {"AMIN": 0.01}}})
 
         # If a hybrid is used, do not set Algo = Fast or VeryFast. Hybrid calculations do not
@@ -1680,6 +1874,8 @@ class NonConvergingErrorHandler(ErrorHandler):
                     )
 
         if actions:
+            if self.warm_start:
+                actions += get_warm_start_actions(actions, directory)
             backup(VASP_BACKUP_FILES, directory=directory)
             VaspModder(vi=vi, directory=directory).apply_actions(actions)
             return {"errors": ["Non-converging job"], "actions": actions}
@@ -1696,16 +1892,133 @@ class NonConvergingErrorHandler(ErrorHandler):
         return cls(
             output_filename=dct.get("output_filename", "OSZICAR"),
             nionic_steps=dct.get("nionic_steps", 10),
+            warm_start=dct.get("warm_start", False),
         )
 
 
+class ScfDivergenceHandler(NonConvergingErrorHandler):
+    """
+    Predictive variant of the NonConvergingErrorHandler. Rather than waiting
+    for several ionic steps to exhaust NELM, this monitor fits the decay of
+    log10|dE| over the electronic steps in the OSZICAR and flags SCF cycles,
+    including the one still running, that cannot reach EDIFF within NELM.
+    Corrections follow the same ALGO/AMIX ladder as NonConvergingErrorHandler.
+    """
+
+    is_monitor = True
+
+    def __init__(
+        self,
+        output_filename: str = "OSZICAR",
+        nionic_steps: int = 1,
+        confidence: float = 0.9,
+        min_electronic_steps: int = 6,
+        window: int = 10,
+        warm_start: bool = False,
+    ) -> None:
+        """Initialize the handler with the output file to check.
+
+        Args:
+            output_filename (str): This is the OSZICAR file. Change
+                this only if it is different from the default (unlikely).
+            nionic_steps (int): The number of most recent SCF cycles that must
+                all be predicted (or observed) to not converge within NELM
+                before a correction is triggered. Defaults to 1.
+            confidence (float): Confidence level in (0, 1) required before a
+                cycle is declared non-converging. The fitted convergence rate
+                is made more optimistic by the corresponding one-sided normal
+                quantile of its standard error, so higher values trigger later
+                and with fewer false positives. Defaults to 0.9.
+            min_electronic_steps (int): Minimum number of electronic steps in
+                the fit window before any prediction is made. Defaults to 6.
+            window (int): Number of most recent electronic steps of a cycle
+                used for the fit. Defaults to 10.
+            warm_start (bool): Whether to set ISTART/ICHARG after a correction
+                so that the restart reads the WAVECAR/CHGCAR that remain valid
+                (see :func:`get_warm_start_actions`). Defaults to False.
+        """
+        super().__init__(output_filename=output_filename, nionic_steps=nionic_steps, warm_start=warm_start)
+        self.confidence = confidence
+        self.min_electronic_steps = min_electronic_steps
+        self.window = window
+
+    def check(self, directory="./"):
+        """Check for error."""
+        try:
+            incar = Incar.from_file(os.path.join(directory, "INCAR"))
+            oszicar = Oszicar(os.path.join(directory, self.output_filename))
+        except Exception:
+            return False
+        n_elm = incar.get("NELM", 60)
+        ediff = incar.get("EDIFF", 1e-4)
+        elec_steps = oszicar.electronic_steps
+        n_complete = len(oszicar.ionic_steps)
+        if len(elec_steps) < self.nionic_steps:
+            return False
+        for idx in range(len(elec_steps) - self.nionic_steps, len(elec_steps)):
+            steps = elec_steps[idx]
+            if len(steps) >= n_elm:
+                continue
+            if idx < n_complete:
+                # Converged within NELM.
+                return False
+            # The non-selfconsistent startup steps of the first cycle say nothing about convergence.
+            n_skip = abs(incar.get("NELMDL", -5)) if idx == 0 else 0
+            if not self._predict_non_convergence(steps, n_skip, n_elm, ediff):
+                return False
+        return True
+
+    def _predict_non_convergence(self, steps: list[dict], n_skip: int, n_elm: int, ediff: float) -> bool:
+        """Extrapolate the log10|dE| trend of a running SCF cycle to NELM.
+
+        Args:
+            steps (list[dict]): Electronic steps of the cycle as parsed by Oszicar.
+            n_skip (int): Number of leading steps excluded from the fit.
+            n_elm (int): Maximum number of electronic steps.
+            ediff (float): Energy convergence criterion.
+
+        Returns:
+            bool: True if EDIFF is predicted to be out of reach within NELM.
+        """
+        d_e = [abs(step["dE"]) for step in steps[n_skip:] if isinstance(step.get("dE"), float)]
+        d_e = d_e[-self.window :]
+        if len(d_e) < max(self.min_electronic_steps, 3):
+            return False
+        x = np.arange(len(steps) - len(d_e) + 1, len(steps) + 1, dtype=float)
+        y = np.log10(np.maximum(d_e, 1e-16))
+        slope, intercept = np.polyfit(x, y, 1)
+        residuals = y - (slope * x + intercept)
+        std_err = sqrt(np.sum(residuals**2) / (len(x) - 2) / np.sum((x - x.mean()) ** 2))
+        slope_bound = slope - NormalDist().inv_cdf(self.confidence) * std_err
+        if slope_bound >= 0:
+            return True
+        y_last = slope * x[-1] + intercept
+        return x[-1] + (log10(ediff) - y_last) / slope_bound > n_elm
+
+    def correct(self, directory="./"):
+        """Perform corrections."""
+        dct = super().correct(directory)
+        return {"errors": ["Predicted non-converging SCF"], "actions": dct["actions"]}
+
+    @classmethod
+    def from_dict(cls, dct):
+        """Create a ScfDivergenceHandler from a dict representation."""
+        return cls(**{k: v for k, v in dct.items() if not k.startswith("@")})
+
+
 class WalltimeHandler(ErrorHandler):
     """
     Check if a run is nearing the walltime. If so, write a STOPCAR with
     LSTOP or LABORT = .True.. You can specify the walltime either in the init (
-    which is unfortunately necessary for SGE and SLURM systems. If you happen
-    to be running on a PBS system and the PBS_WALLTIME variable is in the run
-    environment, the wall time will be automatically determined if not set.
+    which is unfortunately necessary for SGE systems. If you happen
+    to be running on a SLURM system that exports SLURM_JOB_END_TIME or a PBS
+    system and the PBS_WALLTIME variable is in the run environment, the wall
+    time will be automatically determined if not set.
+
+    The time needed for the step in progress is predicted from the recent LOOP+
+    (or LOOP) timings in the OUTCAR as the larger of their 95th percentile and
+    their linear trend, and the time to write the WAVECAR/CHGCAR is estimated
+    from the OUTCAR header and write_bandwidth.
     """
 
     is_monitor = True
@@ -1718,22 +2031,24 @@ class WalltimeHandler(ErrorHandler):
     # error
     raises_runtime_error = False
 
-    def __init__(self, wall_time=None, buffer_time=300, electronic_step_stop=False) -> None:
+    # Number of most recent steps used to predict the duration of the next one.
+    n_recent_steps = 10
+
+    def __init__(self, wall_time=None, buffer_time=300, electronic_step_stop=False, write_bandwidth=1e8) -> None:
         """Initialize the handler with a buffer time.
 
         Args:
-            wall_time (int): Total walltime in seconds. If this is None and
-                the job is running on a PBS system, the handler will attempt to
-                determine the walltime from the PBS_WALLTIME environment
-                variable. If the wall time cannot be determined or is not
-                set, this handler will have no effect.
+            wall_time (int): Total walltime in seconds. If this is None, the
+                handler will attempt to determine the walltime from the
+                SLURM_JOB_END_TIME, PBS_WALLTIME or SBATCH_TIMELIMIT environment
+                variables, in that order. If the wall time cannot be determined
+                or is not set, this handler will have no effect.
             buffer_time (int): The min amount of buffer time in secs at the
                 end that the STOPCAR will be written. The STOPCAR is written
-                when the time remaining is < the higher of 3 x the average
-                time for each ionic step and the buffer time. Defaults to
-                300 secs, which is the default polling time of Custodian.
-                This is typically sufficient for the current ionic step to
-                complete. But if other operations are being performed after
+                when the time remaining is < the predicted time for the current
+                step, plus the time to write the WAVECAR/CHGCAR, plus the buffer
+                time. Defaults to 300 secs, which is the default polling time of
+                Custodian. But if other operations are being performed after
                 the run has stopped, the buffer time may need to be increased
                 accordingly.
             electronic_step_stop (bool): Whether to check for electronic steps
@@ -1743,16 +2058,10 @@ class WalltimeHandler(ErrorHandler):
                 Should be used with LWAVE = .True. to be useful. If this is
                 True, the STOPCAR is written with LABORT = .TRUE. instead of
                 LSTOP = .TRUE.
+            write_bandwidth (float): Sustained write speed in bytes/s used to
+                estimate how long VASP takes to write the WAVECAR and CHGCAR
+                once stopped. Defaults to 1e8, i.e., 100 MB/s.
         """
-        if wall_time is not None:
-            self.wall_time = wall_time
-        elif "PBS_WALLTIME" in os.environ:
-            self.wall_time = int(os.environ["PBS_WALLTIME"])
-        elif "SBATCH_TIMELIMIT" in os.environ:
-            self.wall_time = int(os.environ["SBATCH_TIMELIMIT"])
-        else:
-            self.wall_time = None
-        self.buffer_time = buffer_time
         # Sets CUSTODIAN_WALLTIME_START as the start time to use for
         # future jobs in the same batch environment.  Can also be
         # set manually be the user in the batch environment.
@@ -1766,6 +2075,20 @@ class WalltimeHandler(ErrorHandler):
                 self.start_time, "%a %b %d %H:%M:%S UTC %Y"
             )
 
+        if wall_time is not None:
+            self.wall_time = wall_time
+        elif "SLURM_JOB_END_TIME" in os.environ:
+            end_time = datetime.datetime.fromtimestamp(int(os.environ["SLURM_JOB_END_TIME"]))
+            self.wall_time = int((end_time - self.start_time).total_seconds())
+        elif "PBS_WALLTIME" in os.environ:
+            self.wall_time = int(os.environ["PBS_WALLTIME"])
+        elif "SBATCH_TIMELIMIT" in os.environ:
+            self.wall_time = int(os.environ["SBATCH_TIMELIMIT"])
+        else:
+            self.wall_time = None
+        self.buffer_time = buffer_time
+        self.write_bandwidth = write_bandwidth
+
         self.electronic_step_stop = electronic_step_stop
         self.electronic_steps_timings = [0]
         self.prev_check_time = self.start_time
@@ -1775,27 +2098,41 @@ class WalltimeHandler(ErrorHandler):
         if self.wall_time:
             run_time = datetime.datetime.now() - self.start_time
             total_secs = run_time.total_seconds()
+            outcar_path = os.path.join(directory, "OUTCAR")
             try:
-                outcar = load_outcar(os.path.join(directory, "OUTCAR"))
+                timings = get_loop_timings(outcar_path)
+                flush_time = estimate_restart_file_size(outcar_path) / self.write_bandwidth
             except Exception:  # Can't perform check if Outcar not valid (e.g. file being written)
                 return False
-            if not self.electronic_step_stop:
-                # Determine max time per ionic step.
-                outcar.read_pattern({"timings": r"LOOP\+.+real time(.+)"}, postprocess=float)
-                time_per_step = np.max(outcar.data.get("timings")) if outcar.data.get("timings", []) else 0
-            else:
-                # Determine max time per electronic step.
-                outcar.read_pattern({"timings": "LOOP:.+real time(.+)"}, postprocess=float)
-                time_per_step = np.max(outcar.data.get("timings")) if outcar.data.get("timings", []) else 0
+            time_per_step = self.predict_step_time(timings["loop" if self.electronic_step_stop else "loop_plus"])
 
-            # If the remaining time is less than average time for 3
-            # steps or buffer_time.
+            # If the remaining time is less than the time to finish the current
+            # step and write the restart files, plus the buffer_time.
             time_left = self.wall_time - total_secs
-            if time_left < max(time_per_step * 3, self.buffer_time):
+            if time_left < time_per_step + flush_time + self.buffer_time:
                 return True
 
         return False
 
+    def predict_step_time(self, timings) -> float:
+        """Predict the duration of the next step from the most recent ones.
+
+        Args:
+            timings ([float]): Real time in seconds of each completed step.
+
+        Returns:
+            float: The larger of the 95th percentile of the recent step times
+                and their linear trend extrapolated to the next step.
+        """
+        recent = np.array(timings[-self.n_recent_steps :], dtype=float)
+        if len(recent) == 0:
+            return 0
+        time_per_step = np.percentile(recent, 95)
+        if len(recent) >= 3:
+            slope, intercept = np.polyfit(np.arange(len(recent)), recent, 1)
+            time_per_step = max(time_per_step, slope * len(recent) + intercept)
+        return float(time_per_step)
+
     def correct(self, directory="./"):
         """Perform corrections."""
         content = "LSTOP = .TRUE." if not self.electronic_step_stop else "LABORT = .TRUE."
@@ -1960,3 +2297,114 @@ class PositiveEnergyErrorHandler(ErrorHandler):
             return {"errors": ["Positive energy"], "actions": actions}
         # Unfixable error. Just return None for actions.
         return {"errors": ["Positive energy"], "actions": None}
+
+
+class NEBImageHandler(ErrorHandler):
+    """
+    Runs another handler against every image directory (01, 02, ...) of a
+    VaspNEBJob concurrently and aggregates the corrections. Each image gets its
+    own copy of the wrapped handler. While the wrapped handler runs, the shared
+    INCAR, KPOINTS and POTCAR of the top-level directory are linked into the
+    image directories, so corrections to them apply to the whole band, while
+    corrections to POSCAR/CONTCAR stay with their image. A shared file is only
+    corrected once, by the first flagged image, so that the same error in
+    several images does not climb a correction ladder several times.
+    """
+
+    SHARED_FILES = ("INCAR", "KPOINTS", "POTCAR")
+
+    def __init__(self, handler, images=None) -> None:
+        """Initialize the handler with the handler to fan out.
+
+        Args:
+            handler (ErrorHandler): The handler to run in each image directory,
+                e.g., NonConvergingErrorHandler().
+            images ([str]): Image directories relative to the run directory.
+                Defaults to all numbered subdirectories except the first and
+                last, i.e., the fixed end points.
+        """
+        self.handler = handler
+        self.images = images
+        self.is_monitor = handler.is_monitor
+        self.is_terminating = handler.is_terminating
+        self.raises_runtime_error = handler.raises_runtime_error
+        self._image_handlers: dict[str, ErrorHandler] = {}
+        self._flagged: list[str] = []
+        self._check_times: dict[str, float] = {}
+
+    def _get_images(self, directory):
+        if self.images is not None:
+            return list(self.images)
+        neb_dirs = sorted(
+            path for path in os.listdir(directory) if path.isdigit() and os.path.isdir(os.path.join(directory, path))
+        )
+        return neb_dirs[1:-1]
+
+    def _link_shared_files(self, directory, images):
+        links = []
+        for image in images:
+            for filename in self.SHARED_FILES:
+                src = os.path.abspath(os.path.join(directory, filename))
+                dst = os.path.join(directory, image, filename)
+                if os.path.isfile(src) and not os.path.lexists(dst):
+                    os.symlink(src, dst)
+                    links.append(dst)
+        return links
+
+    def _check_image(self, directory, image):
+        handler = self._image_handlers.setdefault(image, copy.deepcopy(self.handler))
+        start = time.perf_counter()
+        try:
+            return bool(handler.check(directory=os.path.join(directory, image)))
+        finally:
+            self._check_times[image] = time.perf_counter() - start
+
+    def check(self, directory="./"):
+        """Check all images concurrently."""
+        images = self._get_images(directory)
+        links = self._link_shared_files(directory, images)
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(images), 1)) as executor:
+                results = list(executor.map(lambda image: self._check_image(directory, image), images))
+        finally:
+            for link in links:
+                os.remove(link)
+        self._flagged = [image for image, flagged in zip(images, results, strict=True) if flagged]
+        return bool(self._flagged)
+
+    def correct(self, directory="./"):
+        """Correct the flagged images one after another and aggregate the corrections."""
+        links = self._link_shared_files(directory, self._flagged)
+        shared: dict[str, bytes] = {}
+        errors: list[str] = []
+        actions: list[dict] | None = []
+        images = {}
+        try:
+            for idx, image in enumerate(self._flagged):
+                dct = self._image_handlers[image].correct(directory=os.path.join(directory, image))
+                images[image] = {**dct, "check_time": self._check_times.get(image)}
+                errors.extend(err for err in dct["errors"] if err not in errors)
+                image_actions = dct["actions"] or []
+                if idx == 0:
+                    for filename in self.SHARED_FILES:
+                        if os.path.isfile(path := os.path.join(directory, filename)):
+                            with open(path, "rb") as file:
+                                shared[filename] = file.read()
+                else:
+                    # Undo changes to the shared inputs, these were already corrected for the first image.
+                    for filename, content in shared.items():
+                        with open(os.path.join(directory, filename), "wb") as file:
+                            file.write(content)
+                    image_actions = [
+                        action
+                        for action in image_actions
+                        if action.get("dict", action.get("file")) not in self.SHARED_FILES
+                    ]
+                if dct["actions"] is None:
+                    actions = None
+                elif actions is not None:
+                    actions.extend(image_actions)
+        finally:
+            for link in links:
+                os.remove(link)
+        return {"errors": errors, "actions": actions, "images": images}
@@ -35,22 +35,17 @@ class VaspModder(Modder):
     def apply_actions(self, actions) -> None:
         """
         Applies a list of actions to the Vasp Input Set and rewrites modified
-        files.
+        files. All modifications of an input file are applied in one pass and
+        the file is written once (see :meth:`Modder.compile_actions`).
 
         Args:
             actions (dict): A list of actions of the form {'file': filename,
                 'action': moddermodification} or {'dict': vaspinput_key,
                 'action': moddermodification}.
         """
-        modified = []
-        for action in actions:
-            if "dict" in action:
-                k = action["dict"]
-                modified.append(k)
-                self.vi[k] = self.modify_object(action["action"], self.vi[k])
-            elif "file" in action:
-                self.modify(action["action"], action["file"])
-            else:
-                raise ValueError(f"Unrecognized format: {action}")
-        for file in modified:
-            self.vi[file].write_file(os.path.join(self.directory, file))
+        file_actions, dict_actions = self.compile_actions(actions)
+        for filename, modification in file_actions:
+            self.modify(modification, filename)
+        for key, modifications in dict_actions.items():
+            self.vi[key] = self.modify_object(modifications, self.vi[key])
+            self.vi[key].write_file(os.path.join(self.directory, key))
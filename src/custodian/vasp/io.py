@@ -1,5 +1,9 @@
 """Helper functions for dealing with vasp files."""
 
+from xml.etree import ElementTree as ET
+
+from monty.io import reverse_readfile, zopen
+from pymatgen.io.vasp.inputs import Incar
 from pymatgen.io.vasp.outputs import Outcar, Vasprun
 
 from custodian.utils import tracked_lru_cache
@@ -34,3 +38,97 @@ def load_outcar(filepath):
         The Vasprun object
     """
     return Outcar(filepath)
+
+
+def read_final_magmom(filepath):
+    """
+    Read the final magnetic moments from an OUTCAR without parsing the whole
+    file. The OUTCAR is scanned backwards and only the last "magnetization"
+    table(s) are read.
+
+    Args:
+        filepath: path to the OUTCAR file.
+
+    Returns:
+        list: The total moment of each site, or a [x, y, z] moment for each
+            site in noncollinear runs. None if no magnetization table is found.
+    """
+    moments: dict[str, list[float]] = {}
+    block: list[str] = []
+    for line in reverse_readfile(filepath):
+        if not line.lstrip().startswith("magnetization ("):
+            block.append(line)
+            continue
+        axis = line.split("(")[1][0]
+        moments[axis] = _parse_magnetization_block(reversed(block))
+        block = []
+        if axis == "x":
+            break
+    if "x" not in moments:
+        return None
+    if "y" in moments and "z" in moments:
+        return [list(magmom) for magmom in zip(moments["x"], moments["y"], moments["z"], strict=True)]
+    return moments["x"]
+
+
+def _parse_magnetization_block(lines):
+    """Parse the total moments from the lines following a magnetization header."""
+    totals: list[float] = []
+    n_separators = 0
+    for line in lines:
+        if line.startswith("---"):
+            n_separators += 1
+            if n_separators == 2:
+                break
+        elif n_separators == 1 and line.strip():
+            totals.append(float(line.split()[-1]))
+    return totals
+
+
+def read_vasprun_parameters(filepath):
+    """
+    Read the parameters section of a vasprun.xml. Only the start of the file
+    is parsed, so this also works for large and incomplete (still running or
+    killed) calculations.
+
+    Args:
+        filepath: path to the vasprun.xml file.
+
+    Returns:
+        Incar: The INCAR parameters as used by VASP. Values that VASP could not
+            write (e.g., "*****") are omitted.
+    """
+    with zopen(filepath, mode="rb") as file:
+        for _, elem in ET.iterparse(file, events=("end",)):
+            if elem.tag == "parameters":
+                return Incar(_parse_parameters_elem(elem))
+    return Incar()
+
+
+def _parse_parameters_elem(elem):
+    """Recursively parse a parameters (or separator) element of a vasprun.xml."""
+    params = {}
+    for child in elem:
+        name = child.attrib.get("name", "").strip()
+        if child.tag not in {"i", "v"}:
+            nested = _parse_parameters_elem(child)
+            if name == "response functions":
+                # These duplicate, and would otherwise override, the root parameters.
+                nested = {key: val for key, val in nested.items() if key not in params}
+            params |= nested
+            continue
+        val_type = child.attrib.get("type", "float")
+        values = (child.text or "").split() if child.tag == "v" else [(child.text or "").strip()]
+        try:
+            if val_type == "logical":
+                parsed = [val == "T" for val in values]
+            elif val_type == "int":
+                parsed = [int(val) for val in values]
+            elif val_type == "string":
+                parsed = values
+            else:
+                parsed = [float(val) for val in values]
+        except ValueError:
+            continue
+        params[name] = parsed if child.tag == "v" else parsed[0]
+    return params
@@ -1,11 +1,13 @@
 """This module implements basic kinds of jobs for VASP runs."""
 
+import copy
 import logging
 import math
 import os
 import shutil
 import signal
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from shutil import which
 
 import numpy as np
@@ -13,12 +15,21 @@ from monty.serialization import dumpfn, loadfn
 from monty.shutil import decompress_dir
 from pymatgen.core.structure import Structure
 from pymatgen.io.vasp.inputs import Incar, Kpoints, Poscar, VaspInput
-from pymatgen.io.vasp.outputs import Outcar, Vasprun
+from pymatgen.io.vasp.outputs import Vasprun
 
-from custodian.custodian import SENTRY_DSN, Job
+from custodian.custodian import SENTRY_DSN, Custodian, Job
 from custodian.utils import backup
-from custodian.vasp.handlers import VASP_BACKUP_FILES
+from custodian.vasp.handlers import VASP_BACKUP_FILES, VaspErrorHandler
 from custodian.vasp.interpreter import VaspModder
+from custodian.vasp.io import read_final_magmom, read_vasprun_parameters
+from custodian.vasp.utils import (
+    get_auto_parallel_settings,
+    get_cpu_topology,
+    get_loop_timings,
+    get_nelect,
+    get_num_mpi_ranks,
+    tune_parallel_settings,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +53,8 @@ VASP_OUTPUT_FILES = (
     "OUTCAR",
 )
 
+AUTO_PARALLEL_LOG = "auto_parallel.json"
+
 VASP_NEB_INPUT_FILES = ("INCAR", "POTCAR", "KPOINTS")
 
 VASP_NEB_OUTPUT_FILES = ("INCAR", "KPOINTS", "POTCAR", "vasprun.xml")
@@ -86,6 +99,10 @@ class VaspJob(Job):
         auto_continue=False,
         update_incar=False,
         terminate_timeout: float = 10.0,
+        auto_parallel=False,
+        tune_parallel=False,
+        preflight=False,
+        max_preflight_corrections=5,
     ) -> None:
         """
         This constructor is necessarily complex due to the need for
@@ -147,6 +164,27 @@ class VaspJob(Job):
             terminate_timeout (float): Timeout in seconds to wait for graceful
                 termination (SIGTERM) before escalating to SIGKILL. Large MPI
                 jobs may need longer timeouts. Defaults to 10.0 seconds.
+            auto_parallel (bool): Whether to automatically choose KPAR, NCORE
+                and NBANDS from the MPI ranks allocated by the scheduler, the
+                CPU/NUMA topology of the node and the size of the calculation.
+                Takes precedence over auto_npar and is applied after
+                update_incar and settings_override. The choice and its rationale
+                are logged and recorded in auto_parallel.json. Defaults to False.
+            tune_parallel (bool): Whether to tune KPAR and NCORE across a
+                sequence of jobs run in the same directory. The seconds per
+                electronic step (total LOOP+ time over the number of LOOPs)
+                of each job are recorded in auto_parallel.json, and each job starts from the fastest
+                configuration so far or tries one of its untried neighbors.
+                Should be set for every job of the sequence. Defaults to False.
+            preflight (bool): Whether to check the final input files at the end
+                of setup for errors that VASP would deterministically raise at
+                startup (see :meth:`VaspErrorHandler.preflight_check`) and
+                apply the VaspErrorHandler corrections before launching. The
+                corrections are logged in custodian.json as if the handler had
+                fired, but do not count towards the error limits. Defaults to
+                False.
+            max_preflight_corrections (int): Maximum number of rounds of
+                preflight corrections. Defaults to 5.
         """
         self.vasp_cmd = tuple(vasp_cmd)
         self.output_file = output_file
@@ -162,6 +200,11 @@ class VaspJob(Job):
         self.auto_continue = auto_continue
         self.update_incar = update_incar
         self.terminate_timeout = terminate_timeout
+        self.auto_parallel = auto_parallel
+        self.tune_parallel = tune_parallel
+        self.preflight = preflight
+        self.max_preflight_corrections = max_preflight_corrections
+        self.setup_corrections: list[dict] = []
 
         if SENTRY_DSN:
             # if using Sentry logging, add specific VASP executable to scope
@@ -194,7 +237,7 @@ class VaspJob(Job):
                     if file == "KPOINTS":
                         pass
 
-        if self.auto_npar:
+        if self.auto_npar and not (self.auto_parallel or self.tune_parallel):
             try:
                 incar = Incar.from_file(os.path.join(directory, "INCAR"))
                 # Only optimized NPAR for non-HF and non-RPA calculations.
@@ -243,8 +286,7 @@ class VaspJob(Job):
 
         if self.update_incar:
             try:
-                vasprun = Vasprun(os.path.join(directory, "vasprun.xml"))
-                params = vasprun.parameters
+                params = read_vasprun_parameters(os.path.join(directory, "vasprun.xml"))
                 incar = Incar.from_file(os.path.join(directory, "INCAR"))
                 for k, v in incar.items():
                     incar[k] = params.get(k, v)
@@ -255,6 +297,95 @@ class VaspJob(Job):
         if self.settings_override is not None:
             VaspModder(directory=directory).apply_actions(self.settings_override)
 
+        # after update_incar and settings_override so that the recorded settings are the ones run
+        if self.auto_parallel or self.tune_parallel:
+            self._set_auto_parallel(directory)
+
+        self.setup_corrections = []
+        if self.preflight:
+            handler = VaspErrorHandler(output_filename=self.output_file)
+            for _ in range(self.max_preflight_corrections):
+                if not handler.preflight_check(directory):
+                    break
+                dct = handler.correct(directory)
+                logger.info(f"Preflight correction: {dct}")
+                self.setup_corrections.append({**dct, "handler": handler})
+                if not dct["actions"]:
+                    break
+
+    def _set_auto_parallel(self, directory) -> None:
+        """Set KPAR, NCORE and NBANDS in the INCAR and record the rationale."""
+        record_file = os.path.join(directory, AUTO_PARALLEL_LOG)
+        records = loadfn(record_file) if os.path.isfile(record_file) else []
+        try:
+            incar = Incar.from_file(os.path.join(directory, "INCAR"))
+            structure = Poscar.from_file(os.path.join(directory, "POSCAR")).structure
+            kpoints = None
+            if os.path.isfile(os.path.join(directory, "KPOINTS")):
+                kpoints = Kpoints.from_file(os.path.join(directory, "KPOINTS"))
+            n_ranks, topology = get_num_mpi_ranks(), get_cpu_topology()
+
+            settings, rationale = {}, []
+            if self.tune_parallel:
+                settings, rationale = tune_parallel_settings(
+                    records, incar, structure, kpoints=kpoints, n_ranks=n_ranks, topology=topology
+                )
+            if not settings and self.auto_parallel:
+                settings, rationale = get_auto_parallel_settings(
+                    incar, structure, kpoints=kpoints, n_ranks=n_ranks, topology=topology, nelect=get_nelect(directory)
+                )
+        except Exception as exc:
+            logger.error(f"Automatic parallelization failed. {exc}")
+            return
+
+        if settings:
+            for key, val in settings.items():
+                if val is None:
+                    incar.pop(key, None)
+                else:
+                    incar[key] = val
+            incar.write_file(os.path.join(directory, "INCAR"))
+        else:
+            settings = {"KPAR": incar.get("KPAR", 1), "NCORE": incar.get("NCORE", 1)}
+            rationale = ["No timings yet, keeping KPAR and NCORE from the INCAR"]
+
+        logger.info(f"Automatic parallelization settings: {settings}")
+        for reason in rationale:
+            logger.info(f"Automatic parallelization: {reason}")
+        records.append(
+            {
+                "suffix": self.suffix,
+                "n_ranks": n_ranks,
+                "topology": topology,
+                "settings": settings,
+                "rationale": rationale,
+                "sec_per_step": None,
+            }
+        )
+        dumpfn(records, record_file, indent=2)
+
+    def _record_parallel_timings(self, directory) -> None:
+        """Record the seconds per electronic step of the configuration set in setup."""
+        record_file = os.path.join(directory, AUTO_PARALLEL_LOG)
+        if not os.path.isfile(record_file) or not os.path.isfile(os.path.join(directory, "OUTCAR")):
+            return
+        records = loadfn(record_file)
+        if not records or records[-1].get("sec_per_step") is not None:
+            return
+        try:
+            timings = get_loop_timings(os.path.join(directory, "OUTCAR"))
+        except Exception as exc:
+            logger.error(f"Unable to read LOOP+ timings from OUTCAR. {exc}")
+            return
+        # Ionic steps differ in their number of electronic steps between jobs, so the
+        # time of the ionic steps (LOOP+, including their overhead) is compared per
+        # electronic step.
+        if timings["loop_plus"] and timings["loop"]:
+            records[-1]["sec_per_step"] = float(np.sum(timings["loop_plus"])) / len(timings["loop"])
+            records[-1]["n_electronic_steps"] = len(timings["loop"])
+            logger.info(f"{records[-1]['settings']} took {records[-1]['sec_per_step']:.2f} s per electronic step")
+            dumpfn(records, record_file, indent=2)
+
     def run(self, directory="./"):
         """
         Perform the actual VASP run.
@@ -286,6 +417,9 @@ class VaspJob(Job):
         Postprocessing includes renaming and gzipping where necessary.
         Also copies the magmom to the incar if necessary.
         """
+        if self.auto_parallel or self.tune_parallel:
+            self._record_parallel_timings(directory)
+
         for file in (*VASP_OUTPUT_FILES, self.output_file):
             file = os.path.join(directory, file)
             if os.path.isfile(file):
@@ -296,8 +430,9 @@ class VaspJob(Job):
 
         if self.copy_magmom and not self.final:
             try:
-                outcar = Outcar(os.path.join(directory, "OUTCAR"))
-                magmom = [m["tot"] for m in outcar.magnetization]
+                magmom = read_final_magmom(os.path.join(directory, "OUTCAR"))
+                if magmom is None:
+                    raise ValueError("No magnetization found in OUTCAR")
                 incar = Incar.from_file(os.path.join(directory, "INCAR"))
                 incar["MAGMOM"] = magmom
                 incar.write_file(os.path.join(directory, "INCAR"))
@@ -318,6 +453,7 @@ class VaspJob(Job):
         half_kpts_first_relax=False,
         auto_continue=False,
         directory="./",
+        **vasp_job_kwargs,
     ):
         """
         Returns a list of two jobs corresponding to an AFLOW style double
@@ -342,6 +478,8 @@ class VaspJob(Job):
                 prevent VASP from deleting it once it finishes. Defaults to
                 False.
             directory (str): Directory where the job was run. Defaults to './'.
+            **vasp_job_kwargs: Passthrough kwargs to VaspJob, e.g. tune_parallel.
+                See :class:`custodian.vasp.jobs.VaspJob`.
 
         Returns:
             List of two jobs corresponding to an AFLOW style run.
@@ -375,6 +513,7 @@ class VaspJob(Job):
                 auto_npar=auto_npar,
                 auto_continue=auto_continue,
                 settings_override=settings_overide_1,
+                **vasp_job_kwargs,
             ),
             VaspJob(
                 vasp_cmd,
@@ -384,6 +523,7 @@ class VaspJob(Job):
                 auto_npar=auto_npar,
                 auto_continue=auto_continue,
                 settings_override=settings_overide_2,
+                **vasp_job_kwargs,
             ),
         ]
 
@@ -709,6 +849,149 @@ class VaspJob(Job):
             for key in sorted(energies):
                 file.write(f"{key} {energies[key]}\n")
 
+    @classmethod
+    def batched_constrained_opt_run(
+        cls,
+        vasp_cmd,
+        lattice_direction,
+        initial_strain,
+        n_points=4,
+        atom_relax=True,
+        max_rounds=5,
+        handlers=None,
+        directory="./",
+        **vasp_job_kwargs,
+    ):
+        r"""
+        Returns a generator of jobs for a batched constrained optimization run.
+        This is the same optimization as constrained_opt_run, but each job
+        evaluates n_points lattice parameters at once, each in its own
+        subdirectory (e.g., "c_5.43210"), with a :class:`ConcurrentVaspJob`.
+        After each round, a parabola is fitted to all energies so far and the
+        next points are placed around its minimum within the bracketing
+        points, or beyond the lowest/highest lattice parameter if the minimum
+        is not bracketed yet. This typically needs about 3 rounds instead of
+        about 10 sequential runs.
+
+        Since no calculation runs in the top-level directory, the Custodian
+        running these jobs should not have VASP handlers of its own. Pass them
+        as handlers instead so that each run is corrected independently.
+
+        Args:
+            vasp_cmd (str): Command to run vasp as a list of args. For example,
+                if you are using mpirun, it can be something like
+                ["mpirun", "pvasp.5.2.11"]. Each of the n_points runs uses
+                this command, so it should only request 1/n_points of the
+                resources of the allocation.
+            lattice_direction (str): Which direction to relax. Valid values are
+                "a", "b" or "c".
+            initial_strain (float): An initial strain to be applied to the
+                lattice_direction. The first round spans strains from 0 to
+                2 x initial_strain.
+            n_points (int): Number of lattice parameters evaluated per round.
+                Defaults to 4.
+            atom_relax (bool): Whether to relax atomic positions.
+            max_rounds (int): The maximum number of rounds. Defaults to 5.
+            handlers ([ErrorHandler]): Error handlers for each run. Each run
+                gets its own copy. Defaults to [VaspErrorHandler()].
+            directory (str): Directory where the job was run. Defaults to './'.
+            **vasp_job_kwargs: Passthrough kwargs to VaspJob. See
+                :class:`custodian.vasp.jobs.VaspJob`.
+
+        Returns:
+            Generator of jobs. At the end of the run, an "EOS.txt" is written
+            which provides a quick look at the E vs lattice parameter.
+        """
+        nsw = 99 if atom_relax else 0
+        handlers = handlers if handlers is not None else [VaspErrorHandler()]
+        vasp_input = VaspInput.from_directory(directory)
+        incar = vasp_input["INCAR"]
+        incar.update({"ISIF": 2, "NSW": nsw})
+        e_tol = incar["EDIFFG"] if incar.get("EDIFFG") and incar.get("EDIFFG") > 0 else incar.get("EDIFF", 0.0001) * 10
+        lattice_index = {"a": 0, "b": 1}.get(lattice_direction, 2)
+
+        structure = vasp_input["POSCAR"].structure
+        x0 = structure.lattice.abc[lattice_index]
+        trial_x = list(x0 * (1 + (initial_strain or 0.01) * np.linspace(0, 2, n_points)))
+        energies: dict[float, float] = {}
+        structures: dict[float, Structure] = {}
+
+        for rnd in range(max_rounds):
+            jobs = {}
+            for x in trial_x:
+                lattice = structure.lattice.matrix.copy()
+                lattice[lattice_index] = lattice[lattice_index] / np.linalg.norm(lattice[lattice_index]) * x
+                subdir = f"{lattice_direction}_{x:.5f}"
+                VaspInput(
+                    incar=incar,
+                    kpoints=vasp_input["KPOINTS"],
+                    poscar=Poscar(Structure(lattice, structure.species, structure.frac_coords)),
+                    potcar=vasp_input["POTCAR"],
+                ).write_input(os.path.join(directory, subdir))
+                jobs[subdir] = cls(vasp_cmd, final=False, backup=False, **vasp_job_kwargs)
+
+            logger.info(f"Generating round {rnd + 1} with {lattice_direction} = {trial_x}!")
+            yield ConcurrentVaspJob(jobs, handlers=handlers)
+
+            for x, subdir in zip(trial_x, jobs, strict=True):
+                try:
+                    vasprun = Vasprun(os.path.join(directory, subdir, "vasprun.xml"))
+                except Exception:
+                    logger.warning(f"No result for {subdir}, skipping it.")
+                    continue
+                energies[x] = vasprun.final_energy
+                structures[x] = vasprun.final_structure
+            if not energies:
+                break
+
+            min_x = min(energies, key=lambda e: energies[e])
+            structure = structures[min_x]
+            trial_x, converged = cls._next_strain_points(energies, n_points, e_tol)
+            if converged or not trial_x:
+                logger.info(f"Stopping optimization! Final {lattice_direction} = {min_x}")
+                break
+
+        with open(os.path.join(directory, "EOS.txt"), "w") as file:
+            file.write(f"# {lattice_direction} energy\n")
+            for key in sorted(energies):
+                file.write(f"{key} {energies[key]}\n")
+
+    @staticmethod
+    def _next_strain_points(energies, n_points, e_tol):
+        """
+        Propose the next lattice parameters of a batched constrained
+        optimization from the energies of all points so far.
+
+        Returns:
+            tuple[list[float], bool]: The next lattice parameters and whether
+                the lowest energy agrees with its best neighbor within e_tol.
+        """
+        sorted_x = sorted(energies)
+        min_x = min(energies, key=lambda e: energies[e])
+        ind = sorted_x.index(min_x)
+        neighbors = [sorted_x[idx] for idx in (ind - 1, ind + 1) if 0 <= idx < len(sorted_x)]
+        if neighbors and min(abs(energies[min_x] - energies[x]) for x in neighbors) < e_tol:
+            return [], True
+
+        if len(neighbors) < 2:
+            # The minimum is not bracketed, extend beyond the lowest/highest value.
+            step = abs(sorted_x[1] - sorted_x[0]) if len(sorted_x) > 1 else 0.01 * min_x
+            sign = -1 if ind == 0 else 1
+            return [min_x + sign * step * (idx + 1) for idx in range(n_points)], False
+
+        lower, upper = neighbors
+        if len(sorted_x) >= 3:
+            a, b, _c = np.polyfit(sorted_x, [energies[x] for x in sorted_x], 2)
+            center = -b / (2 * a) if a > 0 else min_x
+            if not lower < center < upper:
+                center = min_x
+        else:
+            center = min_x
+        # Place the points around the predicted minimum, at most half-way to the bracketing points.
+        half_width = min(center - lower, upper - center) / 2
+        trial_x = center + half_width * np.linspace(-1, 1, n_points)
+        return [x for x in trial_x if not np.isclose(sorted_x, x, rtol=0, atol=1e-5).any()], False
+
     def terminate(self, directory: str = "./") -> None:
         """Kill all VASP processes associated with the current job.
 
@@ -991,6 +1274,53 @@ class VaspNEBJob(VaspJob):
         return neb_dirs, neb_sub
 
 
+class ConcurrentVaspJob(Job):
+    """
+    Runs several independent VaspJobs at the same time, each in its own
+    subdirectory and supervised by its own Custodian. Used by
+    VaspJob.batched_constrained_opt_run.
+    """
+
+    def __init__(self, jobs, handlers=None, max_errors=10) -> None:
+        """
+        Args:
+            jobs (dict[str, VaspJob]): Map of subdirectory to the job to run
+                in it. The subdirectories must already contain the inputs.
+            handlers ([ErrorHandler]): Error handlers for each run. Each run
+                gets its own copy. Defaults to no handlers.
+            max_errors (int): Maximum number of errors of each run.
+        """
+        self.jobs = jobs
+        self.handlers = handlers or []
+        self.max_errors = max_errors
+
+    def setup(self, directory="./") -> None:
+        """No setup required, each run is set up by its own Custodian."""
+
+    def run(self, directory="./") -> None:
+        """Run all jobs and wait for them to finish. A failed run is logged
+        without affecting the others.
+        """
+
+        def _run(subdir, job):
+            custodian = Custodian(
+                copy.deepcopy(self.handlers),
+                [job],
+                max_errors=self.max_errors,
+                directory=os.path.join(directory, subdir),
+            )
+            try:
+                custodian.run()
+            except Exception as exc:
+                logger.warning(f"Run in {subdir} failed: {exc}")
+
+        with ThreadPoolExecutor(max_workers=max(len(self.jobs), 1)) as executor:
+            list(executor.map(_run, self.jobs, self.jobs.values()))
+
+    def postprocess(self, directory="./") -> None:
+        """No post-processing required."""
+
+
 class GenerateVaspInputJob(Job):
     """
     Generates a VASP input based on an existing directory. This is typically
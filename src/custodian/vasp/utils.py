@@ -3,13 +3,20 @@
 from __future__ import annotations
 
 import logging
+import math
+import multiprocessing
 import os
+import re
+from glob import glob
 from typing import TYPE_CHECKING, Any
 
 import numpy as np
-from pymatgen.io.vasp.inputs import Kpoints, Poscar
+from monty.io import zopen
+from pymatgen.io.vasp.inputs import Incar, Kpoints, KpointsSupportedModes, Poscar, Potcar
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
     from pymatgen.core import Structure
 
 logger = logging.getLogger(__name__)
@@ -67,46 +74,99 @@ def increase_k_point_density(
             The new Kpoints object / KSPACING consistent with constraints.
             If an empty dict, no new k-point mesh could be found.
     """
-    uses_kspacing = isinstance(kpoints, float | int)
-
-    if uses_kspacing:
-        orig_num_kpoints = np.prod(_estimate_num_k_points_from_kspacing(structure, kpoints))  # type: ignore[arg-type]
+    return increase_k_point_density_batch(
+        [kpoints], [structure], factor=factor, max_inc=max_inc, min_kpoints=min_kpoints, force_gamma=force_gamma
+    )[0]
 
-    else:
-        if isinstance(kpoints, Kpoints):
-            kpoints = kpoints.as_dict()
 
-        orig_num_kpoints = np.prod(kpoints["kpoints"][0])  # type: ignore[index]
+def increase_k_point_density_batch(
+    kpoints: Sequence[Kpoints | dict | float],
+    structures: Sequence[Structure],
+    factor: float = 0.1,
+    max_inc: int = 500,
+    min_kpoints: int = 1,
+    force_gamma: bool = True,
+) -> list[dict]:
+    """
+    Vectorized increase_k_point_density for many structures at once. All
+    max_inc candidate densities of all structures are evaluated as one NumPy
+    array, using the same closed-form meshes as Kpoints.automatic_density
+    and VASP's KSPACING, and the first candidate that adds k-points is kept.
 
-        # try to approximate k-points per reciprocal atom used in pymatgen
-        lengths = structure.lattice.abc
-        mult = max([nk * lengths[ik] for ik, nk in enumerate(kpoints["kpoints"][0])])  # type: ignore[index]
-        ngrid = mult**3 / np.prod(lengths)
-        kppa = len(structure) * ngrid
+    Inputs:
+        kpoints (list of Kpoints, dict, float, int) : original Kpoints or
+            KSPACING of each calculation, see increase_k_point_density.
+        structures (list of Structure) : associated structures
+        factor, max_inc, min_kpoints, force_gamma : see increase_k_point_density.
 
-    mult_fac = 1.0 + factor
+    Outputs:
+        list[dict] :
+            The new Kpoints object / KSPACING of each calculation, or an
+            empty dict where no new k-point mesh could be found.
+    """
+    mult_facs = np.cumsum([1.0 + factor] + [factor] * (max_inc - 1))
     min_kpoints = max(min_kpoints, 1)
+    new_kpoints: list[dict] = [{} for _ in structures]
+
+    kspacing_idx = [idx for idx, kpts in enumerate(kpoints) if isinstance(kpts, float | int)]
+    if kspacing_idx:
+        kspacing = np.array([kpoints[idx] for idx in kspacing_idx], dtype=float)
+        recip_lengths = np.array([structures[idx].lattice.reciprocal_lattice.abc for idx in kspacing_idx])
+        orig_num_kpoints = np.prod(np.maximum(1, np.ceil(recip_lengths / kspacing[:, None])), axis=1)
+        candidates = np.round(kspacing[:, None] / mult_facs, 6)
+        num_kpoints = np.prod(np.maximum(1, np.ceil(recip_lengths[:, None, :] / candidates[..., None])), axis=2)
+        for row, first in zip(kspacing_idx, _first_increase(num_kpoints, orig_num_kpoints, min_kpoints), strict=True):
+            if first is not None:
+                new_kpoints[row] = {
+                    "KSPACING": round(kpoints[row] / mult_facs[first], 6),  # type: ignore[operator]
+                    "KGAMMA": force_gamma,
+                }
+
+    mesh_idx = [idx for idx in range(len(structures)) if idx not in set(kspacing_idx)]
+    if mesh_idx:
+        meshes = np.array(
+            [
+                (kpts.as_dict() if isinstance(kpts, Kpoints) else kpts)["kpoints"][0]
+                for kpts in (kpoints[idx] for idx in mesh_idx)
+            ]  # type: ignore[index]
+        )
+        lengths = np.array([structures[idx].lattice.abc for idx in mesh_idx])
+        n_sites = np.array([len(structures[idx]) for idx in mesh_idx])
+        orig_num_kpoints = np.prod(meshes, axis=1)
 
-    success = False
-    for _ in range(max_inc):
-        if uses_kspacing:
-            new_kpoints: dict[str, Any] = {"KSPACING": round(kpoints / mult_fac, 6), "KGAMMA": force_gamma}  # type: ignore[operator]
-            new_nk = _estimate_num_k_points_from_kspacing(structure, new_kpoints["KSPACING"])
-        else:
-            kpts = Kpoints.automatic_density(structure, mult_fac * kppa, force_gamma=force_gamma)  # type: ignore
-            new_kpoints = {
-                "generation_style": str(kpts.style),
-                "kpoints": (tuple(kpts.kpts[0]),),
-            }
-            new_nk = new_kpoints["kpoints"][0]  # type: ignore[index]
+        # try to approximate k-points per reciprocal atom used in pymatgen
+        mult = np.max(meshes * lengths, axis=1)
+        kppa = n_sites * mult**3 / np.prod(lengths, axis=1)
+
+        # Kpoints.automatic_density, evaluated for every candidate density at once
+        target_kppa = mult_facs * kppa[:, None]
+        near_cube = np.abs(np.floor(target_kppa ** (1 / 3) + 0.5) ** 3 - target_kppa) < 1
+        target_kppa = np.where(near_cube, target_kppa * 1.01, target_kppa)
+        grid_mult = (
+            target_kppa / n_sites[:, None] * lengths[:, None, 0] * lengths[:, None, 1] * lengths[:, None, 2]
+        ) ** (1 / 3)
+        num_div = np.floor(np.maximum(grid_mult[..., None] / lengths[:, None, :], 1)).astype(int)
+        firsts = _first_increase(np.prod(num_div, axis=2), orig_num_kpoints, min_kpoints)
+        for pos, (row, first) in enumerate(zip(mesh_idx, firsts, strict=True)):
+            if first is None:
+                continue
+            if force_gamma:
+                style = str(Kpoints.supported_modes.Gamma)
+            else:
+                style = str(Kpoints.automatic_density(structures[row], mult_facs[first] * kppa[pos]).style)
+            new_kpoints[row] = {"generation_style": style, "kpoints": (tuple(int(nk) for nk in num_div[pos, first]),)}
 
-        if (new_num_kpoints := np.prod(new_nk)) > orig_num_kpoints and (new_num_kpoints >= min_kpoints):
-            success = True
-            break
+    return new_kpoints
 
-        mult_fac += factor
 
-    return new_kpoints if success else {}  # type: ignore
+def _first_increase(num_kpoints: np.ndarray, orig_num_kpoints: np.ndarray, min_kpoints: int) -> list[int | None]:
+    """
+    Index of the first candidate mesh in each row of num_kpoints with more
+    k-points than the original one and at least min_kpoints, or None.
+    """
+    valid = (num_kpoints > orig_num_kpoints[:, None]) & (num_kpoints >= min_kpoints)
+    first = np.argmax(valid, axis=1)
+    return [int(idx) if valid[row, idx] else None for row, idx in enumerate(first)]
 
 
 def is_valid_poscar(filename: str, directory: str = "./") -> bool:
@@ -114,6 +174,11 @@ def is_valid_poscar(filename: str, directory: str = "./") -> bool:
 
     This is useful to verify CONTCAR is complete before copying to POSCAR,
     especially after terminating a VASP job which might leave incomplete files.
+    The file is streamed line by line and only the header, the atom counts and
+    the expected number of numeric coordinate lines are checked, so no
+    Structure is built. Compressed files are read if the name itself is
+    compressed (e.g. "CONTCAR.gz"); "CONTCAR" never matches CONTCAR.gz, as the
+    file is then copied to POSCAR by name.
 
     Args:
         filename: Name of the file (e.g., "CONTCAR", "POSCAR")
@@ -129,9 +194,410 @@ def is_valid_poscar(filename: str, directory: str = "./") -> bool:
     if not os.path.isfile(filepath) or os.path.getsize(filepath) == 0:
         return False
 
-    # Try to parse as POSCAR
     try:
-        Poscar.from_file(filepath)
-        return True
+        with zopen(filepath, mode="rt", encoding="utf-8") as file:
+            return _is_valid_poscar_stream(line.split() for line in file)
     except Exception:
         return False
+
+
+def _is_valid_poscar_stream(lines: Iterator[list[str]]) -> bool:
+    """Check the tokenized lines of a POSCAR, see is_valid_poscar."""
+
+    def is_numeric(tokens: list[str], n_values: int) -> bool:
+        return len(tokens) >= n_values and all(math.isfinite(float(val)) for val in tokens[:n_values])
+
+    try:
+        next(lines)  # comment
+        scale = next(lines)
+        if not (is_numeric(scale, 1) and float(scale[0]) != 0):
+            return False
+        if not all(is_numeric(next(lines), 3) for _ in range(3)):
+            return False
+        tokens = next(lines)
+        if not all(val.isdigit() for val in tokens):
+            # VASP 5 format, the species line precedes the counts
+            species, tokens = tokens, next(lines)
+            if len(species) != len(tokens):
+                return False
+        if not tokens or not all(val.isdigit() for val in tokens) or (n_sites := sum(map(int, tokens))) == 0:
+            return False
+        mode = next(lines)
+        if mode and mode[0][0] in "sS":
+            mode = next(lines)
+        if not mode:
+            return False
+        return all(is_numeric(next(lines), 3) for _ in range(n_sites))
+    except (StopIteration, ValueError):
+        return False
+
+
+def get_num_mpi_ranks() -> int:
+    """
+    Get the number of MPI ranks allocated to the job from the environment
+    variables set by the scheduler (SLURM, PBS or SGE). Falls back on the
+    number of cores on the current machine.
+
+    Returns:
+        int: the number of MPI ranks.
+    """
+    for var in ("SLURM_NTASKS", "SLURM_NPROCS", "PBS_NP", "NSLOTS"):
+        try:
+            if (n_ranks := int(os.environ.get(var, "0"))) > 0:
+                return n_ranks
+        except ValueError:
+            continue
+    if os.path.isfile(nodefile := os.environ.get("PBS_NODEFILE", "")):
+        with open(nodefile) as file:
+            if n_ranks := sum(1 for line in file if line.strip()):
+                return n_ranks
+    return multiprocessing.cpu_count()
+
+
+def get_cpu_topology() -> dict[str, int]:
+    """
+    Get the CPU topology of the current node from sysfs, with /proc/cpuinfo as
+    a fallback. Hyperthreads are not counted as cores.
+
+    Returns:
+        dict: with keys "n_cores", "n_sockets", "cores_per_socket",
+            "n_numa_nodes" and "cores_per_numa_node".
+    """
+    cores = set()
+    for path in glob("/sys/devices/system/cpu/cpu[0-9]*/topology"):
+        try:
+            with (
+                open(os.path.join(path, "physical_package_id")) as f_pkg,
+                open(os.path.join(path, "core_id")) as f_core,
+            ):
+                cores.add((int(f_pkg.read()), int(f_core.read())))
+        except (OSError, ValueError):
+            continue
+
+    if not cores and os.path.isfile("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as file:
+            package = 0
+            for line in file:
+                if line.startswith("physical id"):
+                    package = int(line.split(":")[1])
+                elif line.startswith("core id"):
+                    cores.add((package, int(line.split(":")[1])))
+
+    n_cores = len(cores) or multiprocessing.cpu_count()
+    n_sockets = len({pkg for pkg, _ in cores}) or 1
+    n_numa_nodes = max(len(glob("/sys/devices/system/node/node[0-9]*")), n_sockets)
+    return {
+        "n_cores": n_cores,
+        "n_sockets": n_sockets,
+        "cores_per_socket": max(n_cores // n_sockets, 1),
+        "n_numa_nodes": n_numa_nodes,
+        "cores_per_numa_node": max(n_cores // n_numa_nodes, 1),
+    }
+
+
+def _estimate_num_irreducible_k_points(incar: Incar, structure: Structure, kpoints: Kpoints | None) -> int:
+    """Estimate the number of irreducible k-points from KPOINTS or KSPACING."""
+    if kpoints is not None and kpoints.num_kpts > 0:
+        n_kpts = kpoints.num_kpts
+    elif kpoints is not None and kpoints.style == KpointsSupportedModes.Automatic:
+        # fully automatic mode, kpts holds the length R_k: N_i = int(max(1, R_k |b_i| + 0.5))
+        length = kpoints.kpts[0][0]
+        recip = structure.lattice.reciprocal_lattice_crystallographic.abc
+        n_kpts = int(np.prod([max(1, int(length * recip[i] + 0.5)) for i in range(3)]))
+    elif kpoints is not None:
+        n_kpts = int(np.prod(kpoints.kpts[0]))
+    elif incar.get("KSPACING"):
+        n_kpts = int(np.prod(_estimate_num_k_points_from_kspacing(structure, incar["KSPACING"])))
+    else:
+        n_kpts = 1
+    if incar.get("ISYM", 2) != 0 and n_kpts > 1:
+        # time-reversal symmetry roughly halves the irreducible k-points
+        n_kpts = math.ceil(n_kpts / 2)
+    return n_kpts
+
+
+def get_nelect(directory: str = "./") -> float | None:
+    """
+    Get the number of electrons of a calculation from NELECT in the INCAR or,
+    if not set, from the POTCAR valences and the POSCAR composition.
+
+    Args:
+        directory (str): directory containing the input files.
+
+    Returns:
+        float | None: the number of electrons, or None if it cannot be determined.
+    """
+    try:
+        if (nelect := Incar.from_file(os.path.join(directory, "INCAR")).get("NELECT")) is not None:
+            return nelect
+        structure = Poscar.from_file(os.path.join(directory, "POSCAR")).structure
+        zvals = {potcar.element: potcar.zval for potcar in Potcar.from_file(os.path.join(directory, "POTCAR"))}
+        return sum(zvals[site.specie.symbol] for site in structure)
+    except Exception:
+        return None
+
+
+def estimate_nbands(nelect: float, nions: int, noncollinear: bool = False, nmagmom: float = 0.0) -> int:
+    """
+    Default number of bands of VASP, before it is rounded up for the band
+    parallelization: max(NINT((NELECT + 2) / 2) + max(NIONS / 2, 3), INT(0.6 * NELECT)),
+    plus NINT(NMAGMOM / 2) for spin-polarized runs, doubled for noncollinear runs.
+
+    Args:
+        nelect (float): number of electrons.
+        nions (int): number of ions.
+        noncollinear (bool): whether this is a noncollinear calculation.
+        nmagmom (float): total initial magnetic moment of a spin-polarized
+            (ISPIN = 2) calculation, 0 otherwise.
+
+    Returns:
+        int: the default NBANDS.
+    """
+
+    def nint(val: float) -> int:
+        return math.floor(val + 0.5)
+
+    nbands = max(nint((nelect + 2) / 2) + max(nions // 2, 3), int(0.6 * nelect))
+    nbands += nint(abs(nmagmom) / 2)
+    return 2 * nbands if noncollinear else nbands
+
+
+def get_auto_parallel_settings(
+    incar: Incar,
+    structure: Structure,
+    kpoints: Kpoints | None = None,
+    n_ranks: int | None = None,
+    topology: dict[str, int] | None = None,
+    nelect: float | None = None,
+    min_ranks_per_kgroup: int = 8,
+) -> tuple[dict[str, Any], list[str]]:
+    """
+    Choose KPAR, NCORE and NBANDS from the number of MPI ranks, the CPU
+    topology and the size of the calculation.
+
+    K-point groups are sized so that they do not straddle NUMA domains and
+    contain at least min_ranks_per_kgroup ranks. NCORE is the largest divisor
+    of the ranks within a NUMA domain not exceeding the square root of the
+    k-point group size. NBANDS is padded to a multiple of the number of band
+    groups so that VASP does not change it on its own. If NBANDS is not set,
+    VASP's default (see :func:`estimate_nbands`) is padded, which is the value
+    VASP would use itself.
+
+    Args:
+        incar (Incar): the INCAR of the calculation.
+        structure (Structure): the structure of the calculation.
+        kpoints (Kpoints): the KPOINTS of the calculation, None if KSPACING is used.
+        n_ranks (int): number of MPI ranks. Determined from the environment if None.
+        topology (dict): CPU topology as returned by :func:`get_cpu_topology`.
+            Determined from the current node if None.
+        nelect (float): number of electrons, used to estimate NBANDS when it
+            is not set in the INCAR.
+        min_ranks_per_kgroup (int): minimum number of ranks per k-point group.
+
+    Returns:
+        tuple[dict, list[str]]: the INCAR settings to apply (a None value means
+            the tag should be removed) and the rationale for the choice.
+    """
+    n_ranks = n_ranks or get_num_mpi_ranks()
+    topology = topology or get_cpu_topology()
+    rationale = [
+        (
+            f"{n_ranks} MPI ranks, {topology['n_sockets']} socket(s) with {topology['cores_per_socket']} cores, "
+            f"{topology['cores_per_numa_node']} cores per NUMA domain"
+        )
+    ]
+
+    n_kpts = _estimate_num_irreducible_k_points(incar, structure, kpoints)
+    rationale.append(f"~{n_kpts} irreducible k-points")
+
+    settings: dict[str, Any] = {}
+    domain = min(topology["cores_per_numa_node"], n_ranks)
+
+    kpar = 1
+    if incar.get("LELF"):
+        rationale.append("KPAR = 1 since ELF is not implemented for KPAR > 1")
+    else:
+        for candidate in range(1, min(n_kpts, n_ranks) + 1):
+            group = n_ranks // candidate
+            if (
+                n_ranks % candidate == 0
+                and group >= min(min_ranks_per_kgroup, n_ranks)
+                and (group % domain == 0 or domain % group == 0)
+            ):
+                kpar = candidate
+        rationale.append(f"KPAR = {kpar}: largest k-point split keeping >= {min_ranks_per_kgroup} ranks per group")
+    settings["KPAR"] = kpar
+    group = n_ranks // kpar
+
+    if incar.get("IBRION") in {5, 6, 7, 8} or incar.get("LEPSILON"):
+        settings |= {"NCORE": None, "NPAR": None}
+        rationale.append("NCORE/NPAR unset: not supported for finite differences and DFPT")
+        return settings, rationale
+    if incar.get("LHFCALC") or incar.get("LRPA"):
+        ncore = 1
+        rationale.append("NCORE = 1 for HF/RPA calculations")
+    else:
+        shared = math.gcd(group, domain)
+        ncore = max(d for d in range(1, shared + 1) if shared % d == 0 and d <= max(math.sqrt(group), 1))
+        rationale.append(f"NCORE = {ncore}: divisor of the {shared} ranks per NUMA domain closest to sqrt({group})")
+    settings |= {"NCORE": ncore, "NPAR": None}
+
+    n_band_groups = group // ncore
+    nbands = incar.get("NBANDS")
+    if not nbands and nelect:
+        noncollinear = bool(incar.get("LNONCOLLINEAR"))
+        nmagmom = 0.0
+        if incar.get("ISPIN", 1) == 2 and not noncollinear:
+            # VASP starts from 1 muB per ion if MAGMOM is not set
+            nmagmom = sum(incar.get("MAGMOM") or [1.0] * len(structure))
+        nbands = estimate_nbands(nelect, len(structure), noncollinear=noncollinear, nmagmom=nmagmom)
+    if nbands and n_band_groups > 1:
+        settings["NBANDS"] = math.ceil(nbands / n_band_groups) * n_band_groups
+        rationale.append(f"NBANDS = {settings['NBANDS']}: {nbands} padded to a multiple of {n_band_groups} band groups")
+
+    return settings, rationale
+
+
+def get_loop_timings(filename: str) -> dict[str, list[float]]:
+    """
+    Read the real time of each electronic (LOOP) and ionic (LOOP+) step from
+    an OUTCAR without parsing the rest of the file.
+
+    Args:
+        filename (str): path to the OUTCAR.
+
+    Returns:
+        dict: with keys "loop" and "loop_plus", the real times in seconds.
+    """
+    timings: dict[str, list[float]] = {"loop": [], "loop_plus": []}
+    with zopen(filename, mode="rt", encoding="utf-8") as file:
+        for line in file:
+            if "LOOP" in line and "real time" in line:
+                key = "loop_plus" if "LOOP+" in line else "loop"
+                try:
+                    timings[key].append(float(line.rsplit("real time", 1)[1]))
+                except ValueError:
+                    continue
+    return timings
+
+
+def estimate_restart_file_size(filename: str) -> int:
+    """
+    Estimate the number of bytes VASP writes to WAVECAR and CHGCAR at the
+    end of a run from the header of its OUTCAR, i.e., without reading past
+    the first electronic iteration.
+
+    Args:
+        filename (str): path to the OUTCAR.
+
+    Returns:
+        int: estimated size in bytes of the WAVECAR and CHGCAR to be written.
+    """
+    n_bands = n_spin = 1
+    n_plane_waves = n_grid = 0
+    write_wavecar = write_chgcar = True
+    with zopen(filename, mode="rt", encoding="utf-8") as file:
+        for line in file:
+            if "Iteration" in line:
+                break
+            tokens = line.split()
+            if "plane waves:" in line:
+                n_plane_waves += int(tokens[-1])
+            elif "NBANDS=" in line:
+                n_bands = int(line.rsplit("NBANDS=", 1)[1])
+            elif "NGXF=" in line:
+                n_grid = math.prod(int(val) for val in re.findall(r"NG[XYZ]F=\s*(\d+)", line))
+            elif tokens[:2] == ["ISPIN", "="]:
+                n_spin = int(tokens[2])
+            elif tokens[:2] == ["LWAVE", "="]:
+                write_wavecar = tokens[2] == "T"
+            elif tokens[:2] == ["LCHARG", "="]:
+                write_chgcar = tokens[2] == "T"
+    size = 0
+    if write_wavecar:
+        # single precision complex plane-wave coefficients
+        size += 8 * n_plane_waves * n_bands * n_spin
+    if write_chgcar:
+        # formatted density (and magnetization) on the fine grid, ~12 characters per value
+        size += 12 * n_grid * n_spin
+    return size
+
+
+def tune_parallel_settings(
+    history: list[dict],
+    incar: Incar,
+    structure: Structure,
+    kpoints: Kpoints | None = None,
+    n_ranks: int | None = None,
+    topology: dict[str, int] | None = None,
+) -> tuple[dict[str, Any], list[str]]:
+    """
+    Propose KPAR and NCORE for the next job of a sequence from the measured
+    seconds per electronic step of the previous jobs. This is a hill climb: the
+    untried neighbors (NCORE or KPAR halved or doubled) of the fastest
+    configuration so far are tried one at a time, and once all of them have
+    been measured the fastest configuration is kept. Candidates are restricted
+    to KPAR dividing the ranks and not exceeding the k-points, and to NCORE
+    dividing the ranks per k-point group within a NUMA domain.
+
+    Args:
+        history (list[dict]): previous configurations, each with "settings"
+            (containing KPAR and NCORE), "sec_per_step", "n_ranks" and
+            "topology". Only those run on the same number of ranks and CPU
+            topology as the next job are used.
+        incar (Incar): the INCAR of the next job.
+        structure (Structure): the structure of the next job.
+        kpoints (Kpoints): the KPOINTS of the next job, None if KSPACING is used.
+        n_ranks (int): number of MPI ranks. Determined from the environment if None.
+        topology (dict): CPU topology as returned by :func:`get_cpu_topology`.
+            Determined from the current node if None.
+
+    Returns:
+        tuple[dict, list[str]]: the INCAR settings to apply and the rationale.
+            The settings are empty if no timings are available.
+    """
+    n_ranks = n_ranks or get_num_mpi_ranks()
+    topology = topology or get_cpu_topology()
+    timings: dict[tuple[int, int], list[float]] = {}
+    for record in history:
+        # timings on other ranks or nodes say nothing about this run
+        if record.get("sec_per_step") and record.get("n_ranks") == n_ranks and record.get("topology") == topology:
+            config = (record["settings"].get("KPAR") or 1, record["settings"].get("NCORE") or 1)
+            timings.setdefault(config, []).append(record["sec_per_step"])
+    if not timings:
+        return {}, []
+
+    n_kpts = _estimate_num_irreducible_k_points(incar, structure, kpoints)
+    domain = min(topology["cores_per_numa_node"], n_ranks)
+    dfpt = incar.get("IBRION") in {5, 6, 7, 8} or bool(incar.get("LEPSILON"))
+    fixed_ncore = dfpt or bool(incar.get("LHFCALC") or incar.get("LRPA"))
+
+    def is_valid(kpar: int, ncore: int) -> bool:
+        if kpar < 1 or ncore < 1 or n_ranks % kpar or kpar > max(n_kpts, 1):
+            return False
+        if kpar > 1 and incar.get("LELF"):
+            return False
+        return (n_ranks // kpar) % ncore == 0 and domain % ncore == 0 and (ncore == 1 or not fixed_ncore)
+
+    mean_timings = {config: float(np.mean(vals)) for config, vals in timings.items()}
+    best = min(mean_timings, key=lambda config: mean_timings[config])
+    kpar, ncore = best
+    rationale = [
+        "Measured s/electronic step: "
+        + ", ".join(f"KPAR={k} NCORE={n}: {t:.2f}" for (k, n), t in sorted(mean_timings.items()))
+    ]
+    neighbors = [(kpar, ncore * 2), (kpar, ncore // 2), (kpar * 2, ncore), (kpar // 2, ncore)]
+    untried = [config for config in neighbors if is_valid(*config) and config not in mean_timings]
+    if untried:
+        kpar, ncore = untried[0]
+        rationale.append(f"Trying KPAR = {kpar}, NCORE = {ncore} next to fastest KPAR = {best[0]}, NCORE = {best[1]}")
+    else:
+        rationale.append(f"Keeping fastest KPAR = {kpar}, NCORE = {ncore}")
+
+    # NCORE is left unset for finite differences and DFPT, as in get_auto_parallel_settings
+    settings: dict[str, Any] = {"KPAR": kpar, "NCORE": None if dfpt else ncore, "NPAR": None}
+    n_band_groups = n_ranks // kpar // ncore
+    if (nbands := incar.get("NBANDS")) and n_band_groups > 1 and nbands % n_band_groups:
+        settings["NBANDS"] = math.ceil(nbands / n_band_groups) * n_band_groups
+        rationale.append(f"NBANDS = {settings['NBANDS']}: {nbands} padded to a multiple of {n_band_groups} band groups")
+    return settings, rationale
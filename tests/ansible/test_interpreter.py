@@ -147,6 +147,29 @@ class TestModder:
         mod_o = modder.modify_object({"_set": {"b->a": 20}}, o)
         assert mod_o.b["a"] == 20
 
+        # several modifications are applied in a single round trip
+        mod_o = modder.modify_object([{"_set": {"b->a": 20}}, {"_inc": {"b->a": 5}}], o)
+        assert mod_o.b["a"] == 25
+
+    def test_compile_actions(self) -> None:
+        actions = [
+            {"dict": "INCAR", "action": {"_set": {"ALGO": "All"}}},
+            {"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}},
+            {"dict": "KPOINTS", "action": {"_set": {"kpoints": [[2, 2, 2]]}}},
+            {"dict": "INCAR", "action": {"_unset": {"ISTART": 1}}},
+        ]
+        file_actions, dict_actions = Modder.compile_actions(actions)
+        assert file_actions == [("CONTCAR", {"_file_copy": {"dest": "POSCAR"}})]
+        assert list(dict_actions) == ["INCAR", "KPOINTS"]
+        assert dict_actions["INCAR"] == [{"_set": {"ALGO": "All"}}, {"_unset": {"ISTART": 1}}]
+
+        with pytest.raises(ValueError, match="Unrecognized format"):
+            Modder.compile_actions([{"action": {"_set": {"ALGO": "All"}}}])
+
+        # the action table is shared between modders
+        assert Modder(actions=[FileActions]).supported_actions == Modder(actions=[FileActions]).supported_actions
+        assert "_file_copy" not in Modder().supported_actions
+
 
 class MyObject:
     def __init__(self, a) -> None:
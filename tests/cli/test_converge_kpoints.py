@@ -0,0 +1,49 @@
+import shutil
+import threading
+import time
+
+from pymatgen.io.vasp.inputs import Kpoints
+
+from custodian.cli import converge_kpoints
+from custodian.cli.converge_kpoints import get_meshes, run_sweep
+from tests.conftest import TEST_FILES
+
+
+def test_get_meshes() -> None:
+    assert get_meshes([2, 4, 2], max_steps=3) == [[2, 4, 2], [4, 8, 4], [6, 12, 6]]
+    assert get_meshes([2, 4, 2], max_steps=3, mode="inc") == [[2, 4, 2], [3, 5, 3], [4, 6, 4]]
+
+
+def test_run_sweep(tmp_path, monkeypatch) -> None:
+    for file in ("INCAR", "KPOINTS", "POSCAR", "POTCAR"):
+        shutil.copy(f"{TEST_FILES}/{file}", tmp_path)
+    start = list(Kpoints.from_file(f"{TEST_FILES}/KPOINTS").kpts[0])
+    energies = {1: -1.0, 2: -1.1, 3: -1.1005}
+    calls = []
+    lock = threading.Lock()
+    running = [0, 0]  # current, max
+
+    def run_mesh(vasp_command, vasp_input, mesh, directory):
+        with lock:
+            calls.append((vasp_command, mesh, directory))
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return energies.get(mesh[0] // start[0], -1.1005)
+
+    monkeypatch.setattr(converge_kpoints, "run_mesh", run_mesh)
+    results = run_sweep(
+        ["mpirun", "-np", "{cores}", "vasp"], max_steps=10, cores=5, cores_per_run=2, directory=str(tmp_path)
+    )
+
+    # two runs at a time, and no mesh is started after the 2nd and 3rd agree within target
+    assert running[1] == 2
+    assert [res["mesh"] for res in results] == get_meshes(start, max_steps=4)
+    assert sorted(call[1] for call in calls) == sorted(res["mesh"] for res in results)
+    assert all(call[0] == ["mpirun", "-np", "2", "vasp"] for call in calls)
+    assert results[1]["directory"] == str(tmp_path / f"kpoints_{'x'.join(map(str, results[1]['mesh']))}")
+    summary = (tmp_path / "kpoints_convergence.txt").read_text().splitlines()
+    assert len(summary) == 5
+    assert summary[2].endswith("converged")
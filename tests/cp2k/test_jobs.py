@@ -2,11 +2,16 @@
 # Distributed under the terms of the MIT License.
 
 import os
+import subprocess
+import sys
+import time
 import unittest
 import warnings
 from glob import glob
 from pathlib import Path
 
+import pytest
+
 from custodian.cp2k.jobs import Cp2kJob
 from custodian.custodian import Custodian
 from tests.conftest import TEST_FILES
@@ -70,3 +75,96 @@ class HandlerTests(unittest.TestCase):
             backup=False,
         )
         assert len(jobs) == 2
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX process groups")
+def test_terminate(tmp_path) -> None:
+    """Only the process group of the job is terminated."""
+    # the extra "-i cp2k.inp" arguments are ignored by sh -c
+    job = Cp2kJob(["sh", "-c", "sleep 30 & sleep 30; wait"], terminate_timeout=5)
+    job.terminate()  # not running yet
+
+    bystander = subprocess.Popen(["sleep", "30"])
+    process = job.run(directory=str(tmp_path))
+    pgid = os.getpgid(process.pid)
+    assert pgid != os.getpgid(0)
+
+    job.terminate()
+    assert process.poll() is not None
+    # the orphaned background sleep is killed too, but reaped asynchronously by init
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail(f"process group {pgid} still alive")
+    assert bystander.poll() is None
+    bystander.kill()
+    bystander.wait()
+
+
+def test_postprocess_snapshot(tmp_path) -> None:
+    files = ("cp2k.inp", "cp2k.inp.orig", "cp2k.out", "GGA-RESTART.wfn", "GGA-RESTART.wfn.bak-1", "GGA-pos-1.xyz")
+    for file in (*files, "custodian.json"):
+        (tmp_path / file).write_text(file)
+    job = Cp2kJob(["cp2k"], suffix="1", final=False, snapshot_exclude=["*json*", "*.bak-*"])
+    job.postprocess(directory=str(tmp_path))
+    assert sorted(os.listdir(tmp_path / "run1")) == [
+        "GGA-RESTART.wfn",
+        "GGA-pos-1.xyz",
+        "cp2k.inp",
+        "cp2k.inp.orig",
+        "cp2k.out",
+    ]
+    assert (tmp_path / "run1" / "GGA-RESTART.wfn").read_text() == "GGA-RESTART.wfn"
+    # files modified in place by later jobs are never hard linked
+    for file in ("cp2k.inp", "GGA-pos-1.xyz"):
+        assert os.stat(tmp_path / file).st_nlink == 1
+    with open(tmp_path / "GGA-pos-1.xyz", mode="a") as f:
+        f.write("next")
+    assert (tmp_path / "run1" / "GGA-pos-1.xyz").read_text() == "GGA-pos-1.xyz"
+
+    # a new run replaces its output instead of truncating the snapshot
+    job.cp2k_cmd = ["echo"]
+    job.run(directory=str(tmp_path)).wait()
+    assert (tmp_path / "run1" / "cp2k.out").read_text() == "cp2k.out"
+
+    job = Cp2kJob(["cp2k"], suffix="2", final=True, snapshot_include=["*.wfn"])
+    job.postprocess(directory=str(tmp_path))
+    assert os.listdir(tmp_path / "run2") == ["GGA-RESTART.wfn"]
+    assert not os.path.isfile(tmp_path / "GGA-RESTART.wfn")
+
+
+def test_overlap_stages(tmp_path) -> None:
+    with open(f"{TEST_FILES_DIR}/cp2k.inp.hybrid") as file:
+        text = file.read().replace("RUN_TYPE ENERGY_FORCE", "RUN_TYPE GEO_OPT")
+    results = []
+    for overlap in (False, True):
+        directory = tmp_path / str(overlap)
+        directory.mkdir()
+        (directory / "cp2k.inp").write_text(text)
+        (directory / "BASIS_MOLOPT").write_text("basis")
+        job1, job2 = Cp2kJob.pre_screen_hybrid(["true"], directory=str(directory), overlap_stages=overlap)
+        job1.setup(directory=str(directory))
+        job1.run(directory=str(directory)).wait()
+        job1.postprocess(directory=str(directory))
+        if overlap:
+            job2._prepare_thread.join()
+            assert job2._prepared is not None
+            assert Cp2kJob._get_data_files(job2._prepared[1], str(directory)) == [str(directory / "BASIS_MOLOPT")]
+        job2.setup(directory=str(directory))
+        assert job2._prepared is None
+        results.append((directory / "cp2k.inp").read_text())
+    assert results[0] == results[1]
+    assert "UNSCREENED_HYBRID-RESTART.wfn" in results[1]
+
+    # the prepared input is discarded if the input changed in the meantime
+    directory = tmp_path / "True"
+    (directory / "cp2k.inp").write_text(text)
+    job2.prepare(directory=str(directory))
+    (directory / "cp2k.inp").write_text(text.replace("Hybrid-Static", "Changed"))
+    job2.setup(directory=str(directory))
+    assert job2.ci["GLOBAL"]["PROJECT_NAME"].values[0] == "Changed"
@@ -0,0 +1,201 @@
+import itertools
+import shutil
+
+import pytest
+from pymatgen.io.cp2k.inputs import Cp2kInput
+
+from custodian.cp2k.interpreter import Cp2kModder
+from custodian.cp2k.utils import (
+    Cp2kOutputTracker,
+    activate_ot,
+    can_use_ot,
+    get_conv,
+    get_wfn_restart_actions,
+    load_input,
+    read_band_gap,
+)
+from tests.conftest import TEST_FILES
+
+TEST_FILES_DIR = f"{TEST_FILES}/cp2k"
+
+
+class TestCp2kOutputTracker:
+    def test_incremental(self, tmp_path) -> None:
+        with open(f"{TEST_FILES_DIR}/cp2k.out.conv", mode="rb") as file:
+            content = file.read()
+        output_file = str(tmp_path / "cp2k.out")
+        tracker = Cp2kOutputTracker.get(output_file)
+        assert Cp2kOutputTracker.get(output_file) is tracker
+        assert not tracker.update().convergence
+
+        # append the output in chunks that split lines
+        for idx in range(0, len(content), 1000):
+            with open(output_file, mode="ab") as file:
+                file.write(content[idx : idx + 1000])
+            tracker.update()
+        assert list(tracker.convergence) == get_conv(f"{TEST_FILES_DIR}/cp2k.out.conv")
+        assert len(tracker.convergence) == 45
+        assert tracker.n_scf_tables == 5
+        assert not tracker.completed
+
+        # a new run overwriting the output is detected
+        with open(f"{TEST_FILES_DIR}/cp2k.out.imprecise", mode="rb") as file:
+            content = file.read()
+        with open(output_file, mode="wb") as file:
+            file.write(content)
+        assert len(tracker.update().convergence) == 22
+        assert tracker.spin_polarized
+
+    def test_run_state(self) -> None:
+        tracker = Cp2kOutputTracker(f"{TEST_FILES_DIR}/cp2k.out.unconverged").update()
+        assert list(tracker.scf_converged) == [False]
+        assert tracker.completed
+        assert tracker.band_gap is None
+
+        # stuck in the preconditioner before the first SCF step
+        tracker = Cp2kOutputTracker(f"{TEST_FILES_DIR}/cp2k.out.precondstuck").update()
+        assert tracker.last_lines[-2].split()[:2] == ["Step", "Update"]
+        assert tracker.n_scf_tables == 1
+        assert tracker.scf_table == []
+
+    def test_same_conv_count(self) -> None:
+        for file in ("cp2k.out.conv", "cp2k.out.imprecise"):
+            tracker = Cp2kOutputTracker(f"{TEST_FILES_DIR}/{file}").update()
+            counts = [len(list(group)) for _, group in itertools.groupby(tracker.convergence)]
+            assert tracker.max_same_conv_count == max(counts)
+            assert tracker.same_conv_count == counts[-1]
+        assert tracker.max_same_conv_count == 4
+
+    def test_history_size(self) -> None:
+        full = Cp2kOutputTracker(f"{TEST_FILES_DIR}/cp2k.out.conv").update()
+        tracker = Cp2kOutputTracker(f"{TEST_FILES_DIR}/cp2k.out.conv", history_size=10).update()
+        # only the recent values are kept, the counters cover the whole run
+        assert list(tracker.convergence) == list(full.convergence)[-10:]
+        assert tracker.scf_table == full.scf_table
+        assert tracker.n_scf_tables == full.n_scf_tables == 5
+        assert tracker.max_conv == max(full.convergence)
+        assert tracker.max_same_conv_count == full.max_same_conv_count
+
+    def test_messages(self, tmp_path) -> None:
+        assert Cp2kOutputTracker(f"{TEST_FILES_DIR}/cp2k.out.cholesky").update().messages == {"cholesky": 1}
+
+        # messages split across appends are found once the line is complete
+        output_file = str(tmp_path / "cp2k.out")
+        tracker = Cp2kOutputTracker(output_file)
+        with open(output_file, mode="w") as file:
+            file.write(" *** ERROR: run exceeded requested exe")
+        assert tracker.update().messages == {}
+        with open(output_file, mode="a") as file:
+            file.write("cution time ***\n")
+        assert tracker.update().messages == {"walltime": 1}
+
+
+class TestLoadInput:
+    def test_cache(self, tmp_path) -> None:
+        input_file = str(tmp_path / "cp2k.inp")
+        shutil.copy(f"{TEST_FILES_DIR}/cp2k.inp", input_file)
+        ci = load_input(input_file)
+        assert ci.get_str() == Cp2kInput.from_file(input_file).get_str()
+
+        # cached copies are independent of each other
+        ci["global"]["run_type"] = "ENERGY"
+        ci2 = load_input(input_file)
+        assert ci2 is not ci
+        assert ci2["global"]["run_type"].values[0] != "ENERGY"
+
+        # rewriting the file invalidates the cache
+        ci.write_file(input_file)
+        assert load_input(input_file)["global"]["run_type"].values[0] == "ENERGY"
+
+    def test_modder(self, tmp_path, monkeypatch) -> None:
+        shutil.copy(f"{TEST_FILES_DIR}/cp2k.inp", tmp_path / "cp2k.inp")
+        modder = Cp2kModder(filename="cp2k.inp", directory=str(tmp_path))
+        modder.apply_actions([{"dict": "cp2k.inp", "action": {"_set": {"GLOBAL": {"RUN_TYPE": "ENERGY"}}}}])
+
+        # the written input is served from the cache without parsing the file again
+        def from_file(*args, **kwargs):
+            raise AssertionError("input file was parsed")
+
+        monkeypatch.setattr(Cp2kInput, "from_file", from_file)
+        assert load_input(str(tmp_path / "cp2k.inp"))["global"]["run_type"].values[0] == "ENERGY"
+
+
+class TestWfnRestartActions:
+    def test_reuse(self, tmp_path) -> None:
+        input_file = str(tmp_path / "cp2k.inp")
+        shutil.copy(f"{TEST_FILES_DIR}/cp2k.inp", input_file)
+        scf_action = {"dict": "cp2k.inp", "action": {"_set": {"FORCE_EVAL": {"DFT": {"SCF": {"MAX_SCF": 50}}}}}}
+        # no wavefunction to reuse
+        assert get_wfn_restart_actions([scf_action], input_file) == []
+
+        (tmp_path / "CP2K-RESTART.wfn").write_bytes(b"wfn")
+        actions = get_wfn_restart_actions([scf_action], input_file)
+        assert actions == [
+            {
+                "dict": input_file,
+                "action": {"_set": {"FORCE_EVAL": {"DFT": {"WFN_RESTART_FILE_NAME": "CP2K-RESTART.wfn"}}}},
+            }
+        ]
+        modder = Cp2kModder(filename="cp2k.inp", directory=str(tmp_path))
+        modder.apply_actions([scf_action, *actions])
+        ci = load_input(input_file)
+        assert ci["FORCE_EVAL"]["DFT"]["WFN_RESTART_FILE_NAME"].values[0] == "CP2K-RESTART.wfn"
+        assert get_wfn_restart_actions([scf_action], input_file) == []
+
+        # switching between OT and diagonalization keeps the wavefunction
+        diag_actions = [{"dict": "cp2k.inp", "action": ("_unset", {"FORCE_EVAL": {"DFT": {"SCF": "OT"}}})}]
+        assert get_wfn_restart_actions(diag_actions, input_file) == []
+
+        # handlers that decide on the wavefunction themselves are not overridden
+        assert get_wfn_restart_actions(actions, input_file) == []
+
+    def test_activate_ot(self, tmp_path) -> None:
+        input_file = str(tmp_path / "cp2k.inp")
+        shutil.copy(f"{TEST_FILES_DIR}/cp2k.inp", input_file)
+        (tmp_path / "CP2K-RESTART.wfn").write_bytes(b"wfn")
+        modder = Cp2kModder(filename="cp2k.inp", directory=str(tmp_path))
+        modder.apply_actions(get_wfn_restart_actions([], input_file))
+        assert load_input(input_file)["FORCE_EVAL"]["DFT"]["SCF"]["SCF_GUESS"].values[0].upper() == "RESTART"
+
+        # the new SCF section of activate_ot has no SCF_GUESS, so it is set again
+        actions = []
+        activate_ot(actions, load_input(input_file))
+        actions += get_wfn_restart_actions(actions, input_file)
+        modder.apply_actions(actions)
+        scf = load_input(input_file)["FORCE_EVAL"]["DFT"]["SCF"]
+        assert scf["SCF_GUESS"].values[0].upper() == "RESTART"
+        assert scf.get("OT")
+
+    def test_incompatible(self, tmp_path) -> None:
+        input_file = str(tmp_path / "cp2k.inp")
+        shutil.copy(f"{TEST_FILES_DIR}/cp2k.inp", input_file)
+        (tmp_path / "CP2K-RESTART.wfn").write_bytes(b"wfn")
+        basis_action = {"dict": "cp2k.inp", "action": {"_set": {"FORCE_EVAL": {"SUBSYS": {"KIND": {}}}}}}
+        assert get_wfn_restart_actions([basis_action], input_file) == [
+            {"dict": input_file, "action": {"_set": {"FORCE_EVAL": {"DFT": {"SCF": {"SCF_GUESS": "ATOMIC"}}}}}}
+        ]
+        spin_action = {"dict": "cp2k.inp", "action": [("_set", {"FORCE_EVAL": {"DFT": {"UKS": True}}})]}
+        assert len(get_wfn_restart_actions([spin_action], input_file)) == 1
+
+
+def test_read_band_gap(tmp_path) -> None:
+    output_file = str(tmp_path / "cp2k.out")
+    scf = "     1 OT DIIS     0.15E+00    0.5     0.00012345     -100.0000000000 -1.00E+02\n"
+    step = scf + "  *** SCF run converged in     1 steps ***\n"
+    with open(output_file, mode="w") as file:
+        file.write(step + " HOMO - LUMO gap [eV] :    0.050000\n")
+        file.write(step + " HOMO - LUMO gap [eV] :    1.000000\n\n HOMO - LUMO gap [eV] :    2.000000\n")
+    assert read_band_gap(output_file) == pytest.approx(1.5)
+    assert read_band_gap(output_file, max_bytes=100) == pytest.approx(1.5)
+
+    ci = load_input(f"{TEST_FILES_DIR}/cp2k.inp")
+    assert not can_use_ot(output_file, ci)  # OT is already active
+    ci["FORCE_EVAL"]["DFT"]["SCF"].subsections.pop("OT")
+    assert can_use_ot(output_file, ci)
+    assert not can_use_ot(output_file, ci, minimum_band_gap=2)
+
+    # no gap near the end falls back to parsing the whole file
+    with open(output_file, mode="a") as file:
+        file.write(step * 10)
+    assert read_band_gap(output_file, max_bytes=100) is None
+    assert can_use_ot(output_file, ci)
@@ -0,0 +1,80 @@
+import os
+import shutil
+from glob import glob
+
+from pymatgen.io.qchem.outputs import QCOutput
+
+from custodian.qchem.handlers import QChemErrorHandler
+from custodian.qchem.utils import QCOutputTracker, load_qcoutput_data
+from tests.conftest import TEST_FILES
+
+TEST_DIR = f"{TEST_FILES}/qchem"
+
+
+class TestQCOutputTracker:
+    def test_update(self) -> None:
+        tracker = QCOutputTracker(f"{TEST_DIR}/hf_gdm.out").update()
+        assert tracker.errors == {"SCF_failed_to_converge": 1}
+        assert not tracker.completed
+
+        tracker = QCOutputTracker(f"{TEST_DIR}/new_test_files/qunino_vinyl.qout.1").update()
+        assert tracker.completed
+        assert not tracker.errors
+        assert not tracker.multiple_outputs
+
+        assert QCOutputTracker(f"{TEST_DIR}/ts_cf3_leave.qcout").update().multiple_outputs
+
+    def test_no_errors_in_qcoutput(self) -> None:
+        # the handler skips the full parse of these outputs, so QCOutput must agree
+        files = glob(f"{TEST_DIR}/*.qcout") + glob(f"{TEST_DIR}/*.out") + glob(f"{TEST_DIR}/new_test_files/*.qout*")
+        skipped = 0
+        for filename in files:
+            tracker = QCOutputTracker(filename).update()
+            if tracker.completed and not tracker.errors and not tracker.multiple_outputs:
+                assert QCOutput(filename).data["errors"] == [], filename
+                skipped += 1
+        assert skipped >= 3
+
+    def test_incremental(self, tmp_path) -> None:
+        with open(f"{TEST_DIR}/new_test_files/unable_to_determine_lamda.qout.0", mode="rb") as file:
+            content = file.read()
+        filename = str(tmp_path / "mol.qout")
+        tracker = QCOutputTracker.get(filename)
+        assert QCOutputTracker.get(filename) is tracker
+        with open(filename, mode="wb") as file:
+            for start in range(0, len(content), 4000):
+                file.write(content[start : start + 4000])
+                file.flush()
+                tracker.update()
+        assert (
+            tracker.errors
+            == QCOutputTracker(f"{TEST_DIR}/new_test_files/unable_to_determine_lamda.qout.0").update().errors
+        )
+        assert "unable_to_determine_lamda" in tracker.errors
+
+        # copying another output over the file starts over
+        shutil.copy(f"{TEST_DIR}/new_test_files/qunino_vinyl.qout.1", filename)
+        assert tracker.update().completed
+        assert not tracker.errors
+
+    def test_load_qcoutput_data(self, tmp_path) -> None:
+        filename = str(tmp_path / "mol.qout")
+        shutil.copy(f"{TEST_DIR}/hf_gdm.out", filename)
+        data = load_qcoutput_data(filename)
+        assert data["errors"] == ["SCF_failed_to_converge"]
+        data["errors"].append("modified")
+        # renaming the output keeps the parse, and every call gets its own copy
+        os.rename(filename, f"{filename}.opt_0")
+        assert load_qcoutput_data(f"{filename}.opt_0")["errors"] == ["SCF_failed_to_converge"]
+
+    def test_handler_check(self, tmp_path) -> None:
+        handler = QChemErrorHandler()
+        shutil.copy(f"{TEST_DIR}/hf_gdm.out", tmp_path / "mol.qout")
+        assert handler.check(str(tmp_path))
+        assert handler.errors == ["SCF_failed_to_converge"]
+
+        # a completed run without error messages is not parsed in full
+        shutil.copy(f"{TEST_DIR}/new_test_files/qunino_vinyl.qout.1", tmp_path / "mol.qout")
+        assert not handler.check(str(tmp_path))
+        assert handler.errors == []
+        assert handler.outdata is None
@@ -66,6 +66,13 @@ class ExampleJob(Job):
         return f"ExampleJob{self.jobid}"
 
 
+class SetupCorrectionJob(ExitCodeJob):
+    def setup(self, directory="./") -> None:
+        self.setup_corrections = [
+            {"errors": ["total < 50"], "actions": ["increment by 1"], "handler": ExampleHandler({})}
+        ]
+
+
 class ExampleHandler(ErrorHandler):
     def __init__(self, params) -> None:
         self.params = params
@@ -158,6 +165,12 @@ class CustodianTest(unittest.TestCase):
         c = Custodian([], [ExitCodeJob(1)], terminate_on_nonzero_returncode=False)
         c.run()
 
+    def test_setup_corrections(self) -> None:
+        c = Custodian([], [SetupCorrectionJob(0)])
+        c.run()
+        assert c.run_log[-1]["corrections"][0]["errors"] == ["total < 50"]
+        assert c.total_errors == 0
+
     def test_run(self) -> None:
         n_jobs = 100
         params = {"initial": 0, "total": 0}
@@ -1,7 +1,12 @@
+import json
+import os
 import tarfile
 from pathlib import Path
 
-from custodian.utils import backup, tracked_lru_cache
+import pytest
+
+import custodian.utils
+from custodian.utils import ProgressMonitor, backup, get_process_cpu_times, restore_backup, tracked_lru_cache
 
 
 def test_cache_and_clear() -> None:
@@ -70,3 +75,113 @@ def test_backup_with_directory(tmp_path) -> None:
     with tarfile.open(tmp_path / "error.1.tar.gz", "r:gz") as tar:
         assert len(tar.getmembers()) == 1
         assert tar.getnames() == ["error.1/INCAR"]
+
+
+def test_backup_incremental(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    with open("INCAR", "w") as f:
+        f.write("ISMEAR = 0")
+    with open("POSCAR", "w") as f:
+        f.write("This is a test file.")
+
+    backup(["INCAR", "POSCAR"], incremental=True)
+    with open("INCAR", "w") as f:
+        f.write("ISMEAR = 1")
+    backup(["INCAR", "POSCAR"], incremental=True)
+
+    assert not Path("error.1.tar.gz").exists()
+    # POSCAR is unchanged and only stored once
+    assert len(list(Path("error.store").iterdir())) == 3
+    with open("error.manifest.json") as f:
+        manifest = json.load(f)
+    assert [entry["index"] for entry in manifest["backups"]] == [1, 2]
+
+    restore_backup(1)
+    restore_backup(2)
+    assert Path("error.1/INCAR").read_text() == "ISMEAR = 0"
+    assert Path("error.2/INCAR").read_text() == "ISMEAR = 1"
+    assert Path("error.2/POSCAR").read_text() == "This is a test file."
+
+    # numbering continues from the manifest for regular backups
+    backup(["INCAR"], incremental=False)
+    assert Path("error.3.tar.gz").exists()
+
+
+def test_backup_incremental_size_caps(tmp_path) -> None:
+    (tmp_path / "INCAR").write_text("small")
+    (tmp_path / "WAVECAR").write_text("x" * 1000)
+
+    backup(["INCAR", "WAVECAR"], directory=tmp_path, incremental=True, max_file_size=100)
+
+    with open(tmp_path / "error.manifest.json") as f:
+        entry = json.load(f)["backups"][0]
+    assert set(entry["files"]) == {"INCAR"}
+    assert entry["skipped"]["WAVECAR"]["reason"] == "max_file_size"
+
+    (tmp_path / "INCAR").write_text("changed")
+    backup(["INCAR", "WAVECAR"], directory=tmp_path, incremental=True, max_total_size=3)
+    with open(tmp_path / "error.manifest.json") as f:
+        entry = json.load(f)["backups"][1]
+    assert entry["files"] == {}
+    assert entry["skipped"]["INCAR"]["reason"] == "max_total_size"
+
+
+def test_get_process_cpu_times(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    cpu_times = get_process_cpu_times(tmp_path)
+    assert os.getpid() in cpu_times
+    assert cpu_times[os.getpid()] > 0
+    assert get_process_cpu_times(tmp_path, name="no_such_process") == {}
+
+
+def test_progress_monitor(tmp_path, monkeypatch) -> None:
+    now = [0.0]
+    cpu_times = {1: 10.0, 2: 10.0}
+    monkeypatch.setattr(custodian.utils.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(custodian.utils, "get_process_cpu_times", lambda *_args: dict(cpu_times))
+    (tmp_path / "OSZICAR").write_text("step 1\n")
+    monitor = ProgressMonitor(["OSZICAR", "OUTCAR"])
+    assert monitor.update(tmp_path) == (0.0, None)
+
+    # no progress and idle ranks
+    now[0] = 100.0
+    stalled, cpu_usage = monitor.update(tmp_path)
+    assert stalled == 100
+    assert cpu_usage == 0
+
+    # a busy rank makes the run look healthy
+    cpu_times[2] = 60.0
+    now[0] = 200.0
+    assert monitor.update(tmp_path)[1] > 0.2
+
+    # output changes reset the clock
+    (tmp_path / "OUTCAR").write_text("")
+    assert monitor.update(tmp_path) == (0.0, None)
+
+
+def test_progress_monitor_window(tmp_path, monkeypatch) -> None:
+    now = [0.0]
+    cpu_times = {1: 0.0}
+    monkeypatch.setattr(custodian.utils.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(custodian.utils, "get_process_cpu_times", lambda *_args: dict(cpu_times))
+    (tmp_path / "OSZICAR").write_text("step 1\n")
+    monitor = ProgressMonitor(["OSZICAR"], window=600)
+    monitor.update(tmp_path)
+
+    # a long busy step without output
+    for _ in range(120):
+        now[0] += 30
+        cpu_times[1] += 30
+        assert monitor.update(tmp_path)[1] == pytest.approx(1)
+
+    # then the run hangs: the usage drops to zero once the busy period leaves the window
+    for _ in range(20):
+        now[0] += 30
+        stalled, cpu_usage = monitor.update(tmp_path)
+    assert stalled == 4200
+    assert cpu_usage == 0
+
+    # checks further apart than the window compare against the previous sample
+    now[0] += 1000
+    cpu_times[1] += 500
+    assert monitor.update(tmp_path)[1] == pytest.approx(0.5)
@@ -23,14 +23,17 @@ from custodian.vasp.handlers import (
     LargeSigmaHandler,
     LrfCommutatorHandler,
     MeshSymmetryErrorHandler,
+    NEBImageHandler,
     NonConvergingErrorHandler,
     PositiveEnergyErrorHandler,
     PotimErrorHandler,
     ScanMetalHandler,
+    ScfDivergenceHandler,
     StdErrHandler,
     UnconvergedErrorHandler,
     VaspErrorHandler,
     WalltimeHandler,
+    get_warm_start_actions,
 )
 from custodian.vasp.interpreter import VaspModder
 from tests.conftest import TEST_FILES
@@ -78,6 +81,22 @@ class VaspErrorHandlerTest(MatSciTest):
         assert dct["errors"] == ["Frozen job"]
         assert Incar.from_file("INCAR")["ALGO"] == "Normal"
 
+    def test_frozen_job_idle(self, monkeypatch) -> None:
+        now = [0.0]
+        cpu_times = {1: 10.0}
+        monkeypatch.setattr("custodian.utils.time.monotonic", lambda: now[0])
+        monkeypatch.setattr("custodian.utils.get_process_cpu_times", lambda *_args: dict(cpu_times))
+        Path("vasp.out").write_text("running\n")
+        handler = FrozenJobErrorHandler(idle_timeout=60)
+        assert not handler.check()
+        # the ranks are busy, so this is only a slow step
+        now[0] = cpu_times[1] = 100.0
+        assert not handler.check()
+        # the ranks stop using CPU
+        now[0] = 170.0
+        assert handler.check()
+        assert FrozenJobErrorHandler.from_dict(handler.as_dict()).idle_timeout == 60
+
     def test_algotet(self) -> None:
         shutil.copy("INCAR.algo_tet_only", "INCAR")
         handler = VaspErrorHandler("vasp.algo_tet_only")
@@ -94,6 +113,33 @@ class VaspErrorHandlerTest(MatSciTest):
         assert handler.error_count["algo_tet"] == 2
         assert dct["actions"] == [{"action": {"_set": {"ISMEAR": 0, "SIGMA": 0.05}}, "dict": "INCAR"}]
 
+    def test_preflight_check(self) -> None:
+        incar = Incar.from_file("INCAR")
+        incar.update({"ALGO": "All", "LELF": True, "KPAR": 2, "NBANDS": 10})
+        incar.write_file("INCAR")
+        Kpoints.gamma_automatic((1, 1, 1)).write_file("KPOINTS")
+
+        handler = VaspErrorHandler()
+        assert handler.preflight_check()
+        assert handler.errors == {"tet", "algo_tet", "elf_kpar", "too_few_bands"}
+        dct = handler.correct()
+        incar = Incar.from_file("INCAR")
+        assert incar["ISMEAR"] == 0
+        assert incar["ALGO"] == "Fast"
+        assert incar["KPAR"] == 1
+        assert incar["NBANDS"] == 11
+        assert sorted(dct["errors"]) == ["algo_tet", "elf_kpar", "tet", "too_few_bands"]
+
+        handler = VaspErrorHandler(errors_subset_to_catch=["elf_kpar"])
+        assert not handler.preflight_check()
+
+        incar.update({"LEPSILON": True, "NCORE": 4, "NBANDS": 100})
+        incar.write_file("INCAR")
+        assert VaspErrorHandler().preflight_check()
+        handler = VaspErrorHandler()
+        handler.preflight_check()
+        assert handler.errors == {"dfpt_ncore"}
+
     def test_subspace(self) -> None:
         handler = VaspErrorHandler("vasp.subspace")
         handler.check()
@@ -1016,6 +1062,25 @@ class WalltimeHandlerTest(MatSciTest):
             assert content == "LABORT = .TRUE."
         os.remove("STOPCAR")
 
+    def test_slurm_end_time(self, monkeypatch) -> None:
+        end_time = datetime.datetime.now() + datetime.timedelta(hours=2)
+        monkeypatch.setenv("SLURM_JOB_END_TIME", str(int(end_time.timestamp())))
+        handler = WalltimeHandler()
+        assert handler.wall_time == pytest.approx(7200, abs=2)
+
+    def test_predict_step_time(self) -> None:
+        handler = WalltimeHandler(wall_time=3600)
+        assert handler.predict_step_time([]) == 0
+        assert handler.predict_step_time([10.0] * 20) == pytest.approx(10)
+        # steps getting slower are extrapolated past the 95th percentile
+        assert handler.predict_step_time([10.0, 20.0, 30.0, 40.0]) == pytest.approx(50)
+
+        # the postprocess run writes a ~4.4 MB CHGCAR; at 1 kB/s that takes longer than the time left
+        handler = WalltimeHandler(wall_time=1000, buffer_time=10, write_bandwidth=1e3)
+        assert handler.check()
+        handler = WalltimeHandler(wall_time=1000, buffer_time=10)
+        assert not handler.check()
+
     def test_check_with_malformed_outcar(self, tmp_path: Path) -> None:
         """Test that WalltimeHandler.check() returns False on malformed OUTCAR.
 
@@ -1226,3 +1291,185 @@ class NonConvergingErrorHandlerTest(MatSciTest):
         h2 = NonConvergingErrorHandler.from_dict(handler.as_dict())
         assert isinstance(h2, NonConvergingErrorHandler)
         assert h2.output_filename == "OSZICAR_random"
+
+
+class WarmStartActionsTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, *glob("nonconv/*", root_dir=TEST_FILES))
+        for filename in ("WAVECAR", "CHGCAR"):
+            with open(filename, mode="w") as file:
+                file.write("data")
+        # start from scratch unless the policy decides otherwise
+        incar = Incar.from_file("INCAR")
+        incar.update({"ISTART": 0, "ICHARG": 2})
+        incar.write_file("INCAR")
+
+    def test_policy(self) -> None:
+        algo = [{"dict": "INCAR", "action": {"_set": {"ALGO": "Normal", "NBANDS": 32}}}]
+        warm_start = {"dict": "INCAR", "action": {"_set": {"ISTART": 1, "ICHARG": 0}}}
+        assert get_warm_start_actions(algo) == [warm_start]
+
+        # new k-points invalidate the wavefunctions, but not the charge density
+        kpts = [{"dict": "KPOINTS", "action": {"_set": {"kpoints": [[4, 4, 4]]}}}]
+        assert get_warm_start_actions(kpts) == [{"dict": "INCAR", "action": {"_set": {"ICHARG": 1}}}]
+        assert get_warm_start_actions([{"dict": "INCAR", "action": {"_set": {"ISYM": 0}}}]) == [
+            {"dict": "INCAR", "action": {"_set": {"ICHARG": 1}}}
+        ]
+
+        # restarting from the final structure keeps the WAVECAR valid, other structure changes do not
+        contcar = [{"file": "CONTCAR", "action": {"_file_copy": {"dest": "POSCAR"}}}]
+        assert get_warm_start_actions(algo + contcar) == [warm_start]
+        poscar = [{"dict": "POSCAR", "action": {"_set": {"structure": {}}}}]
+        assert get_warm_start_actions(algo + poscar) == []
+
+        # corrections that explicitly handle the restart files are left alone
+        assert get_warm_start_actions([{"dict": "INCAR", "action": {"_set": {"ISTART": 0, "ALGO": "All"}}}]) == []
+        assert get_warm_start_actions([{"file": "WAVECAR", "action": {"_file_delete": {"mode": "actual"}}}]) == []
+
+        # VASP reads an existing WAVECAR by default, so stale files have to be ignored explicitly
+        incar = Incar.from_file("INCAR")
+        incar.pop("ISTART")
+        incar.pop("ICHARG")
+        incar.write_file("INCAR")
+        assert get_warm_start_actions(algo) == []
+        assert get_warm_start_actions(kpts) == [{"dict": "INCAR", "action": {"_set": {"ISTART": 0, "ICHARG": 1}}}]
+        os.remove("CHGCAR")
+        assert get_warm_start_actions(kpts) == [{"dict": "INCAR", "action": {"_set": {"ISTART": 0, "ICHARG": 2}}}]
+
+    def test_handler(self) -> None:
+        handler = NonConvergingErrorHandler(nionic_steps=3, warm_start=True)
+        dct = handler.correct()
+        assert dct["actions"][-1] == {"dict": "INCAR", "action": {"_set": {"ISTART": 1, "ICHARG": 0}}}
+        incar = Incar.from_file("INCAR")
+        assert incar["ALGO"] == "Normal"
+        assert incar["ISTART"] == 1
+        assert incar["ICHARG"] == 0
+        assert os.path.isfile("WAVECAR")
+
+        # the linear mixing correction resets the density itself
+        dct = handler.correct()
+        assert dct["actions"][-1]["action"]["_set"]["ICHARG"] == 2
+        assert NonConvergingErrorHandler.from_dict(handler.as_dict()).warm_start
+
+    def test_vasp_error_handler(self) -> None:
+        with open("vasp.out", mode="w") as file:
+            file.write("WARNING: Sub-Space-Matrix is not hermitian in DAV\n")
+        handler = VaspErrorHandler(warm_start=True)
+        assert handler.check()
+        dct = handler.correct()
+        assert dct["actions"] == [
+            {"dict": "INCAR", "action": {"_set": {"LREAL": False}}},
+            {"dict": "INCAR", "action": {"_set": {"ISTART": 1, "ICHARG": 0}}},
+        ]
+        assert Incar.from_file("INCAR")["ISTART"] == 1
+        assert VaspErrorHandler.from_dict(handler.as_dict()).warm_start
+
+        # off by default
+        incar = Incar.from_file("INCAR")
+        incar.update({"LREAL": "Auto", "ISTART": 0})
+        incar.write_file("INCAR")
+        handler = VaspErrorHandler()
+        handler.check()
+        assert handler.correct()["actions"] == [{"dict": "INCAR", "action": {"_set": {"LREAL": False}}}]
+
+
+class NEBImageHandlerTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, *glob("nonconv/*", root_dir=TEST_FILES))
+        for image in ("00", "01", "02", "03"):
+            os.mkdir(image)
+            shutil.copy("POSCAR", image)
+        for image in ("01", "02"):
+            shutil.copy("OSZICAR", image)
+
+    def test_check_correct(self) -> None:
+        handler = NEBImageHandler(NonConvergingErrorHandler(nionic_steps=3))
+        assert handler.is_monitor
+        assert handler.check()
+        assert handler._flagged == ["01", "02"]
+        assert not os.path.lexists("01/INCAR")
+
+        dct = handler.correct()
+        assert dct["errors"] == ["Non-converging job"]
+        assert set(dct["images"]) == {"01", "02"}
+        assert dct["images"]["01"]["check_time"] >= 0
+        # the shared INCAR is only moved one step up the ALGO ladder
+        assert dct["actions"] == [{"dict": "INCAR", "action": {"_set": {"ALGO": "Normal"}}}]
+        assert Incar.from_file("INCAR")["ALGO"] == "Normal"
+        assert not os.path.lexists("02/INCAR")
+
+        os.remove("02/OSZICAR")
+        assert handler.check()
+        assert handler._flagged == ["01"]
+
+    def test_as_from_dict(self) -> None:
+        handler = NEBImageHandler(NonConvergingErrorHandler(nionic_steps=3), images=["01"])
+        h2 = NEBImageHandler.from_dict(handler.as_dict())
+        assert h2.images == ["01"]
+        assert isinstance(h2.handler, NonConvergingErrorHandler)
+
+
+class ScfDivergenceHandlerTest(MatSciTest):
+    def setUp(self) -> None:
+        copy_tmp_files(self.tmp_path, *glob("nonconv/*", root_dir=TEST_FILES))
+
+    @staticmethod
+    def write_oszicar(d_e_series, n_complete) -> None:
+        lines = []
+        for idx, d_e in enumerate(d_e_series):
+            lines.append("       N       E                     dE             d eps       ncg     rms          rms(c)")
+            lines.extend(
+                f"RMM: {step:3d}    -0.10E+01    {val:.5E}   -0.1E-02  8192   0.1E-02"
+                for step, val in enumerate(d_e, 1)
+            )
+            if idx < n_complete:
+                lines.append(f"{idx + 1:4d} F= -.1E+01 E0= -.1E+01  d E =-.1E+01")
+        Path("OSZICAR").write_text("\n".join(lines) + "\n")
+
+    def set_incar(self, **kwargs) -> None:
+        incar = Incar.from_file("INCAR")
+        incar.update(kwargs)
+        incar.write_file("INCAR")
+
+    def test_check(self) -> None:
+        # every cycle of the fixture exhausts NELM = 10
+        handler = ScfDivergenceHandler()
+        assert handler.check()
+
+        self.set_incar(NELM=60, EDIFF=1e-6)
+        startup = [10.0] * 5
+        slow = [10 ** (-0.1 * k) for k in range(12)]
+        fast = [10 ** (-k) for k in range(5)]
+        self.write_oszicar([startup + slow], n_complete=0)
+        assert handler.check()
+        self.write_oszicar([startup + fast], n_complete=0)
+        assert not handler.check()
+        # too few steps to extrapolate from
+        self.write_oszicar([startup + slow[:3]], n_complete=0)
+        assert not handler.check()
+
+        # a previous cycle that converged blocks the trigger when two cycles are required
+        self.write_oszicar([startup + fast, slow], n_complete=1)
+        assert handler.check()
+        assert not ScfDivergenceHandler(nionic_steps=2).check()
+
+    def test_confidence(self) -> None:
+        self.set_incar(NELM=60, EDIFF=1e-6)
+        noisy = [10 ** (-0.12 * k + (0.6 if k % 2 else -0.6)) for k in range(10)]
+        self.write_oszicar([[10.0] * 5 + noisy], n_complete=0)
+        assert ScfDivergenceHandler(confidence=0.5).check()
+        assert not ScfDivergenceHandler(confidence=0.9).check()
+
+    def test_correct(self) -> None:
+        # CONTCAR is not yet written during the first SCF cycle
+        os.remove("CONTCAR")
+        handler = ScfDivergenceHandler()
+        dct = handler.correct()
+        assert dct["errors"] == ["Predicted non-converging SCF"]
+        assert Incar.from_file("INCAR")["ALGO"].lower() == "normal"
+
+    def test_as_from_dict(self) -> None:
+        handler = ScfDivergenceHandler(confidence=0.99, window=8)
+        h2 = ScfDivergenceHandler.from_dict(handler.as_dict())
+        assert isinstance(h2, ScfDivergenceHandler)
+        assert (h2.confidence, h2.window) == (0.99, 8)
@@ -2,7 +2,7 @@ import pytest
 from monty.os.path import zpath
 
 from custodian.utils import tracked_lru_cache
-from custodian.vasp.io import load_outcar, load_vasprun
+from custodian.vasp.io import load_outcar, load_vasprun, read_final_magmom, read_vasprun_parameters
 from tests.conftest import TEST_FILES
 
 
@@ -32,3 +32,28 @@ class TestIO:
         assert vr is vr2
 
         assert len(tracked_lru_cache.cached_functions) == 1
+
+    def test_read_final_magmom(self, tmp_path) -> None:
+        magmom = read_final_magmom(f"{TEST_FILES}/postprocess/OUTCAR")
+        assert magmom == pytest.approx([3.007, 1.397, -0.189, -0.189])
+        assert read_final_magmom(f"{TEST_FILES}/postprocess/INCAR") is None
+
+        # noncollinear runs print one table per axis
+        table = "# of ion     s       p       d       tot\n" + "-" * 40 + "\n"
+        table += "    1       0.000   0.000   {0}   {0}\n    2       0.000   0.000   {1}   {1}\n"
+        table += "-" * 48 + "\ntot         0.000   0.000   0.000   0.000\n\n"
+        text = ""
+        for axis, moments in zip("xyz", ((0.5, -0.5), (0.0, 0.0), (1.0, -1.0)), strict=True):
+            text += f" magnetization ({axis})\n\n" + table.format(*moments)
+        (tmp_path / "OUTCAR").write_text(text)
+        assert read_final_magmom(tmp_path / "OUTCAR") == [[0.5, 0.0, 1.0], [-0.5, 0.0, -1.0]]
+
+    def test_read_vasprun_parameters(self) -> None:
+        vasprun_file = zpath(f"{TEST_FILES}/io/vasprun.xml")
+        params = read_vasprun_parameters(vasprun_file)
+        assert params == load_vasprun(vasprun_file).parameters
+
+        # incomplete vasprun.xml of a killed run
+        params = read_vasprun_parameters(f"{TEST_FILES}/large_cell_real_optlay/vasprun.xml")
+        assert params["LREAL"] is True
+        assert params["NBANDS"] == 404
@@ -9,15 +9,18 @@ from types import SimpleNamespace
 from typing import TYPE_CHECKING
 from unittest.mock import Mock, patch
 
+import numpy as np
 import pymatgen
 import pytest
 from monty.os import cd
+from monty.serialization import loadfn
 from monty.tempfile import ScratchDir
 from pymatgen.core import Structure
 from pymatgen.io.vasp import Incar, Kpoints, Poscar
 from pymatgen.io.vasp.sets import MPRelaxSet
 
-from custodian.vasp.jobs import GenerateVaspInputJob, VaspJob, VaspNEBJob, _gamma_point_only_check
+from custodian.vasp.jobs import ConcurrentVaspJob, GenerateVaspInputJob, VaspJob, VaspNEBJob, _gamma_point_only_check
+from custodian.vasp.utils import get_loop_timings
 from tests.conftest import TEST_FILES
 
 if TYPE_CHECKING:
@@ -43,6 +46,59 @@ class TestVaspJob:
             if count > 3:
                 assert incar["NPAR"] > 1
 
+    def test_setup_auto_parallel(self, monkeypatch) -> None:
+        monkeypatch.setenv("SLURM_NTASKS", "32")
+        with cd(TEST_FILES), ScratchDir(".", copy_from_current_on_enter=True):
+            v = VaspJob(["hello"], auto_parallel=True)
+            v.setup()
+            incar = Incar.from_file("INCAR")
+            assert "NPAR" not in incar
+            assert 32 % (incar["KPAR"] * incar["NCORE"]) == 0
+            assert incar["NBANDS"] % (32 // (incar["KPAR"] * incar["NCORE"])) == 0
+            records = loadfn("auto_parallel.json")
+            assert records[0]["n_ranks"] == 32
+            assert records[0]["rationale"]
+
+    def test_tune_parallel(self, monkeypatch) -> None:
+        monkeypatch.setenv("SLURM_NTASKS", "16")
+        topology = {"n_cores": 16, "n_sockets": 1, "cores_per_socket": 16, "n_numa_nodes": 1, "cores_per_numa_node": 16}
+        monkeypatch.setattr("custodian.vasp.jobs.get_cpu_topology", lambda: topology)
+        with cd(f"{TEST_FILES}/postprocess"), ScratchDir(".", copy_from_current_on_enter=True):
+            timings = get_loop_timings("OUTCAR")
+            v = VaspJob(["hello"], final=False, suffix=".relax1", tune_parallel=True)
+            v.setup()
+            v.postprocess()
+            records = loadfn("auto_parallel.json")
+            assert records[0]["settings"] == {"KPAR": 1, "NCORE": 1}
+            # timed per electronic step, as the ionic steps of other jobs may take more or fewer
+            assert records[0]["n_electronic_steps"] == len(timings["loop"]) == 278
+            assert records[0]["sec_per_step"] == pytest.approx(sum(timings["loop_plus"]) / 278)
+
+            # the tuned settings are applied after, and so win over, settings_override
+            settings_override = [{"dict": "INCAR", "action": {"_set": {"NCORE": 4}}}]
+            v = VaspJob(
+                ["hello"], final=False, suffix=".relax2", tune_parallel=True, settings_override=settings_override
+            )
+            v.setup()
+            incar = Incar.from_file("INCAR")
+            assert incar["NCORE"] == 2
+            assert loadfn("auto_parallel.json")[-1]["settings"]["NCORE"] == 2
+            assert loadfn("auto_parallel.json")[-1]["sec_per_step"] is None
+
+    def test_setup_preflight(self) -> None:
+        with cd(TEST_FILES), ScratchDir(".", copy_from_current_on_enter=True):
+            kpoints = Kpoints.gamma_automatic((1, 1, 1))
+            kpoints.write_file("KPOINTS")
+            v = VaspJob(["hello"], preflight=True)
+            v.setup()
+            assert Incar.from_file("INCAR")["ISMEAR"] == 0
+            assert len(v.setup_corrections) == 1
+            assert v.setup_corrections[0]["errors"] == ["tet"]
+            assert v.setup_corrections[0]["handler"].__class__.__name__ == "VaspErrorHandler"
+
+            v.setup()
+            assert v.setup_corrections == []
+
     def test_setup_run_no_kpts(self) -> None:
         # just make sure v.setup() and v.run() exit cleanly when no KPOINTS file is present
         with cd(f"{TEST_FILES}/kspacing"), ScratchDir(".", copy_from_current_on_enter=True):
@@ -119,6 +175,46 @@ class TestVaspJob:
         # Just a basic test of init.
         VaspJob.double_relaxation_run(["vasp"])
 
+    def test_double_relaxation_kwargs(self) -> None:
+        jobs = VaspJob.double_relaxation_run(["vasp"], tune_parallel=True, preflight=True)
+        assert all(job.tune_parallel and job.preflight for job in jobs)
+
+
+class TestBatchedConstrainedOpt:
+    def test_next_strain_points(self) -> None:
+        energies = {x: (x - 5.1) ** 2 for x in (4.8, 4.9, 5.0)}
+        # minimum not bracketed, extend above the highest value
+        trial_x, converged = VaspJob._next_strain_points(energies, 3, 1e-4)
+        assert not converged
+        assert trial_x == pytest.approx([5.1, 5.2, 5.3])
+
+        energies |= {x: (x - 5.1) ** 2 for x in trial_x}
+        trial_x, converged = VaspJob._next_strain_points(energies, 4, 1e-4)
+        assert not converged
+        assert len(trial_x) == 4
+        assert all(5.0 < x < 5.2 for x in trial_x)
+        assert np.mean(trial_x) == pytest.approx(5.1)
+
+        energies = {5.0: -1.0, 5.1: -1.00001, 5.2: -0.9}
+        assert VaspJob._next_strain_points(energies, 4, 1e-4) == ([], True)
+
+    def test_run(self) -> None:
+        with cd(TEST_FILES), ScratchDir(".", copy_from_current_on_enter=True):
+            shutil.copy("postprocess/vasprun.xml", "vasprun.xml")
+            jobs = VaspJob.batched_constrained_opt_run(["vasp"], "c", -0.02, n_points=3)
+            job = next(jobs)
+            assert isinstance(job, ConcurrentVaspJob)
+            assert len(job.jobs) == 3
+            c_values = [Poscar.from_file(f"{subdir}/POSCAR").structure.lattice.c for subdir in job.jobs]
+            assert c_values[0] > c_values[1] > c_values[2]
+            assert Incar.from_file(f"{next(iter(job.jobs))}/INCAR")["ISIF"] == 2
+            # all points give the same energy, so the optimization stops after one round
+            for subdir in job.jobs:
+                shutil.copy("vasprun.xml", subdir)
+            assert next(jobs, None) is None
+            with open("EOS.txt") as file:
+                assert len(file.readlines()) == 4
+
 
 class TestVaspNEBJob:
     def test_as_from_dict(self) -> None:
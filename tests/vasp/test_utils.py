@@ -1,15 +1,29 @@
 """Created 17 June, 2024"""
 
+import gzip
+import math
 import os
 
 import numpy as np
 import pytest
 from monty.os.path import zpath
 from pymatgen.core import Lattice, Structure
-from pymatgen.io.vasp import Kpoints
+from pymatgen.io.vasp import Incar, Kpoints
 from pymatgen.util.testing import MatSciTest
 
-from custodian.vasp.utils import _estimate_num_k_points_from_kspacing, increase_k_point_density, is_valid_poscar
+from custodian.vasp.utils import (
+    _estimate_num_irreducible_k_points,
+    _estimate_num_k_points_from_kspacing,
+    estimate_nbands,
+    estimate_restart_file_size,
+    get_auto_parallel_settings,
+    get_loop_timings,
+    get_num_mpi_ranks,
+    increase_k_point_density,
+    increase_k_point_density_batch,
+    is_valid_poscar,
+    tune_parallel_settings,
+)
 from tests.conftest import TEST_FILES
 
 
@@ -42,6 +56,20 @@ class TestKPointUtils(MatSciTest):
         new_kpoints = increase_k_point_density(Kpoints(), self.small_structure, force_gamma=True, min_kpoints=14)
         assert new_kpoints["kpoints"] == ((3, 3, 3),)
 
+    def test_kpoint_density_increase_batch(self):
+        kpoints = [Kpoints(), 2, Kpoints(), Kpoints.gamma_automatic((3, 3, 3))]
+        structures = [self.large_structure, self.large_structure, self.small_structure, self.small_structure]
+        # meshes found by the original one-increase-at-a-time search
+        assert increase_k_point_density_batch(kpoints, structures, min_kpoints=4) == [
+            {"generation_style": "Gamma", "kpoints": ((2, 2, 1),)},
+            {"KSPACING": pytest.approx(0.307692), "KGAMMA": True},
+            {"generation_style": "Gamma", "kpoints": ((2, 2, 2),)},
+            {"generation_style": "Gamma", "kpoints": ((4, 4, 4),)},
+        ]
+
+        # no mesh can be found within max_inc increases
+        assert increase_k_point_density_batch([Kpoints()], [self.small_structure], max_inc=1, min_kpoints=1000) == [{}]
+
 
 class TestIsValidPoscar:
     """Tests for is_valid_poscar utility function."""
@@ -91,3 +119,171 @@ direct
 """
         )
         assert is_valid_poscar("CONTCAR", str(tmp_path)) is False
+
+    def test_gzipped_poscar(self, tmp_path) -> None:
+        """Compressed CONTCAR should be read directly, and rejected if truncated."""
+        content = "Si2\n1.0\n3.8 0 0\n0 3.8 0\n0 0 3.8\nSi\n2\nSelective dynamics\nDirect\n"
+        content += "0.0 0.0 0.0 T T T\n0.5 0.5 0.5 F F F\n"
+        with gzip.open(tmp_path / "CONTCAR.gz", "wt") as file:
+            file.write(content)
+        assert is_valid_poscar("CONTCAR.gz", str(tmp_path)) is True
+        # handlers copy the file by name, so CONTCAR.gz does not stand in for CONTCAR
+        assert is_valid_poscar("CONTCAR", str(tmp_path)) is False
+
+        with gzip.open(tmp_path / "CONTCAR.gz", "wt") as file:
+            file.write(content[:-20])
+        assert is_valid_poscar("CONTCAR.gz", str(tmp_path)) is False
+
+    def test_poscar_counts(self, tmp_path) -> None:
+        """Species and counts must match, and there must be a coordinate line per site."""
+        header = "Si2\n1.0\n3.8 0 0\n0 3.8 0\n0 0 3.8\n"
+        poscar_path = tmp_path / "POSCAR"
+        # VASP 4 format without species line
+        poscar_path.write_text(header + "2\nDirect\n0 0 0\n0.5 0.5 0.5\n")
+        assert is_valid_poscar("POSCAR", str(tmp_path)) is True
+        poscar_path.write_text(header + "Si O\n2\nDirect\n0 0 0\n0.5 0.5 0.5\n")
+        assert is_valid_poscar("POSCAR", str(tmp_path)) is False
+        poscar_path.write_text(header + "Si\n3\nDirect\n0 0 0\n0.5 0.5 0.5\n")
+        assert is_valid_poscar("POSCAR", str(tmp_path)) is False
+        poscar_path.write_text(header + "Si\n2\nDirect\n0 0 0\n0.5 0.5 *****\n")
+        assert is_valid_poscar("POSCAR", str(tmp_path)) is False
+
+
+class TestAutoParallel:
+    structure = Structure(
+        Lattice.cubic(3.8),
+        ["Si", "Si"],
+        [[0, 0, 0], [0.25, 0.25, 0.25]],
+    )
+    topology = {"n_cores": 64, "n_sockets": 2, "cores_per_socket": 32, "n_numa_nodes": 4, "cores_per_numa_node": 16}
+
+    def test_num_mpi_ranks(self, monkeypatch) -> None:
+        for var in ("SLURM_NTASKS", "SLURM_NPROCS", "PBS_NP", "NSLOTS", "PBS_NODEFILE"):
+            monkeypatch.delenv(var, raising=False)
+        assert get_num_mpi_ranks() == 64
+        monkeypatch.setenv("NSLOTS", "24")
+        assert get_num_mpi_ranks() == 24
+        monkeypatch.setenv("SLURM_NTASKS", "128")
+        assert get_num_mpi_ranks() == 128
+
+    def test_settings(self) -> None:
+        incar = Incar({"NPAR": 4, "NBANDS": 30})
+        kpoints = Kpoints.gamma_automatic((4, 4, 4))
+        settings, rationale = get_auto_parallel_settings(
+            incar, self.structure, kpoints=kpoints, n_ranks=128, topology=self.topology
+        )
+        assert settings == {"KPAR": 16, "NCORE": 2, "NPAR": None, "NBANDS": 32}
+        assert len(rationale) == 5
+
+        # few k-points leave more ranks for band parallelization
+        settings, _ = get_auto_parallel_settings(
+            incar, self.structure, kpoints=Kpoints.gamma_automatic((1, 1, 1)), n_ranks=64, topology=self.topology
+        )
+        assert settings == {"KPAR": 1, "NCORE": 8, "NPAR": None, "NBANDS": 32}
+
+    def test_estimate_nbands(self) -> None:
+        # NBANDS of VASP runs (OUTCARs in io, postprocess and potim) after rounding
+        # up to a multiple of the band groups
+        for nelect, nions, nmagmom, n_groups, nbands in [
+            (8, 2, 1.2, 8, 16),  # Si2, MAGMOM = 2*0.6
+            (28, 4, 1.2, 12, 24),  # Fe2O2
+            (320, 48, 16 * 4 + 32 * 0.6, 4, 236),  # Fe16S32, MAGMOM = 16*4 32*0.6
+        ]:
+            assert math.ceil(estimate_nbands(nelect, nions, nmagmom=nmagmom) / n_groups) * n_groups == nbands
+        assert estimate_nbands(8, 2) == 8
+        assert estimate_nbands(8, 2, noncollinear=True) == 16
+
+        # the default is only padded, never lowered
+        settings, _ = get_auto_parallel_settings(
+            Incar({"ISPIN": 2}),
+            self.structure,
+            kpoints=Kpoints.gamma_automatic((1, 1, 1)),
+            n_ranks=16,
+            topology=self.topology,
+            nelect=8,
+        )
+        assert settings["NBANDS"] == 12  # 9 bands with 1 muB per ion, padded to 4 band groups
+
+    def test_num_k_points_automatic(self) -> None:
+        # fully automatic mode with R_k = 20 A: 20 / 3.8 A -> 5 divisions per axis
+        with pytest.warns(DeprecationWarning, match="KSPACING"):
+            kpoints = Kpoints.automatic(20)
+        assert _estimate_num_irreducible_k_points(Incar({"ISYM": 0}), self.structure, kpoints) == 125
+        assert _estimate_num_irreducible_k_points(Incar(), self.structure, kpoints) == 63
+
+    def test_settings_restrictions(self) -> None:
+        kpoints = Kpoints.gamma_automatic((4, 4, 4))
+        settings, _ = get_auto_parallel_settings(
+            Incar({"LELF": True, "LHFCALC": True}), self.structure, kpoints=kpoints, n_ranks=32, topology=self.topology
+        )
+        assert settings["KPAR"] == 1
+        assert settings["NCORE"] == 1
+
+        settings, _ = get_auto_parallel_settings(
+            Incar({"IBRION": 6, "NCORE": 4}), self.structure, kpoints=kpoints, n_ranks=32, topology=self.topology
+        )
+        assert settings == {"KPAR": 4, "NCORE": None, "NPAR": None}
+
+        # NBANDS estimated from the number of electrons
+        settings, _ = get_auto_parallel_settings(
+            Incar({"ISYM": 0}), self.structure, kpoints=kpoints, n_ranks=16, topology=self.topology, nelect=8
+        )
+        assert settings == {"KPAR": 2, "NCORE": 2, "NPAR": None, "NBANDS": 8}
+
+    def test_loop_timings(self) -> None:
+        timings = get_loop_timings(f"{TEST_FILES}/postprocess/OUTCAR")
+        assert len(timings["loop_plus"]) == 28
+        assert timings["loop_plus"][0] == pytest.approx(10.86)
+        assert len(timings["loop"]) > len(timings["loop_plus"])
+
+    def test_restart_file_size(self) -> None:
+        # LWAVE = F, so only the spin-polarized CHGCAR on the 48 x 48 x 80 fine grid
+        assert estimate_restart_file_size(f"{TEST_FILES}/postprocess/OUTCAR") == 12 * 48 * 48 * 80 * 2
+
+    def test_tune(self) -> None:
+        incar = Incar({"NBANDS": 29})
+        kpoints = Kpoints.gamma_automatic((4, 4, 4))
+        run = {"n_ranks": 32, "topology": self.topology}
+        kwargs = {"kpoints": kpoints, **run}
+        assert tune_parallel_settings([], incar, self.structure, **kwargs) == ({}, [])
+        # timings on a different number of ranks or node are ignored
+        other_runs = [
+            {"n_ranks": 64, "topology": self.topology, "settings": {"KPAR": 2, "NCORE": 4}, "sec_per_step": 1.0},
+            {**run, "topology": {**self.topology, "cores_per_numa_node": 8}, "settings": {}, "sec_per_step": 1.0},
+        ]
+        assert tune_parallel_settings(other_runs, incar, self.structure, **kwargs) == ({}, [])
+
+        history = [{**run, "settings": {"KPAR": 2, "NCORE": 4}, "sec_per_step": 10.0}]
+        settings, rationale = tune_parallel_settings(history, incar, self.structure, **kwargs)
+        assert settings == {"KPAR": 2, "NCORE": 8, "NPAR": None, "NBANDS": 30}
+        assert "Trying" in rationale[1]
+
+        history += [
+            {**run, "settings": {"KPAR": 2, "NCORE": 8}, "sec_per_step": 12.0},
+            {**run, "settings": {"KPAR": 2, "NCORE": 2}, "sec_per_step": 11.0},
+            {**run, "settings": {"KPAR": 4, "NCORE": 4}, "sec_per_step": 9.0},
+        ]
+        settings, _ = tune_parallel_settings(history, incar, self.structure, **kwargs)
+        # the neighbors of the fastest configuration KPAR = 4, NCORE = 4 are tried next
+        assert settings == {"KPAR": 4, "NCORE": 8, "NPAR": None}
+
+        history += [
+            {**run, "settings": {"KPAR": 4, "NCORE": 8}, "sec_per_step": 9.5},
+            {**run, "settings": {"KPAR": 4, "NCORE": 2}, "sec_per_step": 9.5},
+            {**run, "settings": {"KPAR": 8, "NCORE": 4}, "sec_per_step": 9.5},
+        ]
+        settings, rationale = tune_parallel_settings(history, incar, self.structure, **kwargs)
+        assert settings == {"KPAR": 4, "NCORE": 4, "NPAR": None, "NBANDS": 30}
+        assert "Keeping" in rationale[1]
+
+    def test_tune_fixed_ncore(self) -> None:
+        kpoints = Kpoints.gamma_automatic((4, 4, 4))
+        run = {"n_ranks": 32, "topology": self.topology}
+        kwargs = {"kpoints": kpoints, **run}
+        history = [{**run, "settings": {"KPAR": 2, "NCORE": None}, "sec_per_step": 10.0}]
+        # only KPAR is tuned for DFPT, which does not support NCORE > 1
+        for incar in (Incar({"IBRION": 7}), Incar({"LEPSILON": True})):
+            settings, _ = tune_parallel_settings(history, incar, self.structure, **kwargs)
+            assert settings == {"KPAR": 4, "NCORE": None, "NPAR": None}
+        settings, _ = tune_parallel_settings(history, Incar({"LHFCALC": True}), self.structure, **kwargs)
+        assert settings == {"KPAR": 4, "NCORE": 1, "NPAR": None}